@@ -0,0 +1,220 @@
+import fnmatch
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .config import settings
+from .responses import ORJSONResponse, response_encoding
+
+# Claves borradas por DEL al vaciar la caché de Redis
+CLEAR_BATCH = 500
+
+
+class MemoryCache:
+    """LRU con TTL, local al proceso.
+
+    Invalidar sólo sube la versión en este proceso: con varios workers los
+    demás siguen sirviendo su copia hasta CACHE_TTL_SECONDS. Para que la
+    invalidación llegue a todos, CACHE_BACKEND=redis.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_versions: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_versions = max_versions or max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        # Versiones por espacio, en su propio LRU acotado. Cada subida toma el
+        # siguiente valor de una secuencia global; un espacio sin entrada tiene
+        # la versión `_floor`, que al expulsar una versión pasa a la secuencia
+        # actual. Así la versión de un espacio nunca se repite y expulsar no
+        # resucita entradas invalidadas.
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._sequence = 0
+        self._floor = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (ttl or self.ttl_seconds), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def version(self, namespace: str) -> int:
+        version = self._versions.get(namespace)
+        if version is None:
+            return self._floor
+        self._versions.move_to_end(namespace)
+        return version
+
+    async def bump(self, namespace: str):
+        self._sequence += 1
+        self._versions[namespace] = self._sequence
+        self._versions.move_to_end(namespace)
+        while len(self._versions) > self.max_versions:
+            self._versions.popitem(last=False)
+            self._floor = self._sequence
+
+    async def clear(self):
+        self._data.clear()
+        self._versions.clear()
+        # Lo cacheado con versiones anteriores ya no está; la secuencia sigue
+        self._floor = self._sequence
+
+
+class RedisCache:
+    """Backend para cualquier cliente asíncrono compatible con Redis (get/set/incr/scan_iter/delete).
+
+    Las versiones son contadores `version:<espacio>` sin caducidad.
+    """
+
+    def __init__(self, client, ttl_seconds: float, prefix: str = "tinvel:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = await self.client.get(self.prefix + key)
+        if isinstance(value, str):
+            value = value.encode()
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        await self.client.set(self.prefix + key, value, ex=int(ttl or self.ttl_seconds))
+
+    async def version(self, namespace: str) -> int:
+        return int(await self.client.get(f"{self.prefix}version:{namespace}") or 0)
+
+    async def bump(self, namespace: str):
+        await self.client.incr(f"{self.prefix}version:{namespace}")
+
+    async def clear(self):
+        # Sólo las claves con nuestro prefijo: la base de Redis puede ser compartida
+        batch = []
+        async for key in self.client.scan_iter(match=self.prefix + "*", count=CLEAR_BATCH):
+            batch.append(key)
+            if len(batch) >= CLEAR_BATCH:
+                await self.client.delete(*batch)
+                batch = []
+        if batch:
+            await self.client.delete(*batch)
+
+
+class FakeRedis:
+    """Cliente en memoria con el subconjunto de redis.asyncio que usa RedisCache.
+
+    Para pruebas y desarrollo sin servidor (CACHE_BACKEND=fakeredis): no se
+    comparte entre procesos.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+
+    def _live(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def set(self, key: str, value, ex: Optional[int] = None):
+        if isinstance(value, str):
+            value = value.encode()
+        self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    async def incr(self, key: str) -> int:
+        current = self._live(key)
+        value = int(current or 0) + 1
+        expires_at = self._data[key][0] if current is not None else None
+        self._data[key] = (expires_at, str(value).encode())
+        return value
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None):
+        for key in list(self._data):
+            if (match is None or fnmatch.fnmatchcase(key, match)) and self._live(key) is not None:
+                yield key
+
+
+def create_cache():
+    if settings.CACHE_BACKEND == "redis":
+        import redis.asyncio as redis
+
+        return RedisCache(redis.from_url(settings.REDIS_URL), settings.CACHE_TTL_SECONDS)
+    if settings.CACHE_BACKEND == "fakeredis":
+        return RedisCache(FakeRedis(), settings.CACHE_TTL_SECONDS)
+    return MemoryCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS, settings.CACHE_MAX_VERSIONS)
+
+
+class CatalogCache:
+    """Respuestas serializadas versionadas por espacio de nombres.
+
+    Invalidar es subir la versión del espacio: las claves viejas dejan de
+    leerse y caducan solas, sin tener que buscarlas.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def key(self, namespace: str, *parts) -> str:
+        version = await self.backend.version(namespace)
+        return f"{namespace}:v{version}:" + ":".join(str(p) for p in parts)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.backend.get(key)
+
+    async def set(self, key: str, body: bytes):
+        await self.backend.set(key, body)
+
+    async def invalidate(self, namespace: str):
+        await self.backend.bump(namespace)
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _strip_encoding(tag: str) -> str:
+    # Las variantes comprimidas llevan la codificación en el ETag: "hash-gzip"
+    for encoding in ("gzip", "br"):
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+
+def cached_response(request: Request, body: bytes) -> Response:
+    """Cuerpo JSON ya serializado con ETag, 304 y compresión negociada."""
+    etag = etag_for(body)
+    # El 304 lleva el mismo ETag que llevaría el 200 de esta variante ("hash-gzip")
+    encoding = response_encoding(request, body)
+    tag = f'{etag[:-1]}-{encoding}"' if encoding else etag
+    headers = {"ETag": tag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [_strip_encoding(t.strip()) for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(body, request, headers=headers, cache_compressed=True)
+
+
+catalog_cache = CatalogCache(create_cache())
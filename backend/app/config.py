@@ -7,7 +7,102 @@ class Settings(BaseSettings):
     DB_USER: str = "tinvel_user"
     DB_PASSWORD: str = "tinvel_password"
     DB_NAME: str = "tinvel_db"
+    # Si se define, sustituye a DB_* (p. ej. sqlite:///bench.db para benchmarks)
+    DATABASE_URL: str | None = None
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800
+    # Particiones hash de swipes por user_id (sólo Postgres, lo aplica la migración; 0 = sin particionar)
+    SWIPES_HASH_PARTITIONS: int = 0
+    # development | production: fuera de development la API no arranca sin SECRET_KEY propia.
+    # Los despliegues definen APP_ENV=production; en local basta el valor por defecto
+    APP_ENV: str = "development"
+    # Firma de los tokens de sesión (.env), igual en todos los workers; sólo opcional en development
+    SECRET_KEY: str | None = None
+    TOKEN_TTL_SECONDS: int = 7 * 24 * 3600
+    # Coste de scrypt: memoria = 128·N·r bytes por hash (16 MB con los valores por defecto)
+    PASSWORD_SCRYPT_N: int = 2 ** 14
+    PASSWORD_SCRYPT_R: int = 8
+    PASSWORD_SCRYPT_P: int = 1
+    PASSWORD_HASH_WORKERS: int = 4
     BACKEND_CORS_ORIGINS: list[str] = ["http://localhost:5173", "http://localhost:3000"]
+    PROFILING_ENABLED: bool = False
+    PROFILER_INTERVAL_MS: float = 10.0
+    N_PLUS_ONE_THRESHOLD: int = 10
+    # memory (por proceso: invalidar no llega a los demás workers hasta
+    # CACHE_TTL_SECONDS) | redis (compartida) | fakeredis (pruebas, en memoria)
+    CACHE_BACKEND: str = "memory"
+    CACHE_TTL_SECONDS: float = 300.0
+    CACHE_MAX_ENTRIES: int = 2048
+    # Versiones de espacio (teselas, geometrías...) que recuerda el backend memory
+    CACHE_MAX_VERSIONS: int = 10000
+    # Compresión de respuestas JSON (gzip, o br si está instalado brotli)
+    RESPONSE_COMPRESS_MIN_BYTES: int = 1024
+    RESPONSE_GZIP_LEVEL: int = 6
+    RESPONSE_BROTLI_QUALITY: int = 4
+    RESPONSE_COMPRESS_CACHE_ENTRIES: int = 128
+    REDIS_URL: str = "redis://localhost:6379/0"
+    SWIPE_BATCH_MAX_SIZE: int = 500
+    # Write-behind: los swipes se confirman al entrar en la cola (y su WAL local)
+    # y se escriben en grupo cada SWIPE_FLUSH_INTERVAL_MS o SWIPE_FLUSH_MAX_ROWS.
+    # Leer lo propio antes del flush sólo está garantizado en el worker que
+    # aceptó el swipe: con varios workers, enrutado sticky por usuario.
+    SWIPE_WRITE_BEHIND: bool = False
+    SWIPE_FLUSH_INTERVAL_MS: float = 50.0
+    SWIPE_FLUSH_MAX_ROWS: int = 500
+    SWIPE_QUEUE_MAX_ROWS: int = 10000
+    SWIPE_WAL_DIR: str = "data/swipe-wal"
+    SWIPE_WAL_FSYNC: bool = True
+    DECK_PREFETCH_SIZE: int = 50
+    DECK_MAX_BUFFERED_TRIPS: int = 10000
+    SPATIAL_INDEX_ENABLED: bool = True
+    SPATIAL_INDEX_REFRESH_SECONDS: float = 30.0
+    # Recarga completa (bajas y cambios hechos en otros procesos)
+    SPATIAL_INDEX_REBUILD_SECONDS: float = 600.0
+    SEARCH_INDEX_REFRESH_SECONDS: float = 30.0
+    SEARCH_INDEX_REBUILD_SECONDS: float = 600.0
+    # Teselas de lugares: clusters en rejilla hasta este zoom, puntos sueltos por encima
+    TILE_CLUSTER_MAX_ZOOM: int = 14
+    TILE_GRID_SIZE: int = 64
+    TILE_MAX_ZOOM: int = 22
+    RECOMMENDER_TRAINING_WINDOW: int = 1_000_000
+    RECOMMENDER_REBUILD_SECONDS: float = 3600.0
+    RECOMMENDER_MAX_CACHED_TRIPS: int = 10000
+    # memory (un solo proceso) | postgres (LISTEN/NOTIFY entre workers)
+    REALTIME_BACKEND: str = "memory"
+    REALTIME_QUEUE_SIZE: int = 256
+    REALTIME_BATCH_WINDOW_MS: float = 50.0
+    REALTIME_BATCH_MAX_EVENTS: int = 100
+    EXPORT_BATCH_SIZE: int = 1000
+    TRAVEL_MATRIX_ENABLED: bool = True
+    TRAVEL_MATRIX_DIR: str = "data/matrices"
+    ROUTE_AVG_SPEED_KMH: float = 25.0
+    ROUTE_SOLVER_TIME_BUDGET_MS: int = 200
+    ITINERARY_VISIT_MINUTES: float = 60.0
+    ITINERARY_TIME_BUDGET_MS: int = 400
+    # Workers de la cola de rutas dentro del proceso de la API (0 = sólo `python -m app.jobs`)
+    ROUTE_JOB_WORKERS: int = 2
+    # Sin trabajo, la espera entre sondeos se duplica desde POLL hasta MAX_POLL
+    ROUTE_JOB_POLL_SECONDS: float = 1.0
+    ROUTE_JOB_MAX_POLL_SECONDS: float = 15.0
+    # Un job `running` sin latido en este tiempo se da por huérfano
+    ROUTE_JOB_STALE_SECONDS: float = 300.0
+    # local | azure
+    ROUTING_PROVIDER: str = "local"
+    AZURE_MAPS_KEY: str | None = None
+    ROUTING_TIMEOUT_SECONDS: float = 5.0
+    ROUTING_CONNECT_TIMEOUT_SECONDS: float = 2.0
+    ROUTING_MAX_CONNECTIONS: int = 20
+    ROUTING_MAX_CONCURRENCY: int = 16
+    ROUTING_RETRIES: int = 2
+    ROUTING_BREAKER_FAILURES: int = 5
+    ROUTING_BREAKER_RESET_SECONDS: float = 30.0
+    ROUTING_CACHE_PRECISION: int = 4
+    ROUTING_CACHE_MAX_ENTRIES: int = 50000
+    ROUTING_CACHE_PATH: str | None = None
+    ROUTING_CACHE_TTL_SECONDS: float = 7 * 24 * 3600
 
     class Config:
         env_file = ".env"
@@ -1,12 +1,55 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from .config import settings
+from .instrumentation import timed_pool_class
 
-SQLALCHEMY_DATABASE_URL = (
-    f"postgresql://{settings.DB_USER}:{settings.DB_PASSWORD}"
+_DB_CREDENTIALS = (
+    f"{settings.DB_USER}:{settings.DB_PASSWORD}"
     f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 )
+SQLALCHEMY_DATABASE_URL = f"postgresql+psycopg2://{_DB_CREDENTIALS}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{_DB_CREDENTIALS}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, future=True)
+if settings.DATABASE_URL:
+    _scheme, _rest = settings.DATABASE_URL.split("://", 1)
+    _backend = _scheme.split("+")[0]
+    _sync_driver, _async_driver = {"sqlite": ("pysqlite", "aiosqlite"), "postgresql": ("psycopg2", "asyncpg")}[_backend]
+    SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL if "+" in _scheme else f"{_backend}+{_sync_driver}://{_rest}"
+    ASYNC_SQLALCHEMY_DATABASE_URL = f"{_backend}+{_async_driver}://{_rest}"
+
+POOL_OPTIONS = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+)
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    # SQLite no usa un pool de conexiones de red
+    POOL_OPTIONS = {}
+
+_SYNC_POOL_OPTIONS = dict(POOL_OPTIONS)
+_ASYNC_POOL_OPTIONS = dict(POOL_OPTIONS)
+if settings.PROFILING_ENABLED and POOL_OPTIONS:
+    # Mide la espera de checkout del pool (ver instrumentation.py)
+    _SYNC_POOL_OPTIONS["poolclass"] = timed_pool_class(QueuePool)
+    _ASYNC_POOL_OPTIONS["poolclass"] = timed_pool_class(AsyncAdaptedQueuePool)
+
+# El motor síncrono queda para scripts (seed, migraciones); la API usa el asíncrono.
+engine = create_engine(SQLALCHEMY_DATABASE_URL, future=True, **_SYNC_POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
-Base = declarative_base()
\ No newline at end of file
+
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **_ASYNC_POOL_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+
+def dialect_insert(db, table):
+    """INSERT con soporte de ON CONFLICT para el dialecto de la sesión."""
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Collection, List, Optional, Tuple
+
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .config import settings
+from .database import AsyncSessionLocal
+
+
+# (viaje, usuario): en un viaje compartido cada participante tiene su propio deck
+DeckKey = Tuple[int, int]
+
+
+def candidates_query(trip_id: int, user_id: int, city: str, after_id: int, limit: int, exclude: Collection[int] = ()):
+    # Anti-join contra los swipes del usuario + keyset sobre la PK: cada página cuesta O(limit).
+    # `exclude` son lugares con swipe aún en la cola write-behind, que el anti-join no ve.
+    already_swiped = exists().where(
+        models.Swipe.trip_id == trip_id,
+        models.Swipe.user_id == user_id,
+        models.Swipe.place_id == models.Place.id,
+    )
+    query = select(models.Place).where(
+        models.Place.city == city,
+        models.Place.is_active.is_(True),
+        models.Place.id > after_id,
+        ~already_swiped,
+    )
+    if exclude:
+        query = query.where(models.Place.id.not_in(exclude))
+    return query.order_by(models.Place.id).limit(limit)
+
+
+async def fetch_candidates(
+    db: AsyncSession, trip_id: int, user_id: int, city: str, after_id: int, limit: int, exclude: Collection[int] = ()
+) -> List[schemas.PlaceOut]:
+    result = await db.execute(candidates_query(trip_id, user_id, city, after_id, limit, exclude))
+    return [schemas.PlaceOut.model_validate(p, from_attributes=True) for p in result.scalars().all()]
+
+
+async def places_by_ids(db: AsyncSession, ids: List[int]) -> List[schemas.PlaceOut]:
+    """Lugares activos en el orden de `ids`."""
+    if not ids:
+        return []
+    result = await db.execute(
+        select(models.Place).where(models.Place.id.in_(ids), models.Place.is_active.is_(True))
+    )
+    by_id = {p.id: p for p in result.scalars().all()}
+    return [schemas.PlaceOut.model_validate(by_id[i], from_attributes=True) for i in ids if i in by_id]
+
+
+@dataclass
+class _DeckEntry:
+    city: str
+    # Último id ya entregado al cliente; el buffer empieza justo después
+    after: int
+    rows: List[schemas.PlaceOut] = field(default_factory=list)
+    exhausted: bool = False
+    refilling: bool = False
+
+
+class DeckBuffer:
+    """Candidatos precalculados por viaje y usuario, en memoria del proceso."""
+
+    def __init__(self, prefetch: int, max_trips: int):
+        self.prefetch = prefetch
+        self.max_trips = max_trips
+        self._entries: "OrderedDict[DeckKey, _DeckEntry]" = OrderedDict()
+
+    def city_for(self, key: DeckKey) -> Optional[str]:
+        entry = self._entries.get(key)
+        return entry.city if entry else None
+
+    def take(self, key: DeckKey, cursor: int, limit: int) -> Optional[List[schemas.PlaceOut]]:
+        entry = self._entries.get(key)
+        if entry is None or entry.after != cursor or len(entry.rows) < limit:
+            return None
+        self._entries.move_to_end(key)
+        page, entry.rows = entry.rows[:limit], entry.rows[limit:]
+        entry.after = page[-1].id
+        return page
+
+    def store(self, key: DeckKey, city: str, after: int, rows: List[schemas.PlaceOut], exhausted: bool):
+        self._entries[key] = _DeckEntry(city=city, after=after, rows=rows, exhausted=exhausted)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_trips:
+            self._entries.popitem(last=False)
+
+    def needs_refill(self, key: DeckKey) -> bool:
+        entry = self._entries.get(key)
+        return (
+            entry is not None
+            and not entry.exhausted
+            and not entry.refilling
+            and len(entry.rows) < self.prefetch // 2
+        )
+
+    def discard(self, key: DeckKey, place_id: int):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.rows = [p for p in entry.rows if p.id != place_id]
+
+    async def refill(self, key: DeckKey, exclude: Collection[int] = ()):
+        entry = self._entries.get(key)
+        if entry is None or entry.refilling:
+            return
+        entry.refilling = True
+        try:
+            tail = entry.rows[-1].id if entry.rows else entry.after
+            async with AsyncSessionLocal() as db:
+                rows = await fetch_candidates(db, *key, entry.city, tail, self.prefetch, exclude)
+            # Mientras esperábamos pudo servirse o reemplazarse la entrada
+            current = self._entries.get(key)
+            if current is not entry:
+                return
+            current_tail = entry.rows[-1].id if entry.rows else entry.after
+            if current_tail != tail:
+                rows = [p for p in rows if p.id > current_tail]
+            entry.rows.extend(rows)
+            entry.exhausted = len(rows) < self.prefetch
+        finally:
+            entry.refilling = False
+
+
+deck_buffer = DeckBuffer(settings.DECK_PREFETCH_SIZE, settings.DECK_MAX_BUFFERED_TRIPS)
@@ -1,11 +1,23 @@
-from .database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import Generator
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from .database import AsyncSessionLocal
+from .security import InvalidToken, decode_token
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncGenerator, Optional
 
+_bearer = HTTPBearer(auto_error=False)
 
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
-    try:
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> dict:
+    """Claims del token (`sub`, `email`); no consulta la tabla users."""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return decode_token(credentials.credentials)
+    except InvalidToken as exc:
+        raise HTTPException(status_code=401, detail=str(exc), headers={"WWW-Authenticate": "Bearer"})
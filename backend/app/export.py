@@ -0,0 +1,211 @@
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, or_, select
+
+from . import models
+from .config import settings
+
+# Orden de exportación: padres antes que hijos
+EXPORT_TABLES = ("trips", "swipes", "trip_places", "routes", "route_points")
+
+_MODELS = {
+    "trips": models.Trip,
+    "swipes": models.Swipe,
+    "trip_places": models.TripPlace,
+    "routes": models.Route,
+    "route_points": models.RoutePoint,
+}
+
+
+def _user_trip_ids(user_id: int):
+    """Viajes propios y compartidos del usuario."""
+    shared = select(models.TripMember.trip_id).where(models.TripMember.user_id == user_id)
+    return select(models.Trip.id).where(or_(models.Trip.user_id == user_id, models.Trip.id.in_(shared)))
+
+
+def export_query(table: str, user_id: Optional[int] = None):
+    """SELECT de todas las columnas de la tabla, filtrado al historial de un usuario si se indica."""
+    model = _MODELS[table]
+    query = select(*model.__table__.columns)
+    if user_id is not None:
+        trips = _user_trip_ids(user_id)
+        if table == "trips":
+            query = query.where(model.id.in_(trips))
+        elif table == "swipes":
+            query = query.where(model.user_id == user_id)
+        elif table == "route_points":
+            routes = select(models.Route.id).where(models.Route.trip_id.in_(trips))
+            query = query.where(model.route_id.in_(routes))
+        else:
+            query = query.where(model.trip_id.in_(trips))
+    # Orden por PK: exportaciones reproducibles y recorrido por índice
+    return query.order_by(*model.__table__.primary_key.columns).execution_options(
+        yield_per=settings.EXPORT_BATCH_SIZE
+    )
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} no es serializable")
+
+
+def ndjson_lines(table: str, rows: Iterable[dict], tagged: bool) -> bytes:
+    """Un lote de filas en NDJSON; con `tagged` cada línea lleva la tabla de origen."""
+    out = io.StringIO()
+    for row in rows:
+        if tagged:
+            row = {"table": table, **row}
+        out.write(json.dumps(row, default=_json_default))
+        out.write("\n")
+    return out.getvalue().encode()
+
+
+def _arrow_schema(table: str):
+    import pyarrow as pa
+
+    fields = []
+    for column in _MODELS[table].__table__.columns:
+        if isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _ChunkSink(io.RawIOBase):
+    """Destino de ParquetWriter que acumula bytes hasta que se recogen con take()."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+class ParquetEncoder:
+    """Escribe un row group por lote y entrega los bytes según se generan."""
+
+    def __init__(self, table: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("La exportación Parquet requiere pyarrow")
+        self._pa = pa
+        self.schema = _arrow_schema(table)
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+
+    def encode(self, rows: List[dict]) -> bytes:
+        self.writer.write_table(self._pa.Table.from_pylist(rows, schema=self.schema))
+        return self.sink.take()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.take()
+
+
+async def stream_user_export(
+    session_factory, user_id: int, fmt: str, table: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """Genera la exportación por lotes desde cursores del lado del servidor.
+
+    Abre su propia sesión: el generador sigue corriendo después de que el
+    endpoint devuelve la StreamingResponse.
+    """
+    tables = (table,) if table else EXPORT_TABLES
+    async with session_factory() as db:
+        for name in tables:
+            result = await db.stream(export_query(name, user_id))
+            encoder = ParquetEncoder(name) if fmt == "parquet" else None
+            async for partition in result.mappings().partitions():
+                rows = [dict(row) for row in partition]
+                yield encoder.encode(rows) if encoder else ndjson_lines(name, rows, tagged=table is None)
+            if encoder:
+                yield encoder.close()
+
+
+def iter_table_export(db, table: str, fmt: str, user_id: Optional[int] = None) -> Iterator[bytes]:
+    """Versión síncrona para el CLI de administración."""
+    result = db.execute(export_query(table, user_id))
+    encoder = ParquetEncoder(table) if fmt == "parquet" else None
+    for partition in result.mappings().partitions():
+        rows = [dict(row) for row in partition]
+        yield encoder.encode(rows) if encoder else ndjson_lines(table, rows, tagged=False)
+    if encoder:
+        yield encoder.close()
+
+
+def export_all(db, directory: str, fmt: str, tables: Iterable[str], user_id: Optional[int] = None) -> Dict[str, str]:
+    os.makedirs(directory, exist_ok=True)
+    written = {}
+    for table in tables:
+        path = os.path.join(directory, f"{table}.{'parquet' if fmt == 'parquet' else 'ndjson'}")
+        with open(path, "wb") as f:
+            for chunk in iter_table_export(db, table, fmt, user_id):
+                f.write(chunk)
+        written[table] = path
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+
+    from .database import SQLALCHEMY_DATABASE_URL
+
+    parser = argparse.ArgumentParser(description="Exportación masiva de historial (un fichero por tabla)")
+    parser.add_argument("--out", required=True, help="Directorio de salida")
+    parser.add_argument("--format", choices=("ndjson", "parquet"), default="ndjson")
+    parser.add_argument("--tables", nargs="*", choices=EXPORT_TABLES, default=list(EXPORT_TABLES))
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument(
+        "--database-url",
+        default=SQLALCHEMY_DATABASE_URL,
+        help="Apuntar a una réplica de lectura para no cargar el primario",
+    )
+    args = parser.parse_args()
+
+    export_engine = create_engine(args.database_url)
+    with Session(export_engine) as session:
+        if export_engine.dialect.name == "postgresql":
+            # Una sola instantánea para todas las tablas; un SELECT en MVCC no bloquea escrituras
+            session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"))
+        for table, path in export_all(session, args.out, args.format, args.tables, args.user_id).items():
+            print(f"{table}: {path}")
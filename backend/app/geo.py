@@ -0,0 +1,123 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_cross(lats_a, lons_a, lats_b, lons_b) -> np.ndarray:
+    """Matriz len(a) x len(b) de distancias en km."""
+    phi_a = np.radians(np.asarray(lats_a, dtype=np.float64))
+    phi_b = np.radians(np.asarray(lats_b, dtype=np.float64))
+    lmb_a = np.radians(np.asarray(lons_a, dtype=np.float64))
+    lmb_b = np.radians(np.asarray(lons_b, dtype=np.float64))
+    dphi = phi_a[:, None] - phi_b[None, :]
+    dlmb = lmb_a[:, None] - lmb_b[None, :]
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi_a)[:, None] * np.cos(phi_b)[None, :] * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(lats, lons) -> np.ndarray:
+    """Matriz NxN de distancias en km entre todos los pares de coordenadas."""
+    return haversine_cross(lats, lons, lats, lons)
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int) -> tuple:
+    """(alto, ancho) en grados de una celda geohash."""
+    total = 5 * precision
+    lon_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_successor(prefix: str):
+    """Primer prefijo que ordena después de todos los que empiezan por `prefix`."""
+    chars = list(prefix)
+    while chars:
+        idx = GEOHASH_ALPHABET.index(chars[-1])
+        if idx + 1 < len(GEOHASH_ALPHABET):
+            chars[-1] = GEOHASH_ALPHABET[idx + 1]
+            return "".join(chars)
+        chars.pop()
+    return None
+
+
+def geohash_cover(min_lat: float, min_lon: float, max_lat: float, max_lon: float, max_cells: int = 16) -> list:
+    """Celdas geohash que cubren la caja, con la mayor precisión que no pase de `max_cells`."""
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        rows = math.floor((max_lat + 90.0) / height) - math.floor((min_lat + 90.0) / height) + 1
+        cols = math.floor((max_lon + 180.0) / width) - math.floor((min_lon + 180.0) / width) + 1
+        if rows * cols <= max_cells or precision == 1:
+            break
+    first_row = math.floor((min_lat + 90.0) / height)
+    first_col = math.floor((min_lon + 180.0) / width)
+    cells = set()
+    for r in range(first_row, first_row + rows):
+        for c in range(first_col, first_col + cols):
+            lat = min(-90.0 + (r + 0.5) * height, 90.0)
+            lon = min(-180.0 + (c + 0.5) * width, 180.0)
+            cells.add(geohash_encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def split_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> list:
+    """Parte en dos la caja que cruza el antimeridiano (longitudes fuera de [-180, 180])."""
+    if max_lon - min_lon >= 360.0:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    if min_lon < -180.0:
+        return [(min_lat, min_lon + 360.0, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+    if max_lon > 180.0:
+        return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon - 360.0)]
+    return [(min_lat, min_lon, max_lat, max_lon)]
+
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> tuple:
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlon = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
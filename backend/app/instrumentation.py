@@ -0,0 +1,274 @@
+import hashlib
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+from .config import settings
+
+logger = logging.getLogger("tinvel.instrumentation")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """Registro mínimo de métricas con salida en formato de texto de Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+        self._histograms: Dict[str, Dict[Labels, list]] = defaultdict(dict)
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def _declare(self, name: str, kind: str, help_text: str):
+        self._help.setdefault(name, (kind, help_text))
+
+    def inc(self, name: str, help_text: str, value: float = 1.0, **labels):
+        self._declare(name, "counter", help_text)
+        key = _labels(**labels)
+        with self._lock:
+            self._counters[name][key] = self._counters[name].get(key, 0.0) + value
+
+    def observe(self, name: str, help_text: str, value: float, **labels):
+        self._declare(name, "histogram", help_text)
+        key = _labels(**labels)
+        with self._lock:
+            # [cuentas por bucket..., +Inf, suma]
+            hist = self._histograms[name].setdefault(key, [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+            hist[bisect_left(LATENCY_BUCKETS, value)] += 1
+            hist[-1] += value
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], float]):
+        self._declare(name, "gauge", help_text)
+        self._gauges[name] = fn
+
+    def render(self) -> str:
+        lines = []
+
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            for name, (kind, help_text) in sorted(self._help.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    for labels, value in sorted(self._counters[name].items()):
+                        lines.append(f"{name}{fmt(labels)} {value}")
+                elif kind == "histogram":
+                    for labels, hist in sorted(self._histograms[name].items()):
+                        cumulative = 0
+                        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), hist[:-1]):
+                            cumulative += count
+                            le = "+Inf" if bound == float("inf") else repr(bound)
+                            lines.append(f"{name}_bucket{fmt(labels, (('le', le),))} {cumulative}")
+                        lines.append(f"{name}_sum{fmt(labels)} {hist[-1]}")
+                        lines.append(f"{name}_count{fmt(labels)} {cumulative}")
+                else:
+                    lines.append(f"{name} {self._gauges[name]()}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_time: float = 0.0
+    pool_wait: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("tinvel_request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("tinvel_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["tinvel_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += time.perf_counter() - started
+        # La sentencia ya viene parametrizada: el texto es la "forma" de la consulta
+        stats.shapes[statement] += 1
+
+
+def record_pool_wait(seconds: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+def timed_pool_class(base):
+    """Subclase del pool que mide la espera para obtener una conexión."""
+
+    class TimedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                record_pool_wait(time.perf_counter() - started)
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def instrument_engine(sync_engine):
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _record_request(route: str, method: str, status: int, wall: float, stats: RequestStats):
+    metrics.inc("tinvel_http_requests_total", "HTTP requests", method=method, route=route, status=status)
+    metrics.observe("tinvel_http_request_duration_seconds", "Wall time per request", wall, method=method, route=route)
+    metrics.inc("tinvel_db_statements_total", "SQL statements executed", stats.statements, route=route)
+    metrics.inc("tinvel_db_time_seconds_total", "Time spent in SQL statements", stats.db_time, route=route)
+    metrics.inc("tinvel_db_pool_wait_seconds_total", "Time waiting for a pooled connection", stats.pool_wait, route=route)
+    for statement, count in stats.shapes.items():
+        if count >= settings.N_PLUS_ONE_THRESHOLD:
+            shape = hashlib.blake2b(statement.encode(), digest_size=4).hexdigest()
+            metrics.inc("tinvel_n_plus_one_total", "Requests repeating one statement shape", route=route, shape=shape)
+            logger.warning(
+                "Posible N+1 en %s %s: %d ejecuciones de [%s] %s",
+                method, route, count, shape, " ".join(statement.split())[:300],
+            )
+
+
+class InstrumentationMiddleware:
+    """Tiempo total, sentencias SQL, tiempo de BD y espera del pool por ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            # La plantilla de la ruta agrupa /trips/1 y /trips/2; sin ruta, no se etiqueta por path
+            path = getattr(route, "path", "unmatched")
+            _record_request(path, scope["method"], status, time.perf_counter() - started, stats)
+
+
+class SamplingProfiler:
+    """Muestrea las pilas de todos los hilos cada `interval` segundos.
+
+    El resultado está en formato de pilas colapsadas (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, interval: float, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tinvel-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+profiler = SamplingProfiler(settings.PROFILER_INTERVAL_MS / 1000.0)
+
+router = APIRouter(tags=["metrics"])
+profiler_router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@profiler_router.post("/profiler")
+def toggle_profiler(enabled: bool = Query(...), reset: bool = False):
+    if reset:
+        profiler.samples.clear()
+    if enabled:
+        profiler.start()
+    else:
+        profiler.stop()
+    return {"running": profiler.running, "samples": sum(profiler.samples.values())}
+
+
+@profiler_router.get("/profile", response_class=PlainTextResponse)
+def get_profile():
+    return PlainTextResponse(profiler.collapsed())
+
+
+def install(app):
+    # Import tardío: database importa este módulo para timed_pool_class
+    from .database import async_engine, engine
+
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    app.add_middleware(InstrumentationMiddleware)
+    app.include_router(profiler_router)
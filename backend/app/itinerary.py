@@ -0,0 +1,165 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import settings
+from .geo import haversine_matrix
+from .route_engine import RouteSolution, solve_order, travel_minutes
+from .travel_matrix import travel_matrices
+
+
+def k_medoids(dist: np.ndarray, k: int, max_iter: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+    """Agrupa n puntos en k clusters sobre una matriz de distancias.
+
+    Arranque determinista (medoide global y después el punto más lejano a los
+    ya elegidos) e iteración de Voronoi: asignar al medoide más cercano y mover
+    cada medoide al miembro que minimiza la suma de distancias de su cluster.
+    """
+    n = dist.shape[0]
+    k = max(1, min(k, n))
+    medoids = [int(np.argmin(dist.sum(axis=1)))]
+    nearest = dist[medoids[0]].copy()
+    for _ in range(1, k):
+        candidate = int(np.argmax(nearest))
+        if nearest[candidate] <= 0:
+            break  # quedan sólo puntos repetidos
+        medoids.append(candidate)
+        nearest = np.minimum(nearest, dist[candidate])
+    medoids = np.array(medoids, dtype=np.int64)
+
+    for _ in range(max_iter):
+        labels = np.argmin(dist[:, medoids], axis=1)
+        updated = medoids.copy()
+        for c in range(len(medoids)):
+            members = np.flatnonzero(labels == c)
+            if members.size:
+                updated[c] = members[np.argmin(dist[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    return np.argmin(dist[:, medoids], axis=1), medoids
+
+
+def _day_minutes(minutes: np.ndarray, visit: np.ndarray, order: Sequence[int]) -> float:
+    if not len(order):
+        return 0.0
+    order = np.asarray(order)
+    return float(visit[order].sum() + minutes[order[:-1], order[1:]].sum())
+
+
+def _fitting_prefix(minutes: np.ndarray, visit: np.ndarray, order: np.ndarray, budget: float) -> int:
+    """Cuántas paradas del orden caben en el presupuesto del día."""
+    if not len(order):
+        return 0
+    legs = np.concatenate(([0.0], minutes[order[:-1], order[1:]]))
+    used = np.cumsum(legs + visit[order])
+    return int(np.searchsorted(used, budget, side="right"))
+
+
+def _cheapest_insertion(minutes: np.ndarray, order: List[int], place: int) -> Tuple[int, float]:
+    """Posición y minutos extra de desplazamiento al insertar `place` en el camino."""
+    if not order:
+        return 0, 0.0
+    path = np.asarray(order)
+    # Extremos: antes del primero o después del último
+    costs = np.concatenate((
+        [minutes[place, path[0]]],
+        minutes[path[:-1], place] + minutes[place, path[1:]] - minutes[path[:-1], path[1:]],
+        [minutes[path[-1], place]],
+    ))
+    pos = int(np.argmin(costs))
+    return pos, float(costs[pos])
+
+
+def plan_itinerary(
+    place_ids: Sequence[int],
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    days: int,
+    hours_per_day: float,
+    visit_minutes: Optional[Sequence[float]] = None,
+    time_budget_ms: Optional[float] = None,
+    distances: Optional[np.ndarray] = None,
+) -> Tuple[List[RouteSolution], List[int]]:
+    """Reparte los lugares en días y ordena cada día dentro de `hours_per_day`.
+
+    Devuelve una solución por día no vacío y los ids de los lugares que no
+    caben en ninguno.
+    """
+    n = len(place_ids)
+    if n == 0:
+        return [], []
+
+    if distances is None:
+        distances = haversine_matrix(latitudes, longitudes)
+    minutes = travel_minutes(distances)
+    if visit_minutes is None:
+        visit = np.full(n, settings.ITINERARY_VISIT_MINUTES)
+    else:
+        visit = np.asarray(visit_minutes, dtype=np.float64)
+    day_budget = hours_per_day * 60.0
+
+    labels, medoids = k_medoids(distances, days)
+    k = len(medoids)
+    budget = settings.ITINERARY_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+    # Mitad para ordenar cada cluster y mitad para reordenar tras reubicar sobrantes
+    per_day_ms = budget / (2 * k)
+
+    plans: List[List[int]] = []
+    overflow: List[int] = []
+    for c in range(k):
+        members = np.flatnonzero(labels == c)
+        order = members[solve_order(minutes[np.ix_(members, members)], per_day_ms)]
+        fits = _fitting_prefix(minutes, visit, order, day_budget)
+        plans.append(order[:fits].tolist())
+        overflow.extend(order[fits:].tolist())
+
+    # Los sobrantes van al día con hueco más cercano, en su mejor posición
+    unscheduled: List[int] = []
+    changed = set()
+    used = [_day_minutes(minutes, visit, plan) for plan in plans]
+    for place in sorted(overflow, key=lambda p: distances[p, medoids].min()):
+        for c in np.argsort(distances[place, medoids], kind="stable"):
+            pos, extra = _cheapest_insertion(minutes, plans[c], place)
+            if used[c] + extra + visit[place] <= day_budget:
+                plans[c].insert(pos, place)
+                used[c] += extra + visit[place]
+                changed.add(c)
+                break
+        else:
+            unscheduled.append(int(place_ids[place]))
+
+    solutions = []
+    for c, plan in enumerate(plans):
+        if not plan:
+            continue
+        order = np.asarray(plan)
+        if c in changed:
+            # El solver vuelve a empezar desde cero y puede dar un camino más largo
+            # que el de las inserciones: sólo se acepta si no alarga el día
+            resolved = order[solve_order(minutes[np.ix_(order, order)], per_day_ms)]
+            if _day_minutes(minutes, visit, resolved) <= used[c]:
+                order = resolved
+        solutions.append(RouteSolution(
+            place_ids=[int(place_ids[i]) for i in order],
+            latitudes=[float(latitudes[i]) for i in order],
+            longitudes=[float(longitudes[i]) for i in order],
+            leg_minutes=[0.0] + minutes[order[:-1], order[1:]].tolist(),
+            leg_km=[0.0] + distances[order[:-1], order[1:]].tolist(),
+            visit_minutes=visit[order].tolist(),
+        ))
+    return solutions, unscheduled
+
+
+def plan_for_places(
+    places: Sequence, days: int, hours_per_day: float, city: Optional[str] = None
+) -> Tuple[List[RouteSolution], List[int]]:
+    place_ids = [p.id for p in places]
+    return plan_itinerary(
+        place_ids,
+        [p.latitude for p in places],
+        [p.longitude for p in places],
+        days,
+        hours_per_day,
+        distances=travel_matrices.distances(city, place_ids),
+    )
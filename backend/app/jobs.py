@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .config import settings
+from .database import AsyncSessionLocal, dialect_insert
+from .queries import ROUTE_COLUMNS, liked_places
+from .realtime import realtime
+from .route_engine import add_route, solve_for_places, with_provider_legs
+
+logger = logging.getLogger("tinvel.jobs")
+
+MIN_ROUTE_PLACES = 2
+
+
+def content_hash(trip_id: int, places: Sequence) -> str:
+    """Huella del conjunto de lugares con like (id y coordenadas) de un viaje."""
+    digest = hashlib.blake2b(str(trip_id).encode(), digest_size=32)
+    for place_id, lat, lon in sorted(places):
+        digest.update(f"|{place_id}:{lat!r}:{lon!r}".encode())
+    return digest.hexdigest()
+
+
+async def enqueue(db: AsyncSession, trip_id: int, places: Sequence) -> models.RouteJob:
+    """Encola la ruta del viaje o devuelve el job existente para el mismo contenido.
+
+    Un reintento con los mismos lugares cae en el mismo (trip_id, hash): si ya
+    terminó es un acierto de caché, si está en curso se reutiliza, y sólo un
+    job fallido vuelve a la cola.
+    """
+    digest = content_hash(trip_id, places)
+    now = datetime.utcnow()
+    stmt = dialect_insert(db, models.RouteJob).values(
+        trip_id=trip_id, content_hash=digest, status="queued", attempts=0, created_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.RouteJob.trip_id, models.RouteJob.content_hash],
+        set_={"status": "queued", "error": None, "created_at": now, "finished_at": None},
+        where=models.RouteJob.status == "failed",
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+    result = await db.execute(
+        select(models.RouteJob).where(
+            models.RouteJob.trip_id == trip_id,
+            models.RouteJob.content_hash == digest,
+        )
+    )
+    job = result.scalar_one()
+    if job.status == "queued":
+        route_jobs.notify()
+    return job
+
+
+def job_out(job: models.RouteJob) -> schemas.RouteJobOut:
+    return schemas.RouteJobOut(
+        id=job.id,
+        trip_id=job.trip_id,
+        status=job.status,
+        route_id=job.route_id,
+        result=schemas.RouteResponse(**json.loads(job.result)) if job.result else None,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
+
+
+class RouteJobWorker:
+    """Consume la tabla route_jobs con SELECT ... FOR UPDATE SKIP LOCKED.
+
+    Varios procesos pueden correr workers contra la misma base: cada job lo
+    reclama uno solo. Mientras lo procesa, el worker renueva `heartbeat_at`
+    cada tercio de `stale_seconds`; un job `running` sin latido en
+    `stale_seconds` (worker caído) vuelve a reclamarse. `attempts` identifica
+    la reclamación: un worker que perdió el job no escribe su resultado.
+
+    Sin trabajo, la espera entre sondeos crece hasta `max_poll_seconds`;
+    `notify()` (un encolado en este proceso) despierta a los workers al momento.
+    """
+
+    def __init__(self, concurrency: int, poll_seconds: float, stale_seconds: float, max_poll_seconds: float):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.max_poll_seconds = max(max_poll_seconds, poll_seconds)
+        self.stale_seconds = stale_seconds
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def start(self):
+        for n in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._run(), name=f"route-job-worker-{n}"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        delay = self.poll_seconds
+        while True:
+            try:
+                processed = await self.run_once()
+            except Exception:
+                logger.exception("Error en el worker de rutas")
+                processed = False
+            if processed:
+                delay = self.poll_seconds
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+                delay = self.poll_seconds
+            except asyncio.TimeoutError:
+                delay = min(delay * 2, self.max_poll_seconds)
+            self._wakeup.clear()
+
+    async def _heartbeat(self, job_id: int, attempt: int):
+        while True:
+            await asyncio.sleep(self.stale_seconds / 3)
+            try:
+                async with AsyncSessionLocal() as db:
+                    renewed = await db.execute(
+                        update(models.RouteJob)
+                        .where(
+                            models.RouteJob.id == job_id,
+                            models.RouteJob.status == "running",
+                            models.RouteJob.attempts == attempt,
+                        )
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    await db.commit()
+            except Exception:
+                logger.exception("No se pudo renovar el job de ruta %s", job_id)
+                continue
+            if renewed.rowcount != 1:
+                return
+
+    async def _claim(self, db: AsyncSession) -> Optional[Tuple[int, int, int]]:
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.stale_seconds)
+        last_seen = func.coalesce(models.RouteJob.heartbeat_at, models.RouteJob.started_at)
+        result = await db.execute(
+            select(models.RouteJob.id, models.RouteJob.trip_id, models.RouteJob.attempts)
+            .where(or_(
+                models.RouteJob.status == "queued",
+                and_(models.RouteJob.status == "running", last_seen < stale),
+            ))
+            .order_by(models.RouteJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        row = result.first()
+        if row is None:
+            await db.rollback()
+            return None
+        job_id, trip_id, attempts = row
+        # `attempts` como versión: sin FOR UPDATE (SQLite) dos workers no se llevan el mismo job
+        claimed = await db.execute(
+            update(models.RouteJob)
+            .where(models.RouteJob.id == job_id, models.RouteJob.attempts == attempts)
+            .values(status="running", started_at=now, heartbeat_at=now, attempts=attempts + 1)
+        )
+        await db.commit()
+        return (job_id, trip_id, attempts + 1) if claimed.rowcount == 1 else None
+
+    async def run_once(self) -> bool:
+        """Procesa un job si hay alguno; devuelve False si la cola estaba vacía."""
+        async with AsyncSessionLocal() as db:
+            claimed = await self._claim(db)
+            if claimed is None:
+                return False
+            job_id, trip_id, attempt = claimed
+            heartbeat = asyncio.create_task(self._heartbeat(job_id, attempt), name=f"route-job-heartbeat-{job_id}")
+            values = {}
+            try:
+                trip = await db.get(models.Trip, trip_id)
+                result = await db.execute(liked_places(ROUTE_COLUMNS, trip_id=trip_id))
+                places = result.all()
+                if len(places) < MIN_ROUTE_PLACES:
+                    raise ValueError("Necesitas al menos 2 lugares para generar una ruta")
+                solution = await run_in_threadpool(solve_for_places, places, None, trip.destination_city)
+                solution = await with_provider_legs(solution)
+                route = await add_route(db, trip_id, solution)
+                values.update(
+                    status="done",
+                    route_id=route.id,
+                    result=json.dumps(solution.to_response(route_id=route.id).dict()),
+                    error=None,
+                )
+            except Exception as exc:
+                await db.rollback()
+                logger.exception("Falló el job de ruta %s", job_id)
+                values.update(status="failed", error=str(exc))
+            finally:
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
+            values["finished_at"] = datetime.utcnow()
+            finished = await db.execute(
+                update(models.RouteJob)
+                .where(models.RouteJob.id == job_id, models.RouteJob.attempts == attempt)
+                .values(**values)
+            )
+            if finished.rowcount != 1:
+                # Otro worker lo reclamó por falta de latido: su resultado (y su ruta) es el que vale
+                await db.rollback()
+                logger.warning("El job de ruta %s se reclamó mientras se procesaba; se descarta", job_id)
+                return True
+            await db.commit()
+        if values["status"] == "done":
+            await realtime.publish(trip_id, {"type": "route", "route_id": values["route_id"], "job_id": job_id})
+        return True
+
+
+route_jobs = RouteJobWorker(
+    settings.ROUTE_JOB_WORKERS,
+    settings.ROUTE_JOB_POLL_SECONDS,
+    settings.ROUTE_JOB_STALE_SECONDS,
+    settings.ROUTE_JOB_MAX_POLL_SECONDS,
+)
+
+
+async def _main(concurrency: int):
+    worker = RouteJobWorker(
+        concurrency,
+        settings.ROUTE_JOB_POLL_SECONDS,
+        settings.ROUTE_JOB_STALE_SECONDS,
+        settings.ROUTE_JOB_MAX_POLL_SECONDS,
+    )
+    await worker.start()
+    await asyncio.gather(*worker._tasks)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Worker dedicado de la cola de rutas")
+    parser.add_argument("--concurrency", type=int, default=max(settings.ROUTE_JOB_WORKERS, 1))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args.concurrency))
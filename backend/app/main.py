@@ -1,12 +1,33 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
-from .database import engine, Base
-from .routers import places, swipes, routes, auth, trips
+from . import instrumentation
+from .jobs import route_jobs
+from .realtime import realtime
+from .routing_providers import routing_provider
+from .security import check_secret_key
+from .swipe_buffer import swipe_buffer
+from .routers import places, swipes, routes, auth, trips, users, tiles
+
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_secret_key(startup=True)
+    await realtime.start()
+    if settings.SWIPE_WRITE_BEHIND:
+        await swipe_buffer.start()
+    await route_jobs.start()
+    yield
+    await route_jobs.stop()
+    # Vacía la cola antes de parar realtime: el flush publica los eventos de swipe
+    await swipe_buffer.stop()
+    await realtime.stop()
+    await routing_provider.aclose()
 
-app = FastAPI(title="Tinvel API")
+
+app = FastAPI(title="Tinvel API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,11 +37,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.PROFILING_ENABLED:
+    instrumentation.install(app)
+
+app.include_router(instrumentation.router)
 app.include_router(auth.router)
 app.include_router(places.router)
 app.include_router(swipes.router)
 app.include_router(routes.router)
 app.include_router(trips.router)
+app.include_router(users.router)
+app.include_router(tiles.router)
 
 
 @app.get("/health")
@@ -6,14 +6,20 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
     String,
     Text,
     UniqueConstraint,
+    column,
+    func,
+    literal_column,
 )
 from sqlalchemy.orm import relationship
 
 from .database import Base
+from .geo import geohash_encode
 
 
 class User(Base):
@@ -41,18 +47,47 @@ class Trip(Base):
     swipes = relationship("Swipe", back_populates="trip", cascade="all, delete-orphan")
     trip_places = relationship("TripPlace", back_populates="trip", cascade="all, delete-orphan")
     routes = relationship("Route", back_populates="trip", cascade="all, delete-orphan")
+    members = relationship("TripMember", back_populates="trip", cascade="all, delete-orphan")
+    summary = relationship("TripSummary", uselist=False, cascade="all, delete-orphan")
+
+
+def _place_geohash(context):
+    params = context.get_current_parameters()
+    return geohash_encode(params["latitude"], params["longitude"])
+
+
+def search_vector(name, description):
+    """tsvector de nombre y descripción.
+
+    Índice y consultas usan esta misma expresión, con literales y no
+    parámetros, para que Postgres pueda usar el GIN.
+    """
+    return func.to_tsvector(
+        literal_column("'simple'"),
+        func.coalesce(name, literal_column("''"))
+        .op("||")(literal_column("' '"))
+        .op("||")(func.coalesce(description, literal_column("''"))),
+    )
 
 
 class Place(Base):
     __tablename__ = "places"
+    __table_args__ = (
+        # Mazo por ciudad: filtro por ciudad y activos, keyset por id
+        Index("ix_places_city_active", "city", "is_active", "id"),
+        Index(
+            "ix_places_search", search_vector(column("name"), column("description")), postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     description = Column(Text)
-    city = Column(String, nullable=False, index=True)
+    city = Column(String, nullable=False)
     country = Column(String, nullable=False, index=True)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    geohash = Column(String(12), index=True, default=_place_geohash)
     image_url = Column(Text)
     is_active = Column(Boolean, default=True)
 
@@ -62,6 +97,10 @@ class Place(Base):
     route_points = relationship("RoutePoint", back_populates="place")
 
 
+# Búsqueda por ciudad sin distinguir mayúsculas (ver get_places_by_city)
+Index("ix_places_city_lower", func.lower(Place.city))
+
+
 class Category(Base):
     __tablename__ = "categories"
 
@@ -71,6 +110,20 @@ class Category(Base):
     place_categories = relationship("PlaceCategory", back_populates="category", cascade="all, delete-orphan")
 
 
+class CityCategoryCount(Base):
+    """Facetas precalculadas: lugares activos por ciudad y categoría.
+
+    Se mantiene con incrementos en las mismas transacciones que cambian
+    lugares o categorías (ver search.py).
+    """
+
+    __tablename__ = "city_category_counts"
+
+    city = Column(String, primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    places = Column(Integer, nullable=False, default=0)
+
+
 class PlaceCategory(Base):
     __tablename__ = "place_categories"
     __table_args__ = (
@@ -88,11 +141,16 @@ class Swipe(Base):
     __tablename__ = "swipes"
     __table_args__ = (
         UniqueConstraint("user_id", "trip_id", "place_id", name="uq_swipe_user_trip_place"),
+        # Likes de un viaje (mazo, matches, recomendador) sin tocar la tabla
+        Index("ix_swipes_trip_liked_place", "trip_id", "liked", "place_id"),
+        Index("ix_swipes_user_liked", "user_id", "liked"),
     )
 
+    # En Postgres la tabla puede estar particionada por hash de user_id
+    # (migración 0003); allí la PK real es (id, user_id).
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False)
     place_id = Column(Integer, ForeignKey("places.id"), nullable=False, index=True)
     liked = Column(Boolean, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -102,6 +160,20 @@ class Swipe(Base):
     place = relationship("Place", back_populates="swipes")
 
 
+class TripMember(Base):
+    """Participantes de un viaje compartido (el creador incluido)."""
+
+    __tablename__ = "trip_members"
+
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    role = Column(String(16), nullable=False, default="member")
+    joined_at = Column(DateTime, default=datetime.utcnow)
+
+    trip = relationship("Trip", back_populates="members")
+    user = relationship("User")
+
+
 class TripPlace(Base):
     __tablename__ = "trip_places"
     __table_args__ = (
@@ -122,8 +194,12 @@ class Route(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
+    # Día del itinerario (1..N); NULL para rutas sueltas
+    day = Column(Integer)
     total_time = Column(Float)
     total_distance = Column(Float)
+    # Recorrido completo como polyline codificada de Google (precisión 5, ~1 m)
+    geometry = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     trip = relationship("Trip", back_populates="routes")
@@ -132,9 +208,12 @@ class Route(Base):
 
 class RoutePoint(Base):
     __tablename__ = "route_points"
+    __table_args__ = (
+        Index("ix_route_points_route_step", "route_id", "step_order"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    route_id = Column(Integer, ForeignKey("routes.id"), nullable=False, index=True)
+    route_id = Column(Integer, ForeignKey("routes.id"), nullable=False)
     place_id = Column(Integer, ForeignKey("places.id"), nullable=False, index=True)
     step_order = Column(Integer, nullable=False)
     latitude = Column(Float, nullable=False)
@@ -143,3 +222,53 @@ class RoutePoint(Base):
 
     route = relationship("Route", back_populates="points")
     place = relationship("Place", back_populates="route_points")
+
+
+class RouteJob(Base):
+    """Cola de generación de rutas; también hace de caché del resultado."""
+
+    __tablename__ = "route_jobs"
+    __table_args__ = (
+        # Un job por viaje y conjunto de lugares con like (hash del contenido)
+        UniqueConstraint("trip_id", "content_hash", name="uq_route_job_trip_hash"),
+        Index("ix_route_jobs_status_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False, index=True)
+    content_hash = Column(String(64), nullable=False)
+    status = Column(String(16), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    route_id = Column(Integer, ForeignKey("routes.id", ondelete="SET NULL"))
+    result = Column(Text)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    # Lo renueva el worker mientras procesa; un job sin latido reciente se reclama
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class TripSummary(Base):
+    """Resumen desnormalizado de un viaje, mantenido desde las escrituras de
+    swipes y rutas (ver trip_summary.py). Se lee con una sola búsqueda por PK."""
+
+    __tablename__ = "trip_summaries"
+
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), primary_key=True)
+    city = Column(String, nullable=False)
+    country = Column(String, nullable=False)
+    swipe_count = Column(Integer, nullable=False, default=0)
+    like_count = Column(Integer, nullable=False, default=0)
+    # {place_id: likes}; las claves son los lugares con al menos un like
+    place_likes = Column(JSON, nullable=False, default=dict)
+    centroid_lat = Column(Float)
+    centroid_lon = Column(Float)
+    min_lat = Column(Float)
+    min_lon = Column(Float)
+    max_lat = Column(Float)
+    max_lon = Column(Float)
+    latest_route_id = Column(Integer, ForeignKey("routes.id", ondelete="SET NULL"))
+    latest_route_total_time = Column(Float)
+    latest_route_total_distance = Column(Float)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=func.now())
@@ -0,0 +1,105 @@
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+Coord = Tuple[float, float]
+
+# Metros por grado de latitud (y de longitud en el ecuador)
+_METERS_PER_DEGREE = 111_320.0
+# Metros por píxel a zoom 0 en el ecuador (teselas de 256 px en Web Mercator)
+_METERS_PER_PIXEL_Z0 = 156_543.03
+
+
+def encode(points: Sequence[Coord], precision: int = 5) -> str:
+    """Polyline codificada de Google: deltas enteros en base64 de 5 bits por carácter."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        ilat, ilon = round(lat * factor), round(lon * factor)
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+def decode(text: str, precision: int = 5) -> List[Coord]:
+    factor = 10 ** precision
+    points = []
+    index = lat = lon = 0
+    while index < len(text):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(text[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+    return points
+
+
+def join_legs(legs: Sequence[Sequence[Coord]]) -> List[Coord]:
+    """Une la geometría de los tramos sin repetir el punto que comparten."""
+    points: List[Coord] = []
+    for leg in legs:
+        for point in leg:
+            point = (float(point[0]), float(point[1]))
+            if not points or points[-1] != point:
+                points.append(point)
+    return points
+
+
+def tolerance_for_zoom(zoom: float, lat: float) -> float:
+    """Metros que ocupa un píxel a ese zoom y latitud: menos no se ve en el mapa."""
+    return _METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / 2 ** zoom
+
+
+def simplify(points: Sequence[Coord], tolerance_m: float) -> List[Coord]:
+    """Douglas-Peucker con pila explícita sobre una proyección local en metros.
+
+    Conserva siempre los extremos; con tolerancia 0 (o menos de 3 puntos)
+    devuelve la geometría tal cual.
+    """
+    n = len(points)
+    if n < 3 or tolerance_m <= 0:
+        return list(points)
+    coords = np.asarray(points, dtype=np.float64)
+    scale = math.cos(math.radians(float(coords[:, 0].mean())))
+    y = coords[:, 0] * _METERS_PER_DEGREE
+    x = coords[:, 1] * _METERS_PER_DEGREE * scale
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            # Distancia al segmento: proyección acotada a [0, 1]
+            t = np.clip((px * dx + py * dy) / (length * length), 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance_m:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return [points[i] for i in np.flatnonzero(keep)]
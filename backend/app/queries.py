@@ -0,0 +1,53 @@
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import exists, or_, select, tuple_
+
+from . import models
+
+# Columnas justas para cada uso; evitan hidratar objetos Place completos.
+ROUTE_COLUMNS = (models.Place.id, models.Place.latitude, models.Place.longitude)
+PIN_COLUMNS = (
+    models.Place.id,
+    models.Place.name,
+    models.Place.latitude.label("lat"),
+    models.Place.longitude.label("lon"),
+)
+PLACE_OUT_COLUMNS = (
+    models.Place.id,
+    models.Place.name,
+    models.Place.description,
+    models.Place.city,
+    models.Place.country,
+    models.Place.latitude,
+    models.Place.longitude,
+    models.Place.image_url,
+    models.Place.is_active,
+)
+
+
+def liked_places(
+    columns=PLACE_OUT_COLUMNS,
+    trip_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    pending: Optional[Dict[Tuple[int, int, int], bool]] = None,
+):
+    """Lugares con al menos un like del viaje y/o usuario, en una sola consulta.
+
+    Se usa EXISTS en lugar de JOIN para que un lugar con varios likes (varios
+    viajes del mismo usuario) salga una sola vez sin DISTINCT. `pending`
+    ({(usuario, viaje, lugar): like}, del mismo viaje y/o usuario) son swipes
+    aún sin escribir que sustituyen a los de la base con la misma clave.
+    """
+    liked = exists().where(
+        models.Swipe.place_id == models.Place.id,
+        models.Swipe.liked.is_(True),
+    )
+    if trip_id is not None:
+        liked = liked.where(models.Swipe.trip_id == trip_id)
+    if user_id is not None:
+        liked = liked.where(models.Swipe.user_id == user_id)
+    if pending:
+        key = tuple_(models.Swipe.user_id, models.Swipe.trip_id, models.Swipe.place_id)
+        liked = liked.where(~key.in_(list(pending)))
+        liked = or_(liked, models.Place.id.in_(sorted({place_id for (_, _, place_id), like in pending.items() if like})))
+    return select(*columns).where(liked).order_by(models.Place.id)
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.engine import make_url
+
+from .config import settings
+from .database import ASYNC_SQLALCHEMY_DATABASE_URL
+
+logger = logging.getLogger("tinvel.realtime")
+
+CHANNEL = "tinvel_trip_events"
+# Espera entre reintentos de la conexión LISTEN, duplicándose hasta el máximo
+RECONNECT_MIN_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30.0
+
+
+class Subscription:
+    """Cola acotada de un cliente conectado.
+
+    Si el cliente no consume al ritmo de los eventos, en lugar de crecer sin
+    límite se vacía la cola y se deja un único evento `resync`: el cliente
+    vuelve a pedir el estado del viaje por HTTP.
+    """
+
+    def __init__(self, trip_id: int, max_size: int):
+        self.trip_id = trip_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+    def push(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.resync()
+
+    def resync(self):
+        self.dropped += self.queue.qsize()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"type": "resync", "trip_id": self.trip_id})
+
+    async def next_batch(self, max_events: int, window_seconds: float) -> List[dict]:
+        """Espera un evento y agrupa los que lleguen dentro de la ventana."""
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + window_seconds
+        while len(batch) < max_events:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+
+class Broker:
+    """Pub/sub en proceso por viaje."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, trip_id: int) -> Subscription:
+        subscription = Subscription(trip_id, self.queue_size)
+        self._subscribers[trip_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.trip_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.trip_id]
+
+    def dispatch(self, trip_id: int, events: List[dict]):
+        for subscription in list(self._subscribers.get(trip_id, ())):
+            for event in events:
+                subscription.push(event)
+
+    def resync_all(self):
+        for subscriptions in list(self._subscribers.values()):
+            for subscription in list(subscriptions):
+                subscription.resync()
+
+
+class MemoryBackend:
+    """Un solo proceso: publicar es repartir directamente."""
+
+    def __init__(self, broker: Broker):
+        self.broker = broker
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, trip_id: int, events: List[dict]):
+        self.broker.dispatch(trip_id, events)
+
+
+class PostgresBackend:
+    """Reparto entre workers con LISTEN/NOTIFY sobre una conexión asyncpg propia.
+
+    Cada proceso escucha el canal y reparte a sus suscriptores locales,
+    incluido el que publicó, así que nadie despacha dos veces. Si se cae la
+    conexión LISTEN se reconecta con backoff y, como lo publicado entretanto
+    se ha perdido, todos los clientes locales reciben `resync`.
+    """
+
+    # NOTIFY admite hasta 8000 bytes de payload
+    MAX_PAYLOAD = 7900
+
+    def __init__(self, broker: Broker, dsn: str):
+        self.broker = broker
+        self.dsn = dsn
+        self._listener = None
+        self._publisher = None
+        self._publish_lock = asyncio.Lock()
+        self._lost: Optional[asyncio.Event] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self._listen()
+        self._publisher = await self._connect()
+        self._watcher = asyncio.create_task(self._watch(), name="realtime-listener")
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        for conn in (self._listener, self._publisher):
+            if conn is not None:
+                await conn.close()
+        self._listener = self._publisher = None
+
+    async def _connect(self):
+        import asyncpg
+
+        return await asyncpg.connect(self.dsn)
+
+    async def _listen(self):
+        lost = asyncio.Event()
+        listener = await self._connect()
+        listener.add_termination_listener(lambda connection: lost.set())
+        await listener.add_listener(CHANNEL, self._on_notify)
+        self._listener, self._lost = listener, lost
+
+    async def _watch(self):
+        while True:
+            await self._lost.wait()
+            logger.warning("Conexión LISTEN perdida; reconectando")
+            delay = RECONNECT_MIN_SECONDS
+            while True:
+                try:
+                    await self._listen()
+                    break
+                except Exception:
+                    logger.exception("No se pudo reconectar LISTEN; reintento en %.1fs", delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+            self.broker.resync_all()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        message = json.loads(payload)
+        self.broker.dispatch(message["trip_id"], message["events"])
+
+    async def publish(self, trip_id: int, events: List[dict]):
+        payloads = []
+        chunk: List[dict] = []
+        for event in events:
+            candidate = json.dumps({"trip_id": trip_id, "events": chunk + [event]}, default=str)
+            if chunk and len(candidate) > self.MAX_PAYLOAD:
+                payloads.append(json.dumps({"trip_id": trip_id, "events": chunk}, default=str))
+                chunk = [event]
+            else:
+                chunk.append(event)
+        if chunk:
+            payloads.append(json.dumps({"trip_id": trip_id, "events": chunk}, default=str))
+        async with self._publish_lock:
+            if self._publisher is None or self._publisher.is_closed():
+                self._publisher = await self._connect()
+            for payload in payloads:
+                await self._publisher.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+
+
+class Realtime:
+    def __init__(self, backend_name: str, queue_size: int):
+        self.broker = Broker(queue_size)
+        self.backend_name = backend_name
+        self.backend = MemoryBackend(self.broker)
+
+    async def start(self):
+        if self.backend_name == "postgres":
+            url = make_url(ASYNC_SQLALCHEMY_DATABASE_URL).set(drivername="postgresql")
+            self.backend = PostgresBackend(self.broker, url.render_as_string(hide_password=False))
+        await self.backend.start()
+
+    async def stop(self):
+        await self.backend.stop()
+
+    async def publish(self, trip_id: int, *events: dict):
+        """Publica eventos de un viaje; un fallo aquí nunca rompe la escritura que lo originó."""
+        if not events:
+            return
+        try:
+            await self.backend.publish(trip_id, list(events))
+        except Exception:
+            logger.exception("No se pudieron publicar eventos del viaje %s", trip_id)
+
+
+realtime = Realtime(settings.REALTIME_BACKEND, settings.REALTIME_QUEUE_SIZE)
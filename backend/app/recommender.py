@@ -0,0 +1,340 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import settings
+
+WEIGHT_ITEM = 1.0
+WEIGHT_CONTENT = 0.5
+WEIGHT_POPULARITY = 0.2
+DISLIKE_PENALTY = 0.5
+# Número de incrementos pendientes antes de fundirlos en la matriz base
+COMPACT_AFTER = 50000
+# Swipes del viaje tras los que se recalcula un ranking en caché
+RERANK_AFTER_SWIPES = 10
+
+
+def _normalized(values: np.ndarray) -> np.ndarray:
+    scale = np.abs(values).max() if values.size else 0.0
+    return values / scale if scale > 0 else values
+
+
+class Snapshot(NamedTuple):
+    """Estado inmutable con el que puntúa el threadpool: nada de esto lo muta record()."""
+
+    index: Dict[int, int]
+    cooc: sp.csr_matrix
+    features: sp.csr_matrix
+
+
+def _pad(matrix: sp.csr_matrix, rows: int, cols: int) -> sp.csr_matrix:
+    """Copia con filas/columnas vacías añadidas (lugares vistos después del build)."""
+    indptr = np.concatenate([matrix.indptr, np.full(rows - matrix.shape[0], matrix.indptr[-1], dtype=matrix.indptr.dtype)])
+    return sp.csr_matrix((matrix.data, matrix.indices, indptr), shape=(rows, cols))
+
+
+def _build_model(likes: Sequence[Tuple[int, int]], place_categories: Sequence[Tuple[int, int]]):
+    """Índice, likes por viaje y matrices base en estructuras nuevas (corre en el threadpool)."""
+    index: Dict[int, int] = {}
+    trip_likes: Dict[int, Counter] = defaultdict(Counter)
+    for trip_id, place_id in likes:
+        trip_likes[trip_id][index.setdefault(place_id, len(index))] += 1
+    for place_id, _ in place_categories:
+        index.setdefault(place_id, len(index))
+    n = len(index)
+
+    trip_rows = {trip_id: row for row, trip_id in enumerate(trip_likes)}
+    rows = np.fromiter((trip_rows[t] for t, _ in likes), dtype=np.int64, count=len(likes))
+    cols = np.fromiter((index[p] for _, p in likes), dtype=np.int64, count=len(likes))
+    sessions = sp.csr_matrix(
+        (np.ones(len(likes), dtype=np.float32), (rows, cols)), shape=(len(trip_rows), n)
+    )
+    sessions.data[:] = 1.0  # likes repetidos cuentan una vez
+    cooc = (sessions.T @ sessions).tocsr()
+
+    n_categories = max((c for _, c in place_categories), default=0) + 1
+    features = sp.csr_matrix(
+        (
+            np.ones(len(place_categories), dtype=np.float32),
+            ([index[p] for p, _ in place_categories], [c for _, c in place_categories]),
+        ),
+        shape=(n, n_categories),
+    )
+    return index, trip_likes, cooc, features
+
+
+def _materialize(
+    index: Dict[int, int], cooc: sp.csr_matrix, features: sp.csr_matrix, increments: list, count: int
+) -> Snapshot:
+    """Matriz base + los primeros `count` incrementos, en el threadpool."""
+    n = len(index)
+    cooc = _pad(cooc, n, n)
+    if count:
+        # El loop puede seguir añadiendo al final mientras tanto: sólo se leen los `count` primeros
+        values = np.array(increments[:count], dtype=np.float64)
+        delta = sp.csr_matrix(
+            (values[:, 2].astype(np.float32), (values[:, 0].astype(np.int64), values[:, 1].astype(np.int64))),
+            shape=(n, n),
+        )
+        cooc = (cooc + delta).tocsr()
+    return Snapshot(index, cooc, _pad(features, n, features.shape[1]))
+
+
+class Recommender:
+    """Filtrado colaborativo ítem-ítem + categorías para ordenar el deck.
+
+    La matriz de co-ocurrencia de likes (lugar x lugar, con viajes como
+    sesiones) se construye una vez desde las últimas swipes y luego se
+    actualiza con cada swipe nueva a través de una lista de incrementos, sin
+    volver a entrenar. Un rebuild periódico reconcilia lo escrito por otros
+    workers.
+
+    record() corre en el event loop y sólo añade incrementos o sustituye el
+    índice por una copia; el build y la suma base + incrementos corren en el
+    threadpool sobre estructuras propias y se publican con una asignación.
+    """
+
+    def __init__(self, training_window: int, rebuild_seconds: float, max_cached_trips: int):
+        self.training_window = training_window
+        self.rebuild_seconds = rebuild_seconds
+        self.max_cached_trips = max_cached_trips
+        self._lock = asyncio.Lock()
+        self._built_at: Optional[float] = None
+        # Copia al escribir: un dict publicado no se vuelve a modificar
+        self._index: Dict[int, int] = {}
+        self._cooc = sp.csr_matrix((0, 0))
+        self._features = sp.csr_matrix((0, 0))
+        # (fila, columna, valor) desde la última matriz base; sólo se añade al final
+        self._increments: List[Tuple[int, int, float]] = []
+        # Viaje -> lugar -> miembros que le dan like
+        self._trip_likes: Dict[int, Counter] = defaultdict(Counter)
+        # swipes recibidos mientras se reconstruye, para aplicarlos sobre el modelo nuevo
+        self._replay: Optional[list] = None
+        self._snapshot: Optional[Tuple[tuple, Snapshot]] = None
+        self._trip_versions: Dict[int, int] = defaultdict(int)
+        # (viaje, usuario) -> (versión del viaje, ranking)
+        self._rankings: "OrderedDict[Tuple[int, int], Tuple[int, List[int]]]" = OrderedDict()
+
+    @property
+    def ready(self) -> bool:
+        return self._built_at is not None
+
+    def _idx(self, place_id: int) -> int:
+        idx = self._index.get(place_id)
+        if idx is None:
+            idx = len(self._index)
+            self._index = {**self._index, place_id: idx}
+        return idx
+
+    async def ensure_built(self, db: AsyncSession):
+        if self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_seconds:
+            if len(self._increments) > COMPACT_AFTER:
+                await self._compact()
+            return
+        async with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_seconds:
+                return
+            self._replay = []
+            try:
+                result = await db.execute(
+                    select(models.Swipe.trip_id, models.Swipe.place_id)
+                    .where(models.Swipe.liked.is_(True))
+                    .order_by(models.Swipe.id.desc())
+                    .limit(self.training_window)
+                )
+                likes = result.all()
+                result = await db.execute(select(models.PlaceCategory.place_id, models.PlaceCategory.category_id))
+                place_categories = result.all()
+                index, trip_likes, cooc, features = await run_in_threadpool(_build_model, likes, place_categories)
+                replay = self._replay
+            finally:
+                self._replay = None
+            self._index, self._trip_likes, self._cooc, self._features = index, trip_likes, cooc, features
+            self._increments, self._snapshot = [], None
+            self._rankings.clear()
+            self._built_at = time.monotonic()
+            for args in replay:
+                self.record(*args)
+
+    async def _compact(self):
+        """Funde los incrementos en la matriz base fuera del loop."""
+        async with self._lock:
+            increments = self._increments
+            count = len(increments)
+            if count <= COMPACT_AFTER:
+                return
+            base = (self._cooc, self._features)
+            snapshot = await run_in_threadpool(_materialize, self._index, *base, increments, count)
+            # Un rebuild durante la espera ya sustituyó la base
+            if self._cooc is not base[0] or self._increments is not increments:
+                return
+            self._cooc, self._features = snapshot.cooc, snapshot.features
+            self._increments = increments[count:]
+            self._snapshot = None
+
+    def record(self, trip_id: int, user_id: int, place_id: int, liked: bool, previous: Optional[bool] = None):
+        """Aplica una swipe nueva (o el cambio de una existente) al modelo.
+
+        Los likes cuentan por viaje, como en el build: un segundo like del mismo
+        lugar en el viaje no cambia la co-ocurrencia, y quitar uno sólo la resta
+        cuando ya no queda ningún miembro que le dé like.
+        """
+        if not self.ready:
+            return
+        if self._replay is not None:
+            self._replay.append((trip_id, user_id, place_id, liked, previous))
+        self._trip_versions[trip_id] += 1
+        # Quien hizo swipe no vuelve a ver el lugar aunque su ranking siga en caché
+        cached = self._rankings.get((trip_id, user_id))
+        if cached is not None and place_id in cached[1]:
+            self._rankings[(trip_id, user_id)] = (cached[0], [p for p in cached[1] if p != place_id])
+        if bool(previous) == liked:
+            return
+        p = self._idx(place_id)
+        trip_likes = self._trip_likes[trip_id]
+        if liked:
+            trip_likes[p] += 1
+            if trip_likes[p] > 1:
+                return
+        else:
+            # Un like fuera de la ventana de entrenamiento nunca se contó
+            if not trip_likes[p]:
+                return
+            trip_likes[p] -= 1
+            if trip_likes[p]:
+                return
+            del trip_likes[p]
+            self._increments.append((p, p, -1.0))
+        sign = 1.0 if liked else -1.0
+        for q in trip_likes:
+            self._increments.append((p, q, sign))
+            if q != p:
+                self._increments.append((q, p, sign))
+
+    async def _current(self) -> Snapshot:
+        """Base + incrementos, cacheado; se recalcula en el threadpool si hay incrementos nuevos."""
+        increments = self._increments
+        key = (id(self._cooc), id(increments), len(increments), len(self._index))
+        if self._snapshot is not None and self._snapshot[0] == key:
+            return self._snapshot[1]
+        snapshot = await run_in_threadpool(
+            _materialize, self._index, self._cooc, self._features, increments, len(increments)
+        )
+        self._snapshot = (key, snapshot)
+        return snapshot
+
+    def score(
+        self,
+        snapshot: Snapshot,
+        candidate_ids: Sequence[int],
+        liked_ids: Iterable[int],
+        disliked_ids: Iterable[int],
+    ) -> np.ndarray:
+        """Puntuación de cada candidato para un viaje, en lote."""
+        index, cooc, features = snapshot
+        cand = np.array([index.get(p, -1) for p in candidate_ids], dtype=np.int64)
+        known = cand >= 0
+        scores = np.zeros(len(cand), dtype=np.float64)
+        if not known.any():
+            return scores
+        ci = cand[known]
+        liked = np.array([index[p] for p in liked_ids if p in index], dtype=np.int64)
+        disliked = np.array([index[p] for p in disliked_ids if p in index], dtype=np.int64)
+
+        counts = np.maximum(cooc.diagonal(), 0.0)
+        inv_norm = 1.0 / np.sqrt(np.maximum(counts, 1.0))
+
+        # Similitud coseno sobre vectores binarios de likes
+        item = np.zeros(len(ci))
+        rows = cooc[ci]
+        if liked.size:
+            item += np.asarray(rows[:, liked] @ inv_norm[liked]).ravel()
+        if disliked.size:
+            item -= DISLIKE_PENALTY * np.asarray(rows[:, disliked] @ inv_norm[disliked]).ravel()
+        item *= inv_norm[ci]
+
+        content = np.zeros(len(ci))
+        if features.shape[1] and (liked.size or disliked.size):
+            profile = np.zeros(features.shape[1])
+            if liked.size:
+                profile += np.asarray(features[liked].sum(axis=0)).ravel()
+            if disliked.size:
+                profile -= DISLIKE_PENALTY * np.asarray(features[disliked].sum(axis=0)).ravel()
+            content = features[ci] @ profile
+
+        popularity = np.log1p(counts[ci])
+
+        scores[known] = (
+            WEIGHT_ITEM * _normalized(item)
+            + WEIGHT_CONTENT * _normalized(content)
+            + WEIGHT_POPULARITY * _normalized(popularity)
+        )
+        return scores
+
+    async def ranking(self, db: AsyncSession, trip: models.Trip, user_id: int) -> List[int]:
+        """Lugares sin swipe del usuario en el viaje ordenados por puntuación.
+
+        El perfil son los likes de todo el viaje; sólo se excluye lo que ya vio
+        este usuario. Cacheado por (viaje, usuario): un swipe quita el lugar
+        del ranking en caché y el orden se recalcula cada RERANK_AFTER_SWIPES
+        swipes del viaje.
+        """
+        await self.ensure_built(db)
+        key = (trip.id, user_id)
+        version = self._trip_versions[trip.id]
+        cached = self._rankings.get(key)
+        if cached is not None and version - cached[0] < RERANK_AFTER_SWIPES:
+            self._rankings.move_to_end(key)
+            return cached[1]
+
+        swiped = await db.execute(
+            select(models.Swipe.place_id, models.Swipe.liked).where(models.Swipe.trip_id == trip.id)
+        )
+        history = swiped.all()
+        already_swiped = exists().where(
+            models.Swipe.trip_id == trip.id,
+            models.Swipe.user_id == user_id,
+            models.Swipe.place_id == models.Place.id,
+        )
+        result = await db.execute(
+            select(models.Place.id)
+            .where(
+                models.Place.city == trip.destination_city,
+                models.Place.is_active.is_(True),
+                ~already_swiped,
+            )
+            .order_by(models.Place.id)
+        )
+        candidates = result.scalars().all()
+
+        scores = await run_in_threadpool(
+            self.score,
+            await self._current(),
+            candidates,
+            [p for p, liked in history if liked],
+            [p for p, liked in history if not liked],
+        )
+        # Orden estable: a igual puntuación, por id
+        order = np.argsort(-scores, kind="stable")
+        ranked = [candidates[i] for i in order]
+
+        self._rankings[key] = (version, ranked)
+        self._rankings.move_to_end(key)
+        while len(self._rankings) > self.max_cached_trips:
+            self._rankings.popitem(last=False)
+        return ranked
+
+
+recommender = Recommender(
+    settings.RECOMMENDER_TRAINING_WINDOW,
+    settings.RECOMMENDER_REBUILD_SECONDS,
+    settings.RECOMMENDER_MAX_CACHED_TRIPS,
+)
@@ -0,0 +1,113 @@
+import gzip
+import json
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def dumps(content) -> bytes:
+    """JSON en bytes; orjson serializa listas de dicts planos varias veces más rápido que json."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=str).encode()
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """br si el cliente lo acepta y brotli está instalado; si no, gzip; si no, nada."""
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def response_encoding(request: Request, body: bytes) -> Optional[str]:
+    """Codificación con la que se enviará `body` a este cliente, o None si va sin comprimir."""
+    if len(body) < settings.RESPONSE_COMPRESS_MIN_BYTES:
+        return None
+    return negotiate_encoding(request.headers.get("accept-encoding"))
+
+
+# Variantes comprimidas de cuerpos cacheados: comprimir 1 MB cuesta tanto como serializarlo
+_compressed: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+
+
+def compress(body: bytes, encoding: str, cache: bool = False) -> bytes:
+    key = (body, encoding)
+    if cache and key in _compressed:
+        _compressed.move_to_end(key)
+        return _compressed[key]
+    if encoding == "br":
+        data = brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)
+    else:
+        data = gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL, mtime=0)
+    if cache:
+        _compressed[key] = data
+        while len(_compressed) > settings.RESPONSE_COMPRESS_CACHE_ENTRIES:
+            _compressed.popitem(last=False)
+    return data
+
+
+def rows_json(result) -> bytes:
+    """Filas de columnas planas (no objetos ORM) a una lista JSON de objetos."""
+    keys = list(result.keys())
+    return dumps([dict(zip(keys, row)) for row in result])
+
+
+class ORJSONResponse(Response):
+    """Respuesta JSON ya serializada (o serializable con orjson), sin pasar por pydantic.
+
+    Con `request`, comprime según Accept-Encoding cuando el cuerpo supera
+    RESPONSE_COMPRESS_MIN_BYTES. Sólo para datos de confianza (filas de la
+    base): no se valida nada.
+    """
+
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        content,
+        request: Optional[Request] = None,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        cache_compressed: bool = False,
+    ):
+        body = content if isinstance(content, bytes) else dumps(content)
+        headers = dict(headers or {})
+        if request is not None:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = response_encoding(request, body)
+            if encoding:
+                body = compress(body, encoding, cache=cache_compressed)
+                headers["Content-Encoding"] = encoding
+        super().__init__(body, status_code=status_code, headers=headers)
+
+    def render(self, content) -> bytes:
+        return content
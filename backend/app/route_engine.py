@@ -0,0 +1,281 @@
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .config import settings
+from .geo import haversine_matrix
+from .polyline import encode, join_legs
+from .routing_providers import RoutingProvider, routing_provider
+from .travel_matrix import travel_matrices
+from .trip_summary import apply_route
+
+_EPS = 1e-9
+
+
+@dataclass
+class RouteSolution:
+    place_ids: List[int]
+    latitudes: List[float]
+    longitudes: List[float]
+    # Minutos y km desde la parada anterior (0 para la primera)
+    leg_minutes: List[float] = field(default_factory=list)
+    leg_km: List[float] = field(default_factory=list)
+    # Minutos de visita en cada parada (vacío si sólo cuenta el desplazamiento)
+    visit_minutes: List[float] = field(default_factory=list)
+    # Geometría de cada tramo según el proveedor de rutas, si se pidió
+    leg_points: List[list] = field(default_factory=list)
+
+    @property
+    def total_minutes(self) -> float:
+        return float(sum(self.leg_minutes) + sum(self.visit_minutes))
+
+    @property
+    def total_km(self) -> float:
+        return float(sum(self.leg_km))
+
+    def to_response(self, route_id: Optional[int] = None) -> schemas.RouteResponse:
+        return schemas.RouteResponse(
+            route_id=route_id,
+            ordered_points=[
+                schemas.RoutePoint(place_id=pid, latitude=lat, longitude=lon)
+                for pid, lat, lon in zip(self.place_ids, self.latitudes, self.longitudes)
+            ],
+            estimated_total_time_minutes=round(self.total_minutes, 2),
+            total_distance_km=round(self.total_km, 3),
+        )
+
+
+def travel_minutes(distance_km: np.ndarray, speed_kmh: Optional[float] = None) -> np.ndarray:
+    speed = speed_kmh or settings.ROUTE_AVG_SPEED_KMH
+    return distance_km / speed * 60.0
+
+
+def _nearest_neighbour(cost: np.ndarray, start: int) -> np.ndarray:
+    n = cost.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=np.int64)
+    current = start
+    for step in range(n):
+        order[step] = current
+        visited[current] = True
+        if step == n - 1:
+            break
+        row = np.where(visited, np.inf, cost[current])
+        current = int(np.argmin(row))
+    return order
+
+
+def _path_cost(cost: np.ndarray, order: np.ndarray) -> float:
+    return float(cost[order[:-1], order[1:]].sum())
+
+
+def _two_opt_pass(c: np.ndarray, p: np.ndarray) -> bool:
+    # p lleva un nodo ficticio de coste 0 en ambos extremos, así que las
+    # posiciones reales son 1..n y los extremos del camino quedan libres.
+    n = len(p) - 2
+    improved = False
+    for i in range(1, n):
+        js = np.arange(i + 1, n + 1)
+        delta = (
+            c[p[i - 1], p[js]] + c[p[i], p[js + 1]]
+            - c[p[i - 1], p[i]] - c[p[js], p[js + 1]]
+        )
+        k = int(np.argmin(delta))
+        if delta[k] < -_EPS:
+            j = int(js[k])
+            p[i:j + 1] = p[i:j + 1][::-1].copy()
+            improved = True
+    return improved
+
+
+def _or_opt_pass(c: np.ndarray, p: np.ndarray, max_segment: int = 3) -> bool:
+    n = len(p) - 2
+    improved = False
+    for seg_len in range(1, max_segment + 1):
+        i = 1
+        while i + seg_len - 1 <= n:
+            first, last = p[i], p[i + seg_len - 1]
+            prev, nxt = p[i - 1], p[i + seg_len]
+            gain = c[prev, first] + c[last, nxt] - c[prev, nxt]
+            rest = np.concatenate((p[:i], p[i + seg_len:]))
+            ks = np.arange(len(rest) - 1)
+            insert = c[rest[ks], first] + c[last, rest[ks + 1]] - c[rest[ks], rest[ks + 1]]
+            # Reinsertar en el mismo hueco no cuenta como movimiento
+            insert[i - 1] = np.inf
+            k = int(np.argmin(insert))
+            if insert[k] - gain < -_EPS:
+                segment = p[i:i + seg_len].copy()
+                p[:] = np.concatenate((rest[:k + 1], segment, rest[k + 1:]))
+                improved = True
+            else:
+                i += 1
+    return improved
+
+
+def solve_order(cost: np.ndarray, time_budget_ms: Optional[float] = None) -> np.ndarray:
+    """Orden de visita para un camino abierto que minimiza el coste total.
+
+    Vecino más cercano desde cada origen y después 2-opt/Or-opt hasta que no
+    haya mejora o se agote el presupuesto de tiempo. Supone costes simétricos.
+    """
+    n = cost.shape[0]
+    if n <= 2:
+        return np.arange(n)
+
+    budget = settings.ROUTE_SOLVER_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+    started = time.perf_counter()
+    deadline = started + budget / 1000.0
+    # Los arranques múltiples sólo se llevan una parte del presupuesto; el
+    # resto es para la mejora local, que es donde está la ganancia.
+    construction_deadline = started + budget / 4000.0
+
+    best = _nearest_neighbour(cost, 0)
+    best_cost = _path_cost(cost, best)
+    for start in range(1, n):
+        if time.perf_counter() > construction_deadline:
+            break
+        candidate = _nearest_neighbour(cost, start)
+        candidate_cost = _path_cost(cost, candidate)
+        if candidate_cost < best_cost:
+            best, best_cost = candidate, candidate_cost
+
+    c = np.zeros((n + 1, n + 1), dtype=np.float64)
+    c[:n, :n] = cost
+    p = np.concatenate(([n], best, [n]))
+    while time.perf_counter() < deadline:
+        improved = _two_opt_pass(c, p)
+        improved = _or_opt_pass(c, p) or improved
+        if not improved:
+            break
+    return p[1:-1]
+
+
+def solve_route(
+    place_ids: Sequence[int],
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    time_budget_ms: Optional[float] = None,
+    distances: Optional[np.ndarray] = None,
+) -> RouteSolution:
+    if distances is None:
+        distances = haversine_matrix(latitudes, longitudes)
+    minutes = travel_minutes(distances)
+    order = solve_order(minutes, time_budget_ms)
+
+    leg_km = [0.0] + distances[order[:-1], order[1:]].tolist()
+    leg_minutes = [0.0] + minutes[order[:-1], order[1:]].tolist()
+    return RouteSolution(
+        place_ids=[int(place_ids[i]) for i in order],
+        latitudes=[float(latitudes[i]) for i in order],
+        longitudes=[float(longitudes[i]) for i in order],
+        leg_minutes=leg_minutes,
+        leg_km=leg_km,
+    )
+
+
+def solve_for_places(
+    places: Sequence, time_budget_ms: Optional[float] = None, city: Optional[str] = None
+) -> RouteSolution:
+    """Con `city`, las distancias salen de la matriz precalculada si la hay."""
+    place_ids = [p.id for p in places]
+    return solve_route(
+        place_ids,
+        [p.latitude for p in places],
+        [p.longitude for p in places],
+        time_budget_ms,
+        travel_matrices.distances(city, place_ids),
+    )
+
+
+async def with_provider_legs(solution: RouteSolution, provider: Optional[RoutingProvider] = None) -> RouteSolution:
+    """Sustituye las estimaciones en línea recta por los tramos del proveedor.
+
+    El orden se decide con la matriz local: pedir al proveedor la matriz n x n
+    costaría n² llamadas; así sólo se piden los n-1 tramos de la ruta elegida.
+    """
+    provider = provider or routing_provider
+    coords = list(zip(solution.latitudes, solution.longitudes))
+    if len(coords) < 2:
+        return solution
+    legs = await provider.legs(list(zip(coords[:-1], coords[1:])))
+    solution.leg_minutes = [0.0] + [leg.minutes for leg in legs]
+    solution.leg_km = [0.0] + [leg.distance_km for leg in legs]
+    solution.leg_points = [leg.points for leg in legs]
+    return solution
+
+
+async def add_route(
+    db: AsyncSession, trip_id: int, solution: RouteSolution, day: Optional[int] = None
+) -> models.Route:
+    """Inserta la ruta y todos sus puntos en un único INSERT múltiple, sin commit."""
+    route = models.Route(
+        trip_id=trip_id,
+        day=day,
+        total_time=solution.total_minutes,
+        total_distance=solution.total_km,
+        # Sin geometría del proveedor, la línea recta entre paradas
+        geometry=encode(join_legs(solution.leg_points) or list(zip(solution.latitudes, solution.longitudes))),
+    )
+    db.add(route)
+    await db.flush()
+    if solution.place_ids:
+        await db.execute(
+            insert(models.RoutePoint),
+            [
+                {
+                    "route_id": route.id,
+                    "place_id": pid,
+                    "step_order": step,
+                    "latitude": lat,
+                    "longitude": lon,
+                    "estimated_time": minutes,
+                }
+                for step, (pid, lat, lon, minutes) in enumerate(
+                    zip(solution.place_ids, solution.latitudes, solution.longitudes, solution.leg_minutes),
+                    start=1,
+                )
+            ],
+        )
+    await apply_route(db, route)
+    return route
+
+
+def geometry_namespace(route_id: int) -> str:
+    return f"route-geometry:{route_id}"
+
+
+async def replace_itinerary(
+    db: AsyncSession, trip_id: int, solutions: Sequence[RouteSolution]
+) -> Tuple[List[int], List[models.Route]]:
+    """Sustituye las rutas por día del viaje por las de `solutions`, sin commit.
+
+    Devuelve (ids borrados, rutas nuevas). Las rutas sueltas (sin día) no se
+    tocan. El viaje queda bloqueado hasta el commit para que dos itinerarios
+    simultáneos no se sumen.
+    """
+    await db.execute(select(models.Trip.id).where(models.Trip.id == trip_id).with_for_update())
+    old = select(models.Route.id).where(models.Route.trip_id == trip_id, models.Route.day.is_not(None))
+    await db.execute(
+        delete(models.RoutePoint).where(models.RoutePoint.route_id.in_(old)),
+        execution_options={"synchronize_session": False},
+    )
+    result = await db.execute(
+        delete(models.Route)
+        .where(models.Route.trip_id == trip_id, models.Route.day.is_not(None))
+        .returning(models.Route.id),
+        execution_options={"synchronize_session": False},
+    )
+    removed = list(result.scalars().all())
+    routes = [await add_route(db, trip_id, solution, day=day) for day, solution in enumerate(solutions, start=1)]
+    return removed, routes
+
+
+async def save_route(db: AsyncSession, trip_id: int, solution: RouteSolution) -> models.Route:
+    route = await add_route(db, trip_id, solution)
+    await db.commit()
+    return route
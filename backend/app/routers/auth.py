@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from ..database import SessionLocal
-from ..deps import get_db
+from ..database import dialect_insert
+from ..deps import get_current_user, get_db
+from ..security import create_token, dummy_verify, hash_password, verify_password
 from .. import models
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -22,28 +24,55 @@ class UserLogin(BaseModel):
     email: str
     password: str
 
+class LoginOut(UserOut):
+    access_token: str
+    token_type: str = "bearer"
+
 
 @router.post("/register", response_model=UserOut)
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.User).filter(models.User.email == user_in.email).first()
-    if existing:
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
+    password_hash = await hash_password(user_in.password)
+    # La unicidad la resuelve el índice de users.email en un solo INSERT
+    result = await db.execute(
+        dialect_insert(db, models.User)
+        .values(email=user_in.email, password_hash=password_hash)
+        .on_conflict_do_nothing(index_elements=[models.User.email])
+        .returning(models.User.id)
+    )
+    user_id = result.scalar()
+    if user_id is None:
         raise HTTPException(status_code=400, detail="El correo ya está registrado")
+    await db.commit()
+    return UserOut(id=user_id, email=user_in.email)
 
-    user = models.User(
-        email=user_in.email,
-        password_hash=user_in.password  # más adelante: hash real
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
 
+@router.post("/login", response_model=LoginOut)
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(models.User.id, models.User.password_hash).where(models.User.email == credentials.email)
+    )
+    user = result.first()
 
-@router.post("/login", response_model=UserOut)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == credentials.email).first()
+    if not user:
+        await dummy_verify(credentials.password)
+        raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
-    if not user or user.password_hash != credentials.password:
+    ok, needs_rehash = await verify_password(credentials.password, user.password_hash)
+    if not ok:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
-    return user
+    if needs_rehash:
+        # Parámetros de coste cambiados (o contraseña heredada en claro)
+        await db.execute(
+            update(models.User)
+            .where(models.User.id == user.id)
+            .values(password_hash=await hash_password(credentials.password))
+        )
+        await db.commit()
+
+    return LoginOut(id=user.id, email=credentials.email, access_token=create_token(user.id, credentials.email))
+
+
+@router.get("/me", response_model=UserOut)
+async def me(claims: dict = Depends(get_current_user)):
+    return UserOut(id=claims["sub"], email=claims["email"])
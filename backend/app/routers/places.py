@@ -1,41 +1,165 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. import models, schemas
+from ..cache import cached_response, catalog_cache
 from ..deps import get_db
+from ..queries import PLACE_OUT_COLUMNS
+from ..responses import dumps, rows_json
+from ..search import SORTS, city_facets, place_deactivated, search_index, search_places, set_place_categories
+from ..spatial import places_in_bbox, places_nearby, spatial_index
+from ..tiles import invalidate_point
+from ..travel_matrix import travel_matrices
 
 router = APIRouter(prefix="/places", tags=["places"])
 
+CACHE_NAMESPACE = "places"
+
 
 @router.post("/", response_model=schemas.PlaceOut)
-def create_place(place: schemas.PlaceCreate, db: Session = Depends(get_db)):
-    db_place = models.Place(**place.dict())
+async def create_place(place: schemas.PlaceCreate, db: AsyncSession = Depends(get_db)):
+    db_place = models.Place(**place.dict(exclude={"categories"}))
     db.add(db_place)
-    db.commit()
-    db.refresh(db_place)
+    await db.flush()
+    if place.categories:
+        await set_place_categories(db, db_place, place.categories)
+    await db.commit()
+    await db.refresh(db_place)
+    spatial_index.add(db_place.id, db_place.latitude, db_place.longitude)
+    search_index.add(db_place.id, db_place.name, db_place.description)
+    await run_in_threadpool(
+        travel_matrices.add_place, db_place.city, db_place.id, db_place.latitude, db_place.longitude
+    )
+    await catalog_cache.invalidate(CACHE_NAMESPACE)
+    await invalidate_point(db_place.latitude, db_place.longitude)
     return db_place
 
 @router.get("/", response_model=List[schemas.PlaceOut])
-def list_places(city: str | None = None, country: str | None = None, db: Session = Depends(get_db)):
-    query = db.query(models.Place).filter(models.Place.is_active.is_(True))
-    if city:
-        query = query.filter(models.Place.city == city)
-    if country:
-        query = query.filter(models.Place.country == country)
-    return query.all()
+async def list_places(request: Request, city: str | None = None, country: str | None = None, db: AsyncSession = Depends(get_db)):
+    key = await catalog_cache.key(CACHE_NAMESPACE, "list", city, country)
+    body = await catalog_cache.get(key)
+    if body is None:
+        query = select(*PLACE_OUT_COLUMNS).where(models.Place.is_active.is_(True))
+        if city:
+            query = query.where(models.Place.city == city)
+        if country:
+            query = query.where(models.Place.country == country)
+        body = rows_json(await db.execute(query))
+        await catalog_cache.set(key, body)
+    return cached_response(request, body)
 
 @router.get("/available-locations")
-def get_available_locations(db: Session = Depends(get_db)):
-    rows = db.query(models.Place.city, models.Place.country).distinct().all()
-    return [{"city": c, "country": p} for c, p in rows]
+async def get_available_locations(request: Request, db: AsyncSession = Depends(get_db)):
+    key = await catalog_cache.key(CACHE_NAMESPACE, "locations")
+    body = await catalog_cache.get(key)
+    if body is None:
+        result = await db.execute(select(models.Place.city, models.Place.country).distinct())
+        body = dumps([{"city": c, "country": p} for c, p in result.all()])
+        await catalog_cache.set(key, body)
+    return cached_response(request, body)
 
 @router.get("/by-city/{city}", response_model=List[schemas.PlaceOut])
-def get_places_by_city(city: str, db: Session = Depends(get_db)):
-    return db.query(models.Place).filter(models.Place.city.ilike(city)).all()
+async def get_places_by_city(request: Request, city: str, db: AsyncSession = Depends(get_db)):
+    key = await catalog_cache.key(CACHE_NAMESPACE, "by-city", city.lower())
+    body = await catalog_cache.get(key)
+    if body is None:
+        body = rows_json(
+            await db.execute(select(*PLACE_OUT_COLUMNS).where(func.lower(models.Place.city) == func.lower(city)))
+        )
+        await catalog_cache.set(key, body)
+    return cached_response(request, body)
+
+@router.get("/search", response_model=schemas.PlaceSearchPage)
+async def search_city_places(
+    city: str,
+    categories: str | None = Query(None, description="Nombres separados por comas; basta con una"),
+    q: str | None = None,
+    sort: str | None = Query(None, pattern=f"^({'|'.join(SORTS)})$"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    names = [c.strip() for c in (categories or "").split(",") if c.strip()]
+    if sort is None or (sort == "relevance" and not q):
+        sort = "relevance" if q else "id"
+    total, places = await search_places(db, city, names, q, sort, limit, offset)
+    return {
+        "total": total,
+        "items": [schemas.PlaceOut.model_validate(p, from_attributes=True) for p in places],
+        "facets": await city_facets(db, city),
+    }
+
+@router.get("/categories", response_model=List[schemas.CategoryOut])
+async def list_categories(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.Category).order_by(models.Category.name))
+    return result.scalars().all()
+
+@router.put("/{place_id}/categories", response_model=List[str])
+async def update_place_categories(
+    place_id: int, body: schemas.PlaceCategoriesUpdate, db: AsyncSession = Depends(get_db)
+):
+    place = await db.get(models.Place, place_id)
+    if not place:
+        raise HTTPException(status_code=404, detail="Place not found")
+    names = await set_place_categories(db, place, body.categories)
+    await db.commit()
+    return names
+
+@router.get("/nearby", response_model=List[schemas.PlaceNearby])
+async def get_places_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(2.0, gt=0, le=100),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+):
+    hits = await places_nearby(db, lat, lon, radius_km, limit)
+    return [
+        schemas.PlaceNearby(
+            **schemas.PlaceOut.model_validate(p, from_attributes=True).dict(),
+            distance_km=round(d, 3),
+        )
+        for p, d in hits
+    ]
+
+@router.get("/bbox", response_model=List[schemas.PlaceOut])
+async def get_places_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(200, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+):
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Invalid bounding box")
+    return await places_in_bbox(db, min_lat, min_lon, max_lat, max_lon, limit)
 
 @router.get("/{place_id}", response_model=schemas.PlaceOut)
-def get_place(place_id: int, db: Session = Depends(get_db)):
-    place = db.query(models.Place).filter(models.Place.id == place_id).first()
+async def get_place(request: Request, place_id: int, db: AsyncSession = Depends(get_db)):
+    key = await catalog_cache.key(CACHE_NAMESPACE, "place", place_id)
+    body = await catalog_cache.get(key)
+    if body is None:
+        place = await db.get(models.Place, place_id)
+        if not place:
+            raise HTTPException(status_code=404, detail="Place not found")
+        body = dumps(schemas.PlaceOut.model_validate(place, from_attributes=True).dict())
+        await catalog_cache.set(key, body)
+    return cached_response(request, body)
+
+@router.delete("/{place_id}", response_model=schemas.PlaceOut)
+async def deactivate_place(place_id: int, db: AsyncSession = Depends(get_db)):
+    place = await db.get(models.Place, place_id)
     if not place:
         raise HTTPException(status_code=404, detail="Place not found")
-    return place
\ No newline at end of file
+    if place.is_active:
+        await place_deactivated(db, place)
+    place.is_active = False
+    await db.commit()
+    spatial_index.remove(place_id)
+    search_index.remove(place_id)
+    await catalog_cache.invalidate(CACHE_NAMESPACE)
+    await invalidate_point(place.latitude, place.longitude)
+    return place
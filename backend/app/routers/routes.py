@@ -1,86 +1,145 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models, schemas
+from ..cache import cached_response, catalog_cache
 from ..deps import get_db
-import requests
+from ..jobs import MIN_ROUTE_PLACES, enqueue, job_out
+from ..polyline import decode, encode, simplify, tolerance_for_zoom
+from ..queries import PIN_COLUMNS, ROUTE_COLUMNS, liked_places
+from ..realtime import realtime
+from ..responses import dumps
+from ..route_engine import geometry_namespace, save_route, solve_for_places, with_provider_legs
+from ..swipe_buffer import swipe_buffer
 
 router = APIRouter(prefix="/routes", tags=["routes"])
 
-AZURE_MAPS_KEY = "TU_LLAVE_DE_AZURE_MAPS"
-
-@router.get("/generate/{trip_id}")
-def generate_route(trip_id: int, db: Session = Depends(get_db)):
 
-    swipes = (
-        db.query(models.Swipe)
-        .filter(models.Swipe.trip_id == trip_id, models.Swipe.liked == True)
-        .all()
-    )
+@router.get("/generate/{trip_id}", response_model=schemas.RouteResponse)
+async def generate_route(trip_id: int, db: AsyncSession = Depends(get_db)):
+    trip = await db.get(models.Trip, trip_id)
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
 
-    place_ids = [s.place_id for s in swipes]
+    pending = swipe_buffer.pending_for_trip(trip_id)
+    result = await db.execute(liked_places(ROUTE_COLUMNS, trip_id=trip_id, pending=pending))
+    places = result.all()
 
-    places = db.query(models.Place).filter(models.Place.id.in_(place_ids)).all()
-
-    if len(places) < 2:
+    if len(places) < MIN_ROUTE_PLACES:
         raise HTTPException(400, "Necesitas al menos 2 lugares para generar una ruta")
 
-    coords = [f"{p.lon},{p.lat}" for p in places]
-
-    waypoints = "&".join([f"wp.{i}={coords[i]}" for i in range(len(coords))])
+    # El solver es CPU puro; fuera del event loop
+    solution = await run_in_threadpool(solve_for_places, places, None, trip.destination_city)
+    solution = await with_provider_legs(solution)
+    route = await save_route(db, trip_id, solution)
+    await realtime.publish(trip_id, {"type": "route", "route_id": route.id})
 
-    url = (
-        f"https://atlas.microsoft.com/route/directions/json?api-version=1.0"
-        f"&subscription-key={AZURE_MAPS_KEY}&{waypoints}"
-    )
-
-    res = requests.get(url)
-
-    return res.json()
+    return solution.to_response(route_id=route.id)
 
 
 @router.get("/trip/{trip_id}/places")
-def get_trip_places(trip_id: int, db: Session = Depends(get_db)):
-    liked_swipes = (
-        db.query(models.Swipe)
-        .filter(models.Swipe.trip_id == trip_id, models.Swipe.liked == True)
-        .all()
-    )
-
-    place_ids = [s.place_id for s in liked_swipes]
-
-    places = (
-        db.query(models.Place)
-        .filter(models.Place.id.in_(place_ids))
-        .all()
-    )
-
-    return [
-        {
-            "id": p.id,
-            "name": p.name,
-            "lat": p.latitude,
-            "lon": p.longitude
-        }
-        for p in places
-    ]
+async def get_trip_places(trip_id: int, db: AsyncSession = Depends(get_db)):
+    pending = swipe_buffer.pending_for_trip(trip_id)
+    result = await db.execute(liked_places(PIN_COLUMNS, trip_id=trip_id, pending=pending))
+    return result.mappings().all()
 
 @router.get("/user/{user_id}", response_model=schemas.RouteResponse)
-def calculate_route_for_user(user_id: str, db: Session = Depends(get_db)):
-    swipes = (
-        db.query(models.Swipe)
-        .filter(models.Swipe.user_id == user_id, models.Swipe.liked.is_(True))
-        .all()
-    )
-    place_ids = [s.place_id for s in swipes]
-    places = db.query(models.Place).filter(models.Place.id.in_(place_ids)).all()
-
-    ordered_points = [
-        schemas.RoutePoint(place_id=p.id, latitude=p.latitude, longitude=p.longitude)
-        for p in places
-    ]
-
-    return schemas.RouteResponse(
-        ordered_points=ordered_points,
-        estimated_total_time_minutes=0.0
-    )
+async def calculate_route_for_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    pending = swipe_buffer.pending_for_user(user_id)
+    result = await db.execute(liked_places(ROUTE_COLUMNS, user_id=user_id, pending=pending))
+    places = result.all()
+
+    if not places:
+        return schemas.RouteResponse(ordered_points=[], estimated_total_time_minutes=0.0)
+
+    solution = await run_in_threadpool(solve_for_places, places)
+    solution = await with_provider_legs(solution)
+    return solution.to_response()
+
+
+@router.post("/jobs", response_model=schemas.RouteJobOut, status_code=202)
+async def create_route_job(job_in: schemas.RouteJobCreate, response: Response, db: AsyncSession = Depends(get_db)):
+    trip = await db.get(models.Trip, job_in.trip_id)
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+
+    if swipe_buffer.enabled:
+        # El worker que resuelva el trabajo no ve la cola de este proceso
+        await swipe_buffer.flush()
+    result = await db.execute(liked_places(ROUTE_COLUMNS, trip_id=job_in.trip_id))
+    places = result.all()
+    if len(places) < MIN_ROUTE_PLACES:
+        raise HTTPException(400, "Necesitas al menos 2 lugares para generar una ruta")
+
+    job = await enqueue(db, job_in.trip_id, places)
+    if job.status == "done":
+        response.status_code = 200
+    return job_out(job)
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.RouteJobOut)
+async def get_route_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(models.RouteJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_out(job)
+
+
+def _geometry_level(tolerance: float | None, zoom: float | None) -> tuple:
+    """Nivel de caché: zoom entero, o tolerancia redondeada a la potencia de 2 inferior."""
+    if zoom is not None:
+        return ("z", int(zoom))
+    if not tolerance or tolerance < 1:
+        return ("m", 0)
+    return ("m", 2 ** int(math.log2(tolerance)))
+
+
+def _geometry_body(route_id: int, encoded: str, level: tuple) -> bytes:
+    points = decode(encoded)
+    kind, value = level
+    if kind == "z" and points:
+        tolerance = tolerance_for_zoom(value, sum(lat for lat, _ in points) / len(points))
+    else:
+        tolerance = float(value) if kind == "m" else 0.0
+    simplified = simplify(points, tolerance)
+    return dumps({
+        "route_id": route_id,
+        "tolerance_m": round(tolerance, 3),
+        "points": len(simplified),
+        "original_points": len(points),
+        "polyline": encode(simplified),
+    })
+
+
+@router.get("/{route_id}/geometry", response_model=schemas.RouteGeometry)
+async def get_route_geometry(
+    request: Request,
+    route_id: int,
+    tolerance: float | None = Query(None, ge=0, description="Metros; se redondea a la potencia de 2 inferior"),
+    zoom: float | None = Query(None, ge=0, le=22, description="Alternativa a tolerance: un píxel a ese zoom"),
+    db: AsyncSession = Depends(get_db),
+):
+    level = _geometry_level(tolerance, zoom)
+    # Una ruta no cambia una vez guardada (sólo se borra al rehacer el itinerario):
+    # cada nivel se simplifica una sola vez
+    key = await catalog_cache.key(geometry_namespace(route_id), *level)
+    body = await catalog_cache.get(key)
+    if body is None:
+        route = await db.get(models.Route, route_id)
+        if not route:
+            raise HTTPException(status_code=404, detail="Route not found")
+        encoded = route.geometry
+        if encoded is None:
+            # Rutas anteriores a la columna: las paradas en orden
+            result = await db.execute(
+                select(models.RoutePoint.latitude, models.RoutePoint.longitude)
+                .where(models.RoutePoint.route_id == route_id)
+                .order_by(models.RoutePoint.step_order)
+            )
+            encoded = encode([tuple(row) for row in result.all()])
+        body = await run_in_threadpool(_geometry_body, route_id, encoded, level)
+        await catalog_cache.set(key, body)
+    return cached_response(request, body)
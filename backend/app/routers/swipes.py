@@ -1,38 +1,64 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from .. import models, schemas
+from .. import schemas
+from ..config import settings
 from ..deps import get_db
+from ..queries import liked_places
+from ..responses import ORJSONResponse, rows_json
+from ..swipe_buffer import BufferFull, swipe_buffer
+from ..swipe_store import reference_errors, upsert_swipes
 
 router = APIRouter(prefix="/swipes", tags=["swipes"])
 
 
-@router.post("/", response_model=schemas.SwipeOut)
-def create_swipe(swipe: schemas.SwipeCreate, db: Session = Depends(get_db)):
-    db_swipe = models.Swipe(**swipe.dict())
-    db.add(db_swipe)
-    db.commit()
-    db.refresh(db_swipe)
-    return db_swipe
+async def _enqueue(db: AsyncSession, swipes: List[schemas.SwipeCreate]) -> List[schemas.SwipeBatchItem]:
+    """Modo write-behind: valida referencias y encola; la escritura la hace el flusher."""
+    results = await reference_errors(db, swipes)
+    try:
+        await swipe_buffer.submit([s for i, s in enumerate(swipes) if i not in results])
+    except BufferFull:
+        raise HTTPException(status_code=503, detail="Swipe queue full, retry later")
+    for index in range(len(swipes)):
+        results.setdefault(index, schemas.SwipeBatchItem(index=index, status="queued"))
+    return [results[i] for i in range(len(swipes))]
 
 
-@router.get("/liked/{user_id}", response_model=List[schemas.PlaceOut])
-def list_liked_places(user_id: str, db: Session = Depends(get_db)):
-    swipes = (
-        db.query(models.Swipe)
-        .filter(models.Swipe.user_id == user_id, models.Swipe.liked.is_(True))
-        .all()
-    )
-    place_ids = [s.place_id for s in swipes]
-    if not place_ids:
+@router.post("/", response_model=schemas.SwipeOut, responses={202: {"description": "Queued (write-behind)"}})
+async def create_swipe(swipe: schemas.SwipeCreate, db: AsyncSession = Depends(get_db)):
+    if swipe_buffer.enabled:
+        [item] = await _enqueue(db, [swipe])
+        if item.status == "error":
+            raise HTTPException(status_code=404, detail=item.detail)
+        # Sin id todavía: se asigna al escribirlo
+        return ORJSONResponse({"status": "queued", **swipe.dict()}, status_code=202)
+    # Repetir un swipe actualiza el anterior en vez de chocar con uq_swipe_user_trip_place
+    [item] = await upsert_swipes(db, [swipe])
+    if item.status == "error":
+        raise HTTPException(status_code=404, detail=item.detail)
+    return item.swipe
+
+
+@router.post("/batch", response_model=List[schemas.SwipeBatchItem])
+async def create_swipes_batch(swipes: List[schemas.SwipeCreate], db: AsyncSession = Depends(get_db)):
+    if len(swipes) > settings.SWIPE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large (max {settings.SWIPE_BATCH_MAX_SIZE} swipes)",
+        )
+    if not swipes:
         return []
-    places = db.query(models.Place).filter(models.Place.id.in_(place_ids)).all()
-    return places
-
-@router.post("/", response_model=schemas.SwipeOut)
-def create_swipe(swipe: schemas.SwipeCreate, db: Session = Depends(get_db)):
-    db_swipe = models.Swipe(**swipe.dict())
-    db.add(db_swipe)
-    db.commit()
-    db.refresh(db_swipe)
-    return db_swipe
+    if swipe_buffer.enabled:
+        return await _enqueue(db, swipes)
+    return await upsert_swipes(db, swipes)
+
+
+# response_model sólo documenta el esquema en OpenAPI: la respuesta se devuelve
+# ya serializada y FastAPI no la valida (response_class=ORJSONResponse haría que
+# OpenAPI la describiera como texto, al no ser una subclase de JSONResponse)
+@router.get("/liked/{user_id}", response_model=List[schemas.PlaceOut])
+async def list_liked_places(request: Request, user_id: int, db: AsyncSession = Depends(get_db)):
+    # Columnas de PlaceOut directamente de la base: sin validación pydantic por fila
+    # Incluye los swipes del usuario que aún esperan en la cola write-behind
+    result = await db.execute(liked_places(user_id=user_id, pending=swipe_buffer.pending_for_user(user_id)))
+    return ORJSONResponse(rows_json(result), request)
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..cache import cached_response, catalog_cache
+from ..config import settings
+from ..deps import get_db
+from ..responses import dumps
+from ..spatial import entries_in_bbox
+from ..tiles import render_tile, tile_bounds, tile_namespace
+
+router = APIRouter(prefix="/tiles", tags=["tiles"])
+
+
+@router.get("/places/{z}/{x}/{y}.json")
+async def get_places_tile(
+    request: Request,
+    z: int = Path(..., ge=0, le=settings.TILE_MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """Lugares activos de una tesela Web Mercator: {points: [[id, lat, lon]], clusters: [[lat, lon, n]]}."""
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    key = await catalog_cache.key(tile_namespace(z, x, y), "places")
+    body = await catalog_cache.get(key)
+    if body is None:
+        entries = await entries_in_bbox(db, *tile_bounds(z, x, y))
+        body = await run_in_threadpool(lambda: dumps(render_tile(entries, z, x, y)))
+        await catalog_cache.set(key, body)
+    return cached_response(request, body)
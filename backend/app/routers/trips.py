@@ -1,11 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..deps import get_db
-from .. import models
+import asyncio
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..cache import catalog_cache
+from ..config import settings
+from ..database import AsyncSessionLocal, dialect_insert
+from ..deck import deck_buffer, fetch_candidates, places_by_ids
+from ..deps import get_current_user, get_db
+from ..itinerary import plan_for_places
+from ..queries import ROUTE_COLUMNS, liked_places
+from ..route_engine import geometry_namespace, replace_itinerary
+from .. import models, schemas
+from ..realtime import realtime
+from ..recommender import recommender
+from ..security import InvalidToken, decode_token
+from ..swipe_buffer import swipe_buffer
+from ..trip_summary import create_for_trip, get_summary, summary_out
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/trips", tags=["trips"])
 
+logger = logging.getLogger("tinvel.trips")
+
 class TripCreate(BaseModel):
     user_id: int
     city: str
@@ -20,17 +40,28 @@ class TripOut(BaseModel):
     class Config:
         orm_mode = True
 
+class MemberCreate(BaseModel):
+    user_id: int
+
+class MemberOut(BaseModel):
+    user_id: int
+    role: str
+
 
 @router.post("/", response_model=TripOut)
-def create_trip(trip_in: TripCreate, db: Session = Depends(get_db)):
+async def create_trip(trip_in: TripCreate, db: AsyncSession = Depends(get_db)):
     trip = models.Trip(
         user_id=trip_in.user_id,
         destination_city=trip_in.city,
         destination_country=trip_in.country
     )
+    # El creador es el primer participante
+    trip.members = [models.TripMember(user_id=trip_in.user_id, role="owner")]
     db.add(trip)
-    db.commit()
-    db.refresh(trip)
+    await db.flush()
+    db.add(create_for_trip(trip))
+    await db.commit()
+    await db.refresh(trip)
 
     return TripOut(
         id=trip.id,
@@ -39,8 +70,216 @@ def create_trip(trip_in: TripCreate, db: Session = Depends(get_db)):
         country=trip.destination_country
     )
 @router.get("/{trip_id}")
-def get_trip(trip_id: int, db: Session = Depends(get_db)):
-    trip = db.query(models.Trip).filter(models.Trip.id == trip_id).first()
+async def get_trip(trip_id: int, db: AsyncSession = Depends(get_db)):
+    trip = await db.get(models.Trip, trip_id)
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    return trip
+
+
+@router.get("/{trip_id}/summary", response_model=schemas.TripSummaryOut)
+async def get_trip_summary(trip_id: int, db: AsyncSession = Depends(get_db)):
+    summary = await get_summary(db, trip_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    return summary_out(summary)
+
+
+@router.get("/{trip_id}/deck", response_model=schemas.DeckPage)
+async def get_deck(
+    trip_id: int,
+    background_tasks: BackgroundTasks,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: int = 0,
+    ranked: bool = False,
+    user_id: Optional[int] = Query(None, description="Participante que hace swipe; por defecto el dueño del viaje"),
+    db: AsyncSession = Depends(get_db),
+):
+    if user_id is None:
+        trip = await db.get(models.Trip, trip_id)
+        if not trip:
+            raise HTTPException(status_code=404, detail="Trip not found")
+        user_id = trip.user_id
+    # Swipes aceptados por la cola write-behind que aún no están en la base
+    pending = swipe_buffer.pending_places(trip_id, user_id) if swipe_buffer.enabled else set()
+    if ranked:
+        return await _ranked_deck(trip_id, user_id, limit, cursor, db, pending)
+
+    key = (trip_id, user_id)
+    page = deck_buffer.take(key, cursor, limit)
+    if page is None:
+        city = deck_buffer.city_for(key)
+        if city is None:
+            trip = await db.get(models.Trip, trip_id)
+            if not trip:
+                raise HTTPException(status_code=404, detail="Trip not found")
+            city = trip.destination_city
+        rows = await fetch_candidates(db, trip_id, user_id, city, cursor, limit + deck_buffer.prefetch, pending)
+        page, rest = rows[:limit], rows[limit:]
+        deck_buffer.store(
+            key,
+            city,
+            after=page[-1].id if page else cursor,
+            rows=rest,
+            exhausted=len(rows) < limit + deck_buffer.prefetch,
+        )
+
+    if deck_buffer.needs_refill(key):
+        background_tasks.add_task(deck_buffer.refill, key, pending)
+
+    return schemas.DeckPage(
+        items=page,
+        next_cursor=page[-1].id if len(page) == limit else None,
+    )
+
+
+async def _ranked_deck(
+    trip_id: int, user_id: int, limit: int, cursor: int, db: AsyncSession, pending: set
+) -> schemas.DeckPage:
+    trip = await db.get(models.Trip, trip_id)
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    ranking = await recommender.ranking(db, trip, user_id)
+    if pending:
+        ranking = [place_id for place_id in ranking if place_id not in pending]
+    # El cursor es el último lugar entregado; si el ranking se recalculó y ya
+    # no está (porque se hizo swipe), se sigue desde el principio del nuevo orden.
+    start = ranking.index(cursor) + 1 if cursor in ranking else 0
+    page_ids = ranking[start:start + limit]
+    return schemas.DeckPage(
+        items=await places_by_ids(db, page_ids),
+        next_cursor=page_ids[-1] if start + limit < len(ranking) else None,
+    )
+
+
+@router.post("/{trip_id}/itinerary", response_model=schemas.ItineraryResponse)
+async def create_itinerary(
+    trip_id: int,
+    days: int = Query(..., ge=1, le=30),
+    hours_per_day: float = Query(8.0, gt=0, le=24),
+    db: AsyncSession = Depends(get_db),
+):
+    trip = await db.get(models.Trip, trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
-    return trip
\ No newline at end of file
+
+    pending = swipe_buffer.pending_for_trip(trip_id)
+    result = await db.execute(liked_places(ROUTE_COLUMNS, trip_id=trip_id, pending=pending))
+    places = result.all()
+    if not places:
+        raise HTTPException(400, "El viaje no tiene lugares con like")
+
+    solutions, unscheduled = await run_in_threadpool(plan_for_places, places, days, hours_per_day, trip.destination_city)
+
+    # El itinerario nuevo sustituye al anterior en la misma transacción
+    removed, routes = await replace_itinerary(db, trip_id, solutions)
+    itinerary = [
+        schemas.ItineraryDay(day=route.day, **solution.to_response(route_id=route.id).dict())
+        for route, solution in zip(routes, solutions)
+    ]
+    await db.commit()
+    for route_id in removed:
+        await catalog_cache.invalidate(geometry_namespace(route_id))
+    await realtime.publish(
+        trip_id, *({"type": "route", "route_id": d.route_id, "day": d.day} for d in itinerary)
+    )
+
+    return schemas.ItineraryResponse(days=itinerary, unscheduled=unscheduled)
+
+
+async def _is_member(db: AsyncSession, trip_id: int, user_id: int) -> bool:
+    result = await db.execute(
+        select(models.TripMember.user_id).where(
+            models.TripMember.trip_id == trip_id, models.TripMember.user_id == user_id
+        )
+    )
+    if result.first():
+        return True
+    # Viajes creados antes de trip_members: el dueño sigue teniendo acceso
+    trip = await db.get(models.Trip, trip_id)
+    return trip is not None and trip.user_id == user_id
+
+
+@router.post("/{trip_id}/members", response_model=MemberOut)
+async def add_member(
+    trip_id: int,
+    member_in: MemberCreate,
+    claims: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Sólo el dueño (según su token) invita; `user_id` es el invitado, nunca quien llama."""
+    trip = await db.get(models.Trip, trip_id)
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    if claims["sub"] != trip.user_id:
+        raise HTTPException(status_code=403, detail="Sólo el dueño del viaje puede añadir participantes")
+    if not await db.get(models.User, member_in.user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    result = await db.execute(
+        dialect_insert(db, models.TripMember)
+        .values(trip_id=trip_id, user_id=member_in.user_id, role="member")
+        .on_conflict_do_nothing(index_elements=[models.TripMember.trip_id, models.TripMember.user_id])
+        .returning(models.TripMember.user_id)
+    )
+    joined = result.first() is not None
+    await db.commit()
+    if joined:
+        await realtime.publish(trip_id, {"type": "member_joined", "user_id": member_in.user_id})
+    return MemberOut(user_id=member_in.user_id, role="member")
+
+
+@router.get("/{trip_id}/members", response_model=List[MemberOut])
+async def list_members(trip_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(models.TripMember.user_id, models.TripMember.role)
+        .where(models.TripMember.trip_id == trip_id)
+        .order_by(models.TripMember.joined_at)
+    )
+    return [MemberOut(user_id=user_id, role=role) for user_id, role in result.all()]
+
+
+@router.websocket("/{trip_id}/live")
+async def trip_live(websocket: WebSocket, trip_id: int, token: str = Query(...)):
+    """Eventos del viaje (swipe, match, route, member_joined) en lotes `{"events": [...]}`.
+
+    El token va en la query porque los navegadores no permiten cabeceras en
+    el handshake de WebSocket.
+    """
+    try:
+        user_id = decode_token(token)["sub"]
+    except InvalidToken:
+        await websocket.close(code=1008)
+        return
+    # Sesión corta: no se retiene una conexión del pool mientras dure el socket
+    async with AsyncSessionLocal() as db:
+        allowed = await _is_member(db, trip_id, user_id)
+    if not allowed:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    subscription = realtime.broker.subscribe(trip_id)
+
+    async def sender():
+        window = settings.REALTIME_BATCH_WINDOW_MS / 1000.0
+        while True:
+            batch = await subscription.next_batch(settings.REALTIME_BATCH_MAX_EVENTS, window)
+            await websocket.send_json({"events": batch})
+
+    send_task = asyncio.create_task(sender())
+    try:
+        # Los mensajes del cliente se ignoran; leer sirve para detectar la desconexión
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        send_task.cancel()
+        try:
+            await send_task
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Error enviando eventos del viaje %s", trip_id)
+        realtime.broker.unsubscribe(subscription)
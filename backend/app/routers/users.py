@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from ..database import AsyncSessionLocal
+from ..deps import get_current_user
+from ..export import EXPORT_TABLES, parquet_available, stream_user_export
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+
+@router.get("/{user_id}/export")
+async def export_user_history(
+    user_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|parquet)$"),
+    table: Optional[str] = Query(None, description="Obligatoria con format=parquet (un esquema por fichero)"),
+    claims: dict = Depends(get_current_user),
+):
+    if claims["sub"] != user_id:
+        raise HTTPException(status_code=403, detail="Sólo puedes exportar tu propio historial")
+    if table is not None and table not in EXPORT_TABLES:
+        raise HTTPException(status_code=400, detail=f"Tabla desconocida; opciones: {', '.join(EXPORT_TABLES)}")
+
+    if format == "parquet":
+        if table is None:
+            raise HTTPException(status_code=400, detail="format=parquet requiere table")
+        if not parquet_available():
+            raise HTTPException(status_code=501, detail="La exportación Parquet requiere pyarrow")
+        media_type, suffix = "application/vnd.apache.parquet", "parquet"
+    else:
+        media_type, suffix = "application/x-ndjson", "ndjson"
+
+    filename = f"user-{user_id}-{table or 'history'}.{suffix}"
+    return StreamingResponse(
+        stream_user_export(AsyncSessionLocal, user_id, format, table),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
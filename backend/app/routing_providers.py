@@ -0,0 +1,347 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from .config import settings
+from .geo import haversine_km
+
+logger = logging.getLogger("tinvel.routing")
+
+Coord = Tuple[float, float]
+
+
+class ProviderError(Exception):
+    pass
+
+
+class ProviderUnavailable(ProviderError):
+    """El circuito está abierto: no se intenta la llamada."""
+
+
+@dataclass
+class Leg:
+    distance_km: float
+    minutes: float
+    # Geometría del tramo como (lat, lon), origen y destino incluidos
+    points: List[Coord] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps([self.distance_km, self.minutes, self.points])
+
+    @classmethod
+    def from_json(cls, raw: str) -> "Leg":
+        distance_km, minutes, points = json.loads(raw)
+        return cls(distance_km, minutes, [tuple(p) for p in points])
+
+
+class LegCache:
+    """LRU en memoria delante de un fichero SQLite opcional.
+
+    La clave redondea las coordenadas (ROUTING_CACHE_PRECISION decimales, ~11 m
+    con 4), así que rutas que pasan por los mismos sitios comparten tramos.
+    """
+
+    def __init__(self, max_entries: int, precision: int, path: Optional[str] = None, ttl_seconds: float = 0):
+        self.max_entries = max_entries
+        self.precision = precision
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Leg]" = OrderedDict()
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS legs (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._disk.commit()
+
+    def key(self, provider: str, origin: Coord, destination: Coord) -> str:
+        p = self.precision
+        return f"{provider}:{origin[0]:.{p}f},{origin[1]:.{p}f}:{destination[0]:.{p}f},{destination[1]:.{p}f}"
+
+    def _remember(self, key: str, leg: Leg):
+        self._memory[key] = leg
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[Leg]:
+        # La caché en disco es best-effort: un "database is locked" cuenta como fallo de caché
+        try:
+            with self._disk_lock:
+                row = self._disk.execute("SELECT value, stored_at FROM legs WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("Caché de tramos en disco no disponible: %s", exc)
+            return None
+        if row is None or (self.ttl_seconds and time.time() - row[1] > self.ttl_seconds):
+            return None
+        return Leg.from_json(row[0])
+
+    def _disk_set(self, items: List[Tuple[str, Leg]]):
+        now = time.time()
+        try:
+            with self._disk_lock:
+                self._disk.executemany(
+                    "INSERT OR REPLACE INTO legs (key, value, stored_at) VALUES (?, ?, ?)",
+                    [(key, leg.to_json(), now) for key, leg in items],
+                )
+                self._disk.commit()
+        except sqlite3.Error as exc:
+            logger.warning("No se pudieron guardar %d tramos en la caché en disco: %s", len(items), exc)
+            if self._disk.in_transaction:
+                self._disk.rollback()
+
+    async def get(self, key: str) -> Optional[Leg]:
+        leg = self._memory.get(key)
+        if leg is not None:
+            self._memory.move_to_end(key)
+            return leg
+        if self._disk is None:
+            return None
+        leg = await run_in_threadpool(self._disk_get, key)
+        if leg is not None:
+            self._remember(key, leg)
+        return leg
+
+    async def set_many(self, items: List[Tuple[str, Leg]]):
+        for key, leg in items:
+            self._remember(key, leg)
+        if self._disk is not None and items:
+            await run_in_threadpool(self._disk_set, items)
+
+
+class CircuitBreaker:
+    """Abre tras `failure_threshold` fallos seguidos; pasado `reset_seconds` deja
+    pasar una llamada de prueba (semiabierto) y se cierra si sale bien."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._probing):
+            raise ProviderUnavailable("Circuito abierto para el proveedor de rutas")
+        if state == "half-open":
+            self._probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class RoutingProvider(ABC):
+    """Tiempos y distancias por tramo, con caché y deduplicación de tramos."""
+
+    name = "base"
+
+    def __init__(self, cache: Optional[LegCache] = None):
+        self.cache = cache
+
+    @abstractmethod
+    async def _fetch(self, origin: Coord, destination: Coord) -> Leg:
+        ...
+
+    async def legs(self, pairs: Sequence[Tuple[Coord, Coord]]) -> List[Leg]:
+        found: Dict[str, Leg] = {}
+        missing: Dict[str, Tuple[Coord, Coord]] = {}
+        keys = []
+        for origin, destination in pairs:
+            key = self.cache.key(self.name, origin, destination) if self.cache else f"{origin}:{destination}"
+            keys.append(key)
+            if key in found or key in missing:
+                continue
+            leg = await self.cache.get(key) if self.cache else None
+            if leg is not None:
+                found[key] = leg
+            else:
+                missing[key] = (origin, destination)
+
+        if missing:
+            fetched = await asyncio.gather(
+                *(self._fetch(o, d) for o, d in missing.values()), return_exceptions=True
+            )
+            fresh = []
+            for (key, (origin, destination)), leg in zip(missing.items(), fetched):
+                if isinstance(leg, Exception):
+                    # Un tramo fallido no tumba la ruta: se estima en local y no se cachea
+                    logger.warning("Proveedor %s sin respuesta para %s: %s", self.name, key, leg)
+                    found[key] = local_leg(origin, destination)
+                else:
+                    found[key] = leg
+                    fresh.append((key, leg))
+            if self.cache:
+                await self.cache.set_many(fresh)
+        return [found[key] for key in keys]
+
+    async def aclose(self):
+        pass
+
+
+def local_leg(origin: Coord, destination: Coord, speed_kmh: Optional[float] = None) -> Leg:
+    distance = haversine_km(origin[0], origin[1], destination[0], destination[1])
+    speed = speed_kmh or settings.ROUTE_AVG_SPEED_KMH
+    return Leg(distance_km=distance, minutes=distance / speed * 60.0, points=[origin, destination])
+
+
+class LocalProvider(RoutingProvider):
+    """Proveedor sin red: línea recta a velocidad media. También sirve de fake en pruebas."""
+
+    name = "local"
+
+    def __init__(self, cache: Optional[LegCache] = None, speed_kmh: Optional[float] = None):
+        super().__init__(cache)
+        self.speed_kmh = speed_kmh
+        self.calls = 0
+
+    async def _fetch(self, origin: Coord, destination: Coord) -> Leg:
+        self.calls += 1
+        return local_leg(origin, destination, self.speed_kmh)
+
+
+class AzureMapsProvider(RoutingProvider):
+    """Route Directions de Azure Maps sobre un cliente httpx compartido.
+
+    Un único AsyncClient mantiene las conexiones vivas (HTTP/2 si está `h2`),
+    el semáforo limita las llamadas en vuelo y el circuito corta los
+    reintentos mientras el servicio está caído.
+    """
+
+    name = "azure"
+    URL = "https://atlas.microsoft.com/route/directions/json"
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        key: str,
+        cache: Optional[LegCache] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        max_concurrency: int = 16,
+        retries: int = 2,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        super().__init__(cache)
+        self.key = key
+        self.client = client or httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=httpx.Timeout(settings.ROUTING_TIMEOUT_SECONDS, connect=settings.ROUTING_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.ROUTING_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ROUTING_MAX_CONNECTIONS,
+            ),
+        )
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker(
+            settings.ROUTING_BREAKER_FAILURES, settings.ROUTING_BREAKER_RESET_SECONDS
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _request(self, origin: Coord, destination: Coord) -> httpx.Response:
+        params = {
+            "api-version": "1.0",
+            "subscription-key": self.key,
+            "query": f"{origin[0]},{origin[1]}:{destination[0]},{destination[1]}",
+            "travelMode": "car",
+        }
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.get(self.URL, params=params)
+            except httpx.TransportError as exc:
+                error = ProviderError(f"Azure Maps: {exc.__class__.__name__}")
+            else:
+                if response.status_code not in self.RETRY_STATUS:
+                    return response
+                if response.status_code < 500 and attempt == self.retries:
+                    # Un 429 que persiste es cuota agotada, no una caída: no abre el circuito
+                    return response
+                error = ProviderError(f"Azure Maps respondió {response.status_code}")
+            if attempt < self.retries:
+                # Backoff exponencial con jitter
+                await asyncio.sleep(0.1 * (2 ** attempt) * (1 + random.random()))
+        raise error
+
+    async def _fetch(self, origin: Coord, destination: Coord) -> Leg:
+        self.breaker.before_call()
+        async with self._semaphore:
+            try:
+                response = await self._request(origin, destination)
+            except ProviderError:
+                # Sólo 5xx, timeouts y errores de transporte llegan aquí
+                self.breaker.record_failure()
+                raise
+        # El servicio respondió: un 4xx o un cuerpo inesperado es un fallo de la petición
+        self.breaker.record_success()
+        try:
+            response.raise_for_status()
+            route = response.json()["routes"][0]
+        except (httpx.HTTPStatusError, KeyError, IndexError, ValueError) as exc:
+            raise ProviderError(str(exc)) from exc
+        summary = route["summary"]
+        points = [(p["latitude"], p["longitude"]) for leg in route.get("legs", []) for p in leg.get("points", [])]
+        return Leg(
+            distance_km=summary["lengthInMeters"] / 1000.0,
+            minutes=summary["travelTimeInSeconds"] / 60.0,
+            points=points or [origin, destination],
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_provider() -> RoutingProvider:
+    cache = LegCache(
+        settings.ROUTING_CACHE_MAX_ENTRIES,
+        settings.ROUTING_CACHE_PRECISION,
+        settings.ROUTING_CACHE_PATH,
+        settings.ROUTING_CACHE_TTL_SECONDS,
+    )
+    if settings.ROUTING_PROVIDER == "azure":
+        if not settings.AZURE_MAPS_KEY:
+            raise RuntimeError("ROUTING_PROVIDER=azure requiere AZURE_MAPS_KEY")
+        return AzureMapsProvider(
+            settings.AZURE_MAPS_KEY,
+            cache,
+            max_concurrency=settings.ROUTING_MAX_CONCURRENCY,
+            retries=settings.ROUTING_RETRIES,
+        )
+    return LocalProvider(cache)
+
+
+routing_provider = create_provider()
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from datetime import datetime
+from typing import Dict, Optional, List
 
 
 class PlaceBase(BaseModel):
@@ -13,7 +14,7 @@ class PlaceBase(BaseModel):
 
 
 class PlaceCreate(PlaceBase):
-    pass
+    categories: List[str] = []
 
 
 class PlaceOut(PlaceBase):
@@ -24,8 +25,36 @@ class PlaceOut(PlaceBase):
         orm_mode = True
 
 
+class PlaceNearby(PlaceOut):
+    distance_km: float
+
+
+class PlaceSearchPage(BaseModel):
+    total: int
+    items: List[PlaceOut]
+    # Lugares activos de la ciudad por categoría
+    facets: Dict[str, int]
+
+
+class CategoryOut(BaseModel):
+    id: int
+    name: str
+
+    class Config:
+        orm_mode = True
+
+
+class PlaceCategoriesUpdate(BaseModel):
+    categories: List[str]
+
+
+class DeckPage(BaseModel):
+    items: List[PlaceOut]
+    next_cursor: Optional[int] = None
+
+
 class SwipeBase(BaseModel):
-    user_id: str
+    user_id: int
     place_id: int
     liked: bool
 
@@ -50,6 +79,14 @@ class SwipeOut(SwipeBase):
         orm_mode = True
 
 
+class SwipeBatchItem(BaseModel):
+    index: int
+    # created | updated | superseded | queued | error
+    status: str
+    swipe: Optional[SwipeOut] = None
+    detail: Optional[str] = None
+
+
 class RoutePoint(BaseModel):
     place_id: int
     latitude: float
@@ -57,5 +94,63 @@ class RoutePoint(BaseModel):
 
 
 class RouteResponse(BaseModel):
+    route_id: Optional[int] = None
     ordered_points: List[RoutePoint]
     estimated_total_time_minutes: float
+    total_distance_km: float = 0.0
+
+
+class RouteGeometry(BaseModel):
+    route_id: int
+    # Tolerancia de simplificación aplicada, en metros (0 = geometría completa)
+    tolerance_m: float
+    points: int
+    original_points: int
+    # Polyline codificada de Google, precisión 5
+    polyline: str
+
+
+class ItineraryDay(RouteResponse):
+    day: int
+
+
+class ItineraryResponse(BaseModel):
+    days: List[ItineraryDay]
+    # Lugares que no caben en ningún día con el presupuesto de horas
+    unscheduled: List[int] = []
+
+
+class TripSummaryRoute(BaseModel):
+    route_id: int
+    total_time: Optional[float] = None
+    total_distance: Optional[float] = None
+
+
+class TripSummaryOut(BaseModel):
+    trip_id: int
+    city: str
+    country: str
+    swipe_count: int
+    like_count: int
+    liked_place_ids: List[int]
+    centroid_lat: Optional[float] = None
+    centroid_lon: Optional[float] = None
+    # [min_lat, min_lon, max_lat, max_lon] de los lugares con like
+    bbox: Optional[List[float]] = None
+    latest_route: Optional[TripSummaryRoute] = None
+
+
+class RouteJobCreate(BaseModel):
+    trip_id: int
+
+
+class RouteJobOut(BaseModel):
+    id: int
+    trip_id: int
+    # queued | running | done | failed
+    status: str
+    route_id: Optional[int] = None
+    result: Optional[RouteResponse] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
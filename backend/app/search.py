@@ -0,0 +1,282 @@
+import asyncio
+import re
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, exists, func, insert, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import settings
+from .database import dialect_insert
+
+SORTS = ("relevance", "name", "id")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Aproxima el parser `simple` de Postgres: palabras en minúsculas."""
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    """Índice invertido en memoria de nombre y descripción.
+
+    Respaldo para bases sin tsvector (SQLite en desarrollo y pruebas). Mismo
+    criterio que `plainto_tsquery`: un lugar coincide si contiene todas las
+    palabras de la consulta; la relevancia es la suma de sus apariciones.
+
+    Se recarga como el índice espacial: altas nuevas cada `refresh_seconds`,
+    y todo si no cuadra el número de activos o cada `rebuild_seconds` (bajas
+    y cambios de nombre hechos en otros procesos).
+    """
+
+    def __init__(self, refresh_seconds: float, rebuild_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._tokens: Dict[int, Dict[str, int]] = {}
+        self._max_id = 0
+        self._loaded_at: Optional[float] = None
+        self._built_at: Optional[float] = None
+        # Altas y bajas de este proceso durante una recarga completa
+        self._replay: Optional[List[Tuple[int, Optional[Tuple[str, Optional[str]]]]]] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def add(self, place_id: int, name: str, description: Optional[str]):
+        self.remove(place_id)
+        _index_place(self._postings, self._tokens, place_id, name, description)
+        if self._replay is not None:
+            self._replay.append((place_id, (name, description)))
+
+    def remove(self, place_id: int):
+        if self._replay is not None:
+            self._replay.append((place_id, None))
+        for token in self._tokens.pop(place_id, ()):
+            postings = self._postings[token]
+            postings.pop(place_id, None)
+            if not postings:
+                del self._postings[token]
+
+    async def ensure_fresh(self, db: AsyncSession):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            if self._built_at is None or time.monotonic() - self._built_at >= self.rebuild_seconds:
+                await self._rebuild(db)
+                return
+            # Igual que el índice espacial: sólo los lugares nuevos desde la última carga
+            result = await db.execute(
+                select(models.Place.id, models.Place.name, models.Place.description)
+                .where(models.Place.is_active.is_(True), models.Place.id > self._max_id)
+                .order_by(models.Place.id)
+            )
+            for place_id, name, description in result.all():
+                self.add(place_id, name, description)
+                self._max_id = place_id
+            active = await db.scalar(select(func.count()).where(models.Place.is_active.is_(True)))
+            if active != len(self._tokens):
+                await self._rebuild(db)
+                return
+            self._loaded_at = time.monotonic()
+
+    async def _rebuild(self, db: AsyncSession):
+        self._replay = []
+        try:
+            result = await db.execute(
+                select(models.Place.id, models.Place.name, models.Place.description)
+                .where(models.Place.is_active.is_(True))
+            )
+            postings, tokens = await run_in_threadpool(_build_index, result.all())
+            self._postings, self._tokens = postings, tokens
+            replay, self._replay = self._replay, None
+            for place_id, text in replay:
+                if text is None:
+                    self.remove(place_id)
+                else:
+                    self.add(place_id, *text)
+        finally:
+            self._replay = None
+        self._max_id = max(self._tokens, default=0)
+        self._built_at = self._loaded_at = time.monotonic()
+
+    def match(self, q: str) -> Dict[int, int]:
+        """place_id -> relevancia de los lugares que contienen todas las palabras."""
+        tokens = set(tokenize(q))
+        if not tokens:
+            return {}
+        postings = sorted((self._postings.get(t, {}) for t in tokens), key=len)
+        scores = dict(postings[0])
+        for other in postings[1:]:
+            scores = {place_id: score + other[place_id] for place_id, score in scores.items() if place_id in other}
+            if not scores:
+                break
+        return scores
+
+
+def _index_place(postings, tokens, place_id: int, name: str, description: Optional[str]):
+    counts: Dict[str, int] = defaultdict(int)
+    for token in tokenize(name) + tokenize(description):
+        counts[token] += 1
+    for token, count in counts.items():
+        postings[token][place_id] = count
+    tokens[place_id] = dict(counts)
+
+
+def _build_index(rows):
+    postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+    tokens: Dict[int, Dict[str, int]] = {}
+    for place_id, name, description in rows:
+        _index_place(postings, tokens, place_id, name, description)
+    return postings, tokens
+
+
+search_index = InvertedIndex(settings.SEARCH_INDEX_REFRESH_SECONDS, settings.SEARCH_INDEX_REBUILD_SECONDS)
+
+
+def _base_query(city: str, categories: Sequence[str]):
+    query = select(models.Place).where(models.Place.city == city, models.Place.is_active.is_(True))
+    if categories:
+        category_ids = select(models.Category.id).where(models.Category.name.in_(categories))
+        # Cualquiera de las categorías pedidas
+        query = query.where(exists().where(
+            models.PlaceCategory.place_id == models.Place.id,
+            models.PlaceCategory.category_id.in_(category_ids),
+        ))
+    return query
+
+
+async def search_places(
+    db: AsyncSession,
+    city: str,
+    categories: Sequence[str] = (),
+    q: Optional[str] = None,
+    sort: str = "id",
+    limit: int = 50,
+    offset: int = 0,
+) -> Tuple[int, List[models.Place]]:
+    """(total, página) de lugares activos de la ciudad."""
+    query = _base_query(city, categories)
+    order = {"name": (models.Place.name, models.Place.id), "id": (models.Place.id,)}
+    q = (q or "").strip()
+    if q and db.bind.dialect.name == "postgresql":
+        vector = models.search_vector(models.Place.name, models.Place.description)
+        tsquery = func.plainto_tsquery(literal_column("'simple'"), q)
+        query = query.where(vector.op("@@")(tsquery))
+        order["relevance"] = (func.ts_rank(vector, tsquery).desc(), models.Place.id)
+    elif q:
+        await search_index.ensure_fresh(db)
+        scores = search_index.match(q)
+        if not scores:
+            return 0, []
+        query = query.where(models.Place.id.in_(scores))
+        if sort == "relevance":
+            # El orden vive en memoria: se filtran los ids en SQL y se ordena aquí
+            result = await db.execute(query.with_only_columns(models.Place.id))
+            ids = sorted(result.scalars().all(), key=lambda place_id: (-scores[place_id], place_id))
+            page = ids[offset:offset + limit]
+            result = await db.execute(select(models.Place).where(models.Place.id.in_(page)))
+            by_id = {p.id: p for p in result.scalars().all()}
+            return len(ids), [by_id[i] for i in page if i in by_id]
+
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    result = await db.execute(query.order_by(*order.get(sort, order["id"])).limit(limit).offset(offset))
+    return total, result.scalars().all()
+
+
+async def city_facets(db: AsyncSession, city: str) -> Dict[str, int]:
+    """Lugares activos por categoría en la ciudad, leídos de la tabla precalculada."""
+    result = await db.execute(
+        select(models.Category.name, models.CityCategoryCount.places)
+        .join(models.Category, models.Category.id == models.CityCategoryCount.category_id)
+        .where(models.CityCategoryCount.city == city, models.CityCategoryCount.places > 0)
+        .order_by(models.CityCategoryCount.places.desc(), models.Category.name)
+    )
+    return dict(result.all())
+
+
+async def _apply_facet_deltas(db: AsyncSession, city: str, deltas: Dict[int, int]):
+    rows = [{"city": city, "category_id": c, "places": d} for c, d in deltas.items() if d]
+    if not rows:
+        return
+    table = models.CityCategoryCount.__table__
+    stmt = dialect_insert(db, table).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.city, table.c.category_id],
+        set_={"places": table.c.places + stmt.excluded.places},
+    ))
+
+
+async def ensure_categories(db: AsyncSession, names: Sequence[str]) -> Dict[str, int]:
+    if not names:
+        return {}
+    await db.execute(
+        dialect_insert(db, models.Category.__table__)
+        .values([{"name": n} for n in names])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    result = await db.execute(select(models.Category.name, models.Category.id).where(models.Category.name.in_(names)))
+    return dict(result.all())
+
+
+async def _place_category_ids(db: AsyncSession, place_id: int) -> set:
+    result = await db.execute(
+        select(models.PlaceCategory.category_id).where(models.PlaceCategory.place_id == place_id)
+    )
+    return set(result.scalars().all())
+
+
+async def set_place_categories(db: AsyncSession, place: models.Place, names: Sequence[str]) -> List[str]:
+    """Sustituye las categorías del lugar y ajusta las facetas en la misma transacción."""
+    names = sorted({n.strip() for n in names if n.strip()})
+    wanted = set((await ensure_categories(db, names)).values())
+    current = await _place_category_ids(db, place.id)
+    added, removed = wanted - current, current - wanted
+    if added:
+        await db.execute(insert(models.PlaceCategory), [{"place_id": place.id, "category_id": c} for c in added])
+    if removed:
+        await db.execute(delete(models.PlaceCategory).where(
+            models.PlaceCategory.place_id == place.id,
+            models.PlaceCategory.category_id.in_(removed),
+        ))
+    if place.is_active:
+        deltas = {c: 1 for c in added}
+        deltas.update({c: -1 for c in removed})
+        await _apply_facet_deltas(db, place.city, deltas)
+    return names
+
+
+async def place_deactivated(db: AsyncSession, place: models.Place):
+    """Descuenta de las facetas un lugar que deja de estar activo."""
+    current = await _place_category_ids(db, place.id)
+    await _apply_facet_deltas(db, place.city, {c: -1 for c in current})
+
+
+def rebuild_facet_counts(conn):
+    """Recalcula todas las facetas con GROUP BY (carga masiva, reparación)."""
+    table = models.CityCategoryCount.__table__
+    conn.execute(delete(table))
+    conn.execute(insert(table).from_select(
+        ["city", "category_id", "places"],
+        select(models.Place.city, models.PlaceCategory.category_id, func.count())
+        .join(models.PlaceCategory, models.PlaceCategory.place_id == models.Place.id)
+        .where(models.Place.is_active.is_(True))
+        .group_by(models.Place.city, models.PlaceCategory.category_id),
+    ))
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    with engine.begin() as connection:
+        rebuild_facet_counts(connection)
+    print("Facetas recalculadas")
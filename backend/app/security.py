@@ -0,0 +1,129 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger("tinvel.security")
+
+SCHEME = "scrypt"
+# Sólo para APP_ENV=development: es pública, cualquiera podría firmar tokens con ella
+DEV_SECRET_KEY = "dev-secret-change-me"
+
+# hashlib.scrypt suelta el GIL, así que un pool de hilos acotado basta para
+# sacar el coste del event loop y limitar cuántos hashes corren a la vez.
+_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _current_params() -> Tuple[int, int, int]:
+    return settings.PASSWORD_SCRYPT_N, settings.PASSWORD_SCRYPT_R, settings.PASSWORD_SCRYPT_P
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, dklen=32,
+        # La memoria necesaria es 128·n·r; el límite por defecto de OpenSSL (32 MB) se queda corto con n grandes
+        maxmem=256 * n * r,
+    )
+
+
+def hash_password_sync(password: str) -> str:
+    """`scrypt$n$r$p$salt$hash`: los parámetros viajan con el hash."""
+    n, r, p = _current_params()
+    salt = os.urandom(16)
+    return f"{SCHEME}${n}${r}${p}${_b64encode(salt)}${_b64encode(_scrypt(password, salt, n, r, p))}"
+
+
+def verify_password_sync(password: str, stored: str) -> Tuple[bool, bool]:
+    """(coincide, hay que regenerar el hash)."""
+    if not stored.startswith(SCHEME + "$"):
+        # Contraseñas en claro de antes de hashear: se aceptan una vez y se migran
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    _, n, r, p, salt, expected = stored.split("$")
+    n, r, p = int(n), int(r), int(p)
+    ok = hmac.compare_digest(_scrypt(password, _b64decode(salt), n, r, p), _b64decode(expected))
+    return ok, (n, r, p) != _current_params()
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_pool, hash_password_sync, password)
+
+
+async def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    return await asyncio.get_running_loop().run_in_executor(_pool, verify_password_sync, password, stored)
+
+
+# Se verifica contra este hash cuando el usuario no existe, para que el tiempo
+# de respuesta no revele qué correos están registrados.
+_DUMMY_HASH: Optional[str] = None
+
+
+async def dummy_verify(password: str):
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None:
+        _DUMMY_HASH = await hash_password("dummy-password")
+    await verify_password(password, _DUMMY_HASH)
+
+
+def check_secret_key(startup: bool = False):
+    """Falla (al arrancar la API) si fuera de development no hay una clave propia."""
+    if settings.SECRET_KEY not in (None, "", DEV_SECRET_KEY):
+        return
+    if settings.APP_ENV != "development":
+        raise RuntimeError("SECRET_KEY no configurada: defínela (igual en todos los workers) o usa APP_ENV=development")
+    if startup:
+        logger.warning("Tokens firmados con la clave pública de desarrollo: define APP_ENV=production y SECRET_KEY al desplegar")
+
+
+def _sign(payload: bytes) -> str:
+    check_secret_key()
+    key = (settings.SECRET_KEY or DEV_SECRET_KEY).encode()
+    return _b64encode(hmac.new(key, payload, hashlib.sha256).digest())
+
+
+def create_token(user_id: int, email: str, ttl_seconds: Optional[float] = None) -> str:
+    """Token firmado (HMAC-SHA256) sin estado: payload.firma en base64url."""
+    expires = int(time.time() + (ttl_seconds or settings.TOKEN_TTL_SECONDS))
+    payload = _b64encode(json.dumps({"sub": user_id, "email": email, "exp": expires}, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload.encode())}"
+
+
+def decode_token(token: str) -> dict:
+    try:
+        payload, signature = token.split(".")
+    except ValueError:
+        raise InvalidToken("Token mal formado")
+    # compare_digest con str no ASCII lanza TypeError: se comparan bytes
+    try:
+        valid = hmac.compare_digest(signature.encode("ascii"), _sign(payload.encode()).encode("ascii"))
+    except UnicodeEncodeError:
+        valid = False
+    if not valid:
+        raise InvalidToken("Firma inválida")
+    try:
+        claims = json.loads(_b64decode(payload))
+        expires = claims["exp"]
+    except (ValueError, KeyError):
+        raise InvalidToken("Token mal formado")
+    if expires < time.time():
+        raise InvalidToken("Token caducado")
+    return claims
@@ -0,0 +1,236 @@
+import asyncio
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import settings
+from .geo import geohash_cover, geohash_encode, geohash_successor, haversine_km, radius_bbox, split_bbox
+
+# (geohash, place_id, lat, lon)
+Entry = Tuple[str, int, float, float]
+
+
+def _in_bbox(lat: float, lon: float, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> bool:
+    return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+
+
+class SpatialIndex:
+    """Índice geohash en memoria sobre los lugares activos.
+
+    Las entradas se mantienen ordenadas por geohash, igual que el índice B-tree
+    de `places.geohash`, así que una celda es un rango contiguo y se resuelve
+    con bisect.
+
+    Cada `refresh_seconds` se leen los lugares nuevos (keyset sobre la PK). Las
+    bajas hechas en otros procesos no aparecen ahí: si el número de activos
+    en la base no cuadra, o cada `rebuild_seconds`, se recarga todo.
+    """
+
+    def __init__(self, refresh_seconds: float, rebuild_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self._entries: List[Entry] = []
+        self._by_id: Dict[int, Entry] = {}
+        self._max_id = 0
+        self._loaded_at: Optional[float] = None
+        self._built_at: Optional[float] = None
+        # Altas y bajas de este proceso mientras se recarga, para repetirlas sobre lo nuevo
+        self._replay: Optional[List[Tuple[int, Optional[Tuple[float, float]]]]] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, place_id: int, lat: float, lon: float):
+        self.remove(place_id)
+        entry = (geohash_encode(lat, lon), place_id, lat, lon)
+        insort(self._entries, entry)
+        self._by_id[place_id] = entry
+        if self._replay is not None:
+            self._replay.append((place_id, (lat, lon)))
+
+    def remove(self, place_id: int):
+        if self._replay is not None:
+            self._replay.append((place_id, None))
+        entry = self._by_id.pop(place_id, None)
+        if entry is not None:
+            idx = bisect_left(self._entries, entry)
+            del self._entries[idx]
+
+    async def ensure_fresh(self, db: AsyncSession):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            if self._built_at is None or time.monotonic() - self._built_at >= self.rebuild_seconds:
+                await self._rebuild(db)
+                return
+            # Sólo se leen los lugares nuevos desde la última carga (keyset sobre la PK);
+            # las altas de este proceso ya entraron por add().
+            result = await db.execute(
+                select(models.Place.id, models.Place.latitude, models.Place.longitude)
+                .where(models.Place.is_active.is_(True), models.Place.id > self._max_id)
+                .order_by(models.Place.id)
+            )
+            for place_id, lat, lon in result.all():
+                self.add(place_id, lat, lon)
+                self._max_id = place_id
+            active = await db.scalar(select(func.count()).where(models.Place.is_active.is_(True)))
+            if active != len(self._entries):
+                await self._rebuild(db)
+                return
+            self._loaded_at = time.monotonic()
+
+    async def _rebuild(self, db: AsyncSession):
+        self._replay = []
+        try:
+            result = await db.execute(
+                select(models.Place.geohash, models.Place.id, models.Place.latitude, models.Place.longitude)
+                .where(models.Place.is_active.is_(True))
+            )
+            entries = await run_in_threadpool(_sorted_entries, result.all())
+            # Se cambia todo de una vez y se repite lo hecho aquí mientras tanto
+            self._entries, self._by_id = entries, {entry[1]: entry for entry in entries}
+            replay, self._replay = self._replay, None
+            for place_id, coords in replay:
+                if coords is None:
+                    self.remove(place_id)
+                else:
+                    self.add(place_id, *coords)
+        finally:
+            self._replay = None
+        self._max_id = max(self._by_id, default=0)
+        self._built_at = self._loaded_at = time.monotonic()
+
+    def bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Entry]:
+        found = []
+        entries = self._entries
+        for box in split_bbox(min_lat, min_lon, max_lat, max_lon):
+            for cell in geohash_cover(*box):
+                hi = geohash_successor(cell)
+                start = bisect_left(entries, (cell,))
+                end = bisect_left(entries, (hi,)) if hi else len(entries)
+                for entry in entries[start:end]:
+                    if _in_bbox(entry[2], entry[3], *box):
+                        found.append(entry)
+        return found
+
+    def nearby(self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        hits = []
+        for _, place_id, plat, plon in self.bbox(*radius_bbox(lat, lon, radius_km)):
+            distance = haversine_km(lat, lon, plat, plon)
+            if distance <= radius_km:
+                hits.append((place_id, distance))
+        hits.sort(key=lambda h: h[1])
+        return hits[:limit]
+
+
+def _sorted_entries(rows) -> List[Entry]:
+    return sorted(
+        (geohash or geohash_encode(lat, lon), place_id, lat, lon) for geohash, place_id, lat, lon in rows
+    )
+
+
+def geohash_filter(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    """Equivalente SQL del índice: rangos sobre el B-tree de places.geohash."""
+    boxes = []
+    for box in split_bbox(min_lat, min_lon, max_lat, max_lon):
+        ranges = []
+        for cell in geohash_cover(*box):
+            hi = geohash_successor(cell)
+            cond = models.Place.geohash >= cell
+            if hi:
+                cond = and_(cond, models.Place.geohash < hi)
+            ranges.append(cond)
+        boxes.append(and_(
+            or_(*ranges),
+            models.Place.latitude.between(box[0], box[2]),
+            models.Place.longitude.between(box[1], box[3]),
+        ))
+    return or_(*boxes)
+
+
+async def places_in_bbox(
+    db: AsyncSession, min_lat: float, min_lon: float, max_lat: float, max_lon: float, limit: int
+) -> List[models.Place]:
+    if settings.SPATIAL_INDEX_ENABLED:
+        await spatial_index.ensure_fresh(db)
+        ids = [e[1] for e in spatial_index.bbox(min_lat, min_lon, max_lat, max_lon)]
+        return await _active_places(db, ids, limit)
+    result = await db.execute(
+        select(models.Place)
+        .where(models.Place.is_active.is_(True), geohash_filter(min_lat, min_lon, max_lat, max_lon))
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def entries_in_bbox(
+    db: AsyncSession, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+) -> List[Entry]:
+    """Todas las entradas (geohash, id, lat, lon) activas de la caja, sin límite."""
+    if settings.SPATIAL_INDEX_ENABLED:
+        await spatial_index.ensure_fresh(db)
+        # Una caja grande (zoom bajo) recorre medio índice: fuera del bucle de eventos
+        entries = await run_in_threadpool(spatial_index.bbox, min_lat, min_lon, max_lat, max_lon)
+        # Bajas de otros procesos que el índice aún no ha recargado: pocas, y el
+        # índice de geohash las acota a la caja
+        result = await db.execute(
+            select(models.Place.id)
+            .where(models.Place.is_active.is_(False), geohash_filter(min_lat, min_lon, max_lat, max_lon))
+        )
+        inactive = set(result.scalars().all())
+        return [entry for entry in entries if entry[1] not in inactive] if inactive else entries
+    result = await db.execute(
+        select(models.Place.geohash, models.Place.id, models.Place.latitude, models.Place.longitude)
+        .where(models.Place.is_active.is_(True), geohash_filter(min_lat, min_lon, max_lat, max_lon))
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def places_nearby(
+    db: AsyncSession, lat: float, lon: float, radius_km: float, limit: int
+) -> List[Tuple[models.Place, float]]:
+    if settings.SPATIAL_INDEX_ENABLED:
+        await spatial_index.ensure_fresh(db)
+        hits = spatial_index.nearby(lat, lon, radius_km)
+    else:
+        result = await db.execute(
+            select(models.Place.id, models.Place.latitude, models.Place.longitude)
+            .where(models.Place.is_active.is_(True), geohash_filter(*radius_bbox(lat, lon, radius_km)))
+        )
+        hits = [
+            (place_id, haversine_km(lat, lon, plat, plon))
+            for place_id, plat, plon in result.all()
+        ]
+        hits = sorted((h for h in hits if h[1] <= radius_km), key=lambda h: h[1])
+
+    distances = dict(hits)
+    places = await _active_places(db, [place_id for place_id, _ in hits], limit)
+    return [(p, distances[p.id]) for p in places]
+
+
+async def _active_places(db: AsyncSession, ids: List[int], limit: Optional[int] = None) -> List[models.Place]:
+    """Lugares activos en el orden de `ids`; con `limit`, se filtra antes de cortar."""
+    places = []
+    chunk = max(limit or len(ids), 1)
+    for start in range(0, len(ids), chunk):
+        page = ids[start:start + chunk]
+        result = await db.execute(
+            select(models.Place).where(models.Place.id.in_(page), models.Place.is_active.is_(True))
+        )
+        by_id = {p.id: p for p in result.scalars().all()}
+        places.extend(by_id[i] for i in page if i in by_id)
+        if limit is not None and len(places) >= limit:
+            return places[:limit]
+    return places
+
+
+spatial_index = SpatialIndex(settings.SPATIAL_INDEX_REFRESH_SECONDS, settings.SPATIAL_INDEX_REBUILD_SECONDS)
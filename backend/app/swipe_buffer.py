@@ -0,0 +1,318 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from . import schemas
+from .config import settings
+from .database import AsyncSessionLocal
+from .deck import deck_buffer
+from .instrumentation import metrics
+from .swipe_store import SwipeKey, upsert_swipes
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger("tinvel.swipe_buffer")
+
+# Tiempo máximo que una petición espera a que el flush libere sitio en la cola llena
+FULL_WAIT_SECONDS = 2.0
+
+Segment = Tuple[str, int]
+
+
+class BufferFull(Exception):
+    pass
+
+
+def _lock(fd: int) -> bool:
+    """Bloqueo exclusivo del segmento: un segmento sin dueño vivo es de un proceso caído."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+class SwipeBuffer:
+    """Cola write-behind de swipes con WAL local y escritura en grupo.
+
+    Cada swipe aceptado se añade a un segmento del WAL (una línea JSON) y a
+    `_pending`, donde una misma clave (usuario, viaje, lugar) se queda con el
+    último valor. El flusher escribe lo pendiente cada `interval` segundos (o
+    antes si se juntan `max_rows`) con upsert_swipes: un INSERT multi-fila y un
+    commit por cada `max_rows` swipes en lugar de uno por petición. Al empezar
+    cada flush se sella el segmento activo; se borra cuando todo lo que
+    contenía está en la base.
+
+    Al arrancar se reclaman los segmentos que no bloquea ningún proceso vivo
+    (de un proceso caído) y se reescriben. Un swipe de la misma clave hecho en
+    otro worker entre la caída y el arranque puede quedar pisado por el del WAL.
+
+    La cola es del proceso: sólo el worker que aceptó un swipe lo ve antes del
+    flush (en el deck, /swipes/liked, los lugares y rutas del viaje y el
+    itinerario). Con varios workers, un cliente sólo lee sus propias escrituras
+    si el balanceador lo fija a un worker (sticky por usuario); si no, puede
+    ver el estado anterior durante un intervalo de flush. Los trabajos de ruta
+    vacían la cola antes de encolarse, porque los resuelve otro proceso.
+    Siguen siendo eventualmente consistentes los resúmenes de viaje y el
+    rebuild del recomendador.
+    """
+
+    def __init__(self, directory: str, interval: float, max_rows: int, max_queued: int, fsync: bool):
+        self.directory = directory
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_queued = max_queued
+        self.fsync = fsync
+        self._pending: Dict[SwipeKey, schemas.SwipeCreate] = {}
+        self._inflight: Dict[SwipeKey, schemas.SwipeCreate] = {}
+        self._active: Optional[Segment] = None
+        self._sealed: List[Segment] = []
+        self._sequence = 0
+        self._written = 0
+        self._synced = 0
+        self._sync_lock: Optional[asyncio.Lock] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending) + len(self._inflight)
+
+    async def start(self):
+        # Primitivas del bucle en el que arranca la aplicación
+        self._sync_lock, self._flush_lock = asyncio.Lock(), asyncio.Lock()
+        self._wakeup, self._space = asyncio.Event(), asyncio.Event()
+        os.makedirs(self.directory, exist_ok=True)
+        self._recover()
+        self._active = self._open_segment()
+        if self._pending:
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("No se pudieron reescribir los swipes recuperados del WAL")
+        self._task = asyncio.create_task(self._run(), name="swipe-flusher")
+
+    async def stop(self):
+        """Detiene el flusher y vacía la cola; lo que no se pueda escribir queda en el WAL."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Quedan %d swipes sin escribir; se recuperarán del WAL", self.depth)
+        for _, fd in self._sealed + ([self._active] if self._active else []):
+            os.close(fd)
+        if self._active is not None and not self._sealed and not self.depth:
+            os.unlink(self._active[0])
+        self._active = None
+        self._sealed = []
+
+    def _pending_where(self, position: int, value: int) -> Dict[SwipeKey, bool]:
+        # _pending después de _inflight: el valor más reciente gana
+        return {
+            key: swipe.liked
+            for swipes in (self._inflight, self._pending)
+            for key, swipe in swipes.items()
+            if key[position] == value
+        }
+
+    def pending_for_user(self, user_id: int) -> Dict[SwipeKey, bool]:
+        """Swipes del usuario aún sin escribir: {(usuario, viaje, lugar): like}."""
+        return self._pending_where(0, user_id)
+
+    def pending_for_trip(self, trip_id: int) -> Dict[SwipeKey, bool]:
+        """Swipes de los miembros del viaje aún sin escribir: {(usuario, viaje, lugar): like}."""
+        return self._pending_where(1, trip_id)
+
+    def pending_places(self, trip_id: int, user_id: int) -> Set[int]:
+        """Lugares con swipe del usuario en el viaje aún sin escribir."""
+        return {
+            place_id
+            for swipes in (self._inflight, self._pending)
+            for (swipe_user, swipe_trip, place_id) in swipes
+            if swipe_user == user_id and swipe_trip == trip_id
+        }
+
+    async def submit(self, swipes: Sequence[schemas.SwipeCreate]):
+        """Acepta swipes ya validados: vuelve cuando están en el WAL (y en disco si fsync)."""
+        if not swipes:
+            return
+        while self.depth and self.depth + len(swipes) > self.max_queued:
+            self._space.clear()
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._space.wait(), FULL_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                metrics.inc("tinvel_swipe_queue_rejected_total", "Swipes rejected with a full write-behind queue", len(swipes))
+                raise BufferFull()
+
+        data = "".join(
+            json.dumps([s.user_id, s.trip_id, s.place_id, s.liked]) + "\n" for s in swipes
+        ).encode()
+        os.write(self._active[1], data)
+        self._written += 1
+        metrics.inc("tinvel_swipe_queued_total", "Swipes accepted into the write-behind queue", len(swipes))
+        for swipe in swipes:
+            key = (swipe.user_id, swipe.trip_id, swipe.place_id)
+            self._pending.pop(key, None)
+            self._pending[key] = swipe
+            deck_buffer.discard((swipe.trip_id, swipe.user_id), swipe.place_id)
+        if len(self._pending) >= self.max_rows:
+            self._wakeup.set()
+        if self.fsync:
+            await self._sync()
+
+    async def _sync(self):
+        # fsync en grupo: quien espera el lock mientras otro sincroniza suele encontrar su escritura ya en disco
+        target = self._written
+        async with self._sync_lock:
+            if self._synced >= target:
+                return
+            written = self._written
+            await run_in_threadpool(os.fsync, self._active[1])
+            self._synced = written
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Error escribiendo swipes pendientes")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending and not self._sealed:
+                return
+            try:
+                await self._seal()
+                batch = list(self._inflight.items())
+                for start in range(0, len(batch), self.max_rows):
+                    chunk = batch[start:start + self.max_rows]
+                    started = time.perf_counter()
+                    async with AsyncSessionLocal() as db:
+                        items = await upsert_swipes(db, [swipe for _, swipe in chunk])
+                    metrics.observe(
+                        "tinvel_swipe_flush_duration_seconds",
+                        "Time per write-behind group commit",
+                        time.perf_counter() - started,
+                    )
+                    metrics.inc("tinvel_swipe_flushed_total", "Swipes written by the write-behind flusher", len(chunk))
+                    dropped = [item for item in items if item.status == "error"]
+                    if dropped:
+                        # Validados al aceptarlos: la referencia desapareció mientras esperaban
+                        metrics.inc("tinvel_swipe_dropped_total", "Queued swipes dropped at flush", len(dropped))
+                        logger.warning("Descartados %d swipes pendientes: %s", len(dropped), dropped[0].detail)
+                    for key, _ in chunk:
+                        del self._inflight[key]
+            except BaseException:
+                # Lo que no llegó a la base vuelve a la cola, delante de lo que entró después
+                self._pending = {
+                    **{key: swipe for key, swipe in self._inflight.items() if key not in self._pending},
+                    **self._pending,
+                }
+                raise
+            finally:
+                self._inflight = {}
+                self._space.set()
+            for path, fd in self._sealed:
+                os.close(fd)
+                os.unlink(path)
+            self._sealed = []
+
+    async def _seal(self):
+        """Sella el segmento activo y pasa lo pendiente a `_inflight`, sin ceder el bucle entre medias."""
+        async with self._sync_lock:
+            path, fd = self._active
+            written = self._written
+            self._inflight, self._pending = self._pending, {}
+            if not os.fstat(fd).st_size:
+                return
+            self._sealed.append(self._active)
+            self._active = self._open_segment()
+            # Lo escrito a partir de aquí va al segmento nuevo y lo sincroniza _sync
+            if self.fsync and self._synced < written:
+                await run_in_threadpool(os.fsync, fd)
+                self._synced = written
+
+    def _open_segment(self) -> Segment:
+        # Se crea con otro nombre y se bloquea antes de renombrarlo: nunca se ve un segmento sin dueño
+        self._sequence += 1
+        name = f"{os.getpid()}-{time.time_ns()}-{self._sequence}"
+        tmp = os.path.join(self.directory, name + ".tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        _lock(fd)
+        path = os.path.join(self.directory, name + ".wal")
+        os.rename(tmp, path)
+        return path, fd
+
+    def _recover(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                # Segmento creado por un proceso que cayó antes de renombrarlo: aún vacío
+                path = os.path.join(self.directory, name)
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    if _lock(fd):
+                        os.unlink(path)
+                finally:
+                    os.close(fd)
+        paths = sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".wal")),
+            key=lambda path: (os.path.getmtime(path), path),
+        )
+        for path in paths:
+            fd = os.open(path, os.O_RDWR)
+            if not _lock(fd):
+                os.close(fd)
+                continue
+            recovered = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        user_id, trip_id, place_id, liked = json.loads(line)
+                    except ValueError:
+                        # Última línea a medio escribir cuando cayó el proceso
+                        continue
+                    key = (user_id, trip_id, place_id)
+                    self._pending.pop(key, None)
+                    self._pending[key] = schemas.SwipeCreate(
+                        user_id=user_id, trip_id=trip_id, place_id=place_id, liked=liked
+                    )
+                    recovered += 1
+            self._sealed.append((path, fd))
+            logger.info("Recuperados %d swipes de %s", recovered, path)
+
+
+swipe_buffer = SwipeBuffer(
+    settings.SWIPE_WAL_DIR,
+    settings.SWIPE_FLUSH_INTERVAL_MS / 1000.0,
+    settings.SWIPE_FLUSH_MAX_ROWS,
+    settings.SWIPE_QUEUE_MAX_ROWS,
+    settings.SWIPE_WAL_FSYNC,
+)
+
+metrics.gauge("tinvel_swipe_queue_depth", "Swipes accepted but not yet written", lambda: swipe_buffer.depth)
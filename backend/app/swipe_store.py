@@ -0,0 +1,167 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import and_, func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .database import dialect_insert
+from .deck import deck_buffer
+from .realtime import realtime
+from .recommender import recommender
+from .trip_summary import apply_swipes
+
+SwipeKey = Tuple[int, int, int]
+
+
+def _key(swipe: schemas.SwipeCreate) -> SwipeKey:
+    return (swipe.user_id, swipe.trip_id, swipe.place_id)
+
+
+async def _existing_ids(db: AsyncSession, model, ids) -> set:
+    if not ids:
+        return set()
+    result = await db.execute(select(model.id).where(model.id.in_(ids)))
+    return set(result.scalars().all())
+
+
+async def _new_matches(db: AsyncSession, rows) -> List[Tuple[int, int]]:
+    """(viaje, lugar) que pasan a tener like de todos los participantes.
+
+    Sólo cuenta en viajes compartidos (2+ miembros). Cada match se guarda en
+    trip_places y sólo se devuelve la primera vez.
+    """
+    liked = {(r.trip_id, r.place_id) for r in rows if r.liked}
+    if not liked:
+        return []
+    result = await db.execute(
+        select(models.TripMember.trip_id, func.count())
+        .where(models.TripMember.trip_id.in_({trip_id for trip_id, _ in liked}))
+        .group_by(models.TripMember.trip_id)
+    )
+    members = {trip_id: count for trip_id, count in result.all() if count >= 2}
+    candidates = [key for key in liked if key[0] in members]
+    if not candidates:
+        return []
+
+    result = await db.execute(
+        select(models.Swipe.trip_id, models.Swipe.place_id, func.count())
+        .join(models.TripMember, and_(
+            models.TripMember.trip_id == models.Swipe.trip_id,
+            models.TripMember.user_id == models.Swipe.user_id,
+        ))
+        .where(models.Swipe.liked.is_(True), tuple_(models.Swipe.trip_id, models.Swipe.place_id).in_(candidates))
+        .group_by(models.Swipe.trip_id, models.Swipe.place_id)
+    )
+    matched = [(trip_id, place_id) for trip_id, place_id, count in result.all() if count >= members[trip_id]]
+    if not matched:
+        return []
+
+    result = await db.execute(
+        dialect_insert(db, models.TripPlace)
+        .values([{"trip_id": trip_id, "place_id": place_id} for trip_id, place_id in matched])
+        .on_conflict_do_nothing(index_elements=[models.TripPlace.trip_id, models.TripPlace.place_id])
+        .returning(models.TripPlace.trip_id, models.TripPlace.place_id)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def reference_errors(db: AsyncSession, swipes: Sequence[schemas.SwipeCreate]) -> Dict[int, schemas.SwipeBatchItem]:
+    """Elementos del lote cuyo usuario, viaje o lugar no existe, por índice."""
+    users = await _existing_ids(db, models.User, {s.user_id for s in swipes})
+    trips = await _existing_ids(db, models.Trip, {s.trip_id for s in swipes})
+    places = await _existing_ids(db, models.Place, {s.place_id for s in swipes})
+
+    errors: Dict[int, schemas.SwipeBatchItem] = {}
+    for index, swipe in enumerate(swipes):
+        if swipe.user_id not in users:
+            errors[index] = schemas.SwipeBatchItem(index=index, status="error", detail="User not found")
+        elif swipe.trip_id not in trips:
+            errors[index] = schemas.SwipeBatchItem(index=index, status="error", detail="Trip not found")
+        elif swipe.place_id not in places:
+            errors[index] = schemas.SwipeBatchItem(index=index, status="error", detail="Place not found")
+    return errors
+
+
+async def upsert_swipes(db: AsyncSession, swipes: Sequence[schemas.SwipeCreate]) -> List[schemas.SwipeBatchItem]:
+    """Escribe un lote de swipes con un único INSERT ... ON CONFLICT DO UPDATE.
+
+    Si el lote repite una misma clave (usuario, viaje, lugar) gana el último.
+    Los elementos con referencias inexistentes se rechazan sin abortar el lote.
+    """
+    results = await reference_errors(db, swipes)
+    latest: Dict[SwipeKey, int] = {}
+    for index, swipe in enumerate(swipes):
+        if index not in results:
+            latest[_key(swipe)] = index
+
+    if latest:
+        keys = list(latest)
+        key_columns = tuple_(models.Swipe.user_id, models.Swipe.trip_id, models.Swipe.place_id)
+        columns = (models.Swipe.id, models.Swipe.user_id, models.Swipe.trip_id, models.Swipe.place_id, models.Swipe.liked)
+        # Sólo se actualiza (y se devuelve) la fila cuyo like cambia: una fila
+        # devuelta que no es nueva tenía el valor contrario. Así el estado
+        # anterior sale de la propia escritura, con la fila ya bloqueada, y no
+        # de una lectura previa que otra transacción puede dejar vieja.
+        stamp = datetime.utcnow()
+        if db.bind.dialect.name == "postgresql":
+            inserted = literal_column("xmax = 0")
+        else:
+            # SQLite no tiene xmax: una fila nueva lleva el created_at de este lote
+            inserted = models.Swipe.created_at == stamp
+        stmt = dialect_insert(db, models.Swipe).values(
+            [{**swipes[i].dict(), "created_at": stamp} for i in latest.values()]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.Swipe.user_id, models.Swipe.trip_id, models.Swipe.place_id],
+            set_={"liked": stmt.excluded.liked},
+            where=models.Swipe.liked != stmt.excluded.liked,
+        ).returning(*columns, inserted.label("inserted"))
+        result = await db.execute(stmt)
+        written = {}
+        # Like anterior de las claves que ya existían
+        existing: Dict[SwipeKey, bool] = {}
+        for row in result.all():
+            key = (row.user_id, row.trip_id, row.place_id)
+            written[key] = row
+            if not row.inserted:
+                existing[key] = not row.liked
+        unchanged = [key for key in keys if key not in written]
+        if unchanged:
+            # Mismo like que ya había: ON CONFLICT dejó la fila bloqueada sin tocarla
+            result = await db.execute(select(*columns).where(key_columns.in_(unchanged)))
+            for row in result.all():
+                key = (row.user_id, row.trip_id, row.place_id)
+                written[key] = row
+                existing[key] = row.liked
+        await apply_swipes(db, [(r.trip_id, r.place_id, r.liked, existing.get(key)) for key, r in written.items()])
+        matches = await _new_matches(db, written.values())
+        await db.commit()
+
+        events = defaultdict(list)
+        for row in written.values():
+            events[row.trip_id].append(
+                {"type": "swipe", "user_id": row.user_id, "place_id": row.place_id, "liked": row.liked}
+            )
+        for trip_id, place_id in matches:
+            events[trip_id].append({"type": "match", "place_id": place_id})
+        for trip_id, trip_events in events.items():
+            await realtime.publish(trip_id, *trip_events)
+
+        for key, index in latest.items():
+            row = written[key]
+            results[index] = schemas.SwipeBatchItem(
+                index=index,
+                status="updated" if key in existing else "created",
+                swipe=schemas.SwipeOut.model_validate(row, from_attributes=True),
+            )
+            deck_buffer.discard((row.trip_id, row.user_id), row.place_id)
+            recommender.record(row.trip_id, row.user_id, row.place_id, row.liked, existing.get(key))
+
+    for index, swipe in enumerate(swipes):
+        if index not in results:
+            final = results[latest[_key(swipe)]]
+            results[index] = schemas.SwipeBatchItem(index=index, status="superseded", swipe=final.swipe)
+
+    return [results[i] for i in range(len(swipes))]
@@ -0,0 +1,93 @@
+import math
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from .cache import catalog_cache
+from .config import settings
+from .spatial import Entry
+
+# Límite de latitud de Web Mercator: el mundo es un cuadrado
+MAX_LATITUDE = 85.05112878
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) de la tesela."""
+    n = 2 ** z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def _project(lats: np.ndarray, lons: np.ndarray, z: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Coordenadas de tesela fraccionarias (x, y) a zoom z."""
+    n = 2 ** z
+    phi = np.radians(np.clip(lats, -MAX_LATITUDE, MAX_LATITUDE))
+    tx = (lons + 180.0) / 360.0 * n
+    ty = (1.0 - np.log(np.tan(phi) + 1.0 / np.cos(phi)) / math.pi) / 2.0 * n
+    return tx, ty
+
+
+def tiles_for_point(lat: float, lon: float, max_zoom: int) -> Iterable[Tuple[int, int, int]]:
+    """La tesela que contiene el punto en cada zoom de 0 a max_zoom."""
+    for z in range(max_zoom + 1):
+        tx, ty = _project(np.array([lat]), np.array([lon]), z)
+        n = 2 ** z
+        yield z, min(int(tx[0]), n - 1), min(int(ty[0]), n - 1)
+
+
+def tile_namespace(z: int, x: int, y: int) -> str:
+    return f"tile:{z}:{x}:{y}"
+
+
+async def invalidate_point(lat: float, lon: float):
+    """Invalida sólo las teselas que contienen el punto, una por zoom."""
+    for z, x, y in tiles_for_point(lat, lon, settings.TILE_MAX_ZOOM):
+        await catalog_cache.invalidate(tile_namespace(z, x, y))
+
+
+def render_tile(entries: List[Entry], z: int, x: int, y: int) -> dict:
+    """Contenido compacto de una tesela.
+
+    Por debajo de TILE_CLUSTER_MAX_ZOOM los lugares se agrupan en una rejilla
+    de TILE_GRID_SIZE x TILE_GRID_SIZE celdas: una celda con varios lugares
+    sale como un cluster [lat, lon, n] en su centroide; por encima salen todos
+    como [id, lat, lon].
+    """
+    tile = {"z": z, "x": x, "y": y, "points": [], "clusters": []}
+    if not entries:
+        return tile
+    ids = np.fromiter((e[1] for e in entries), dtype=np.int64, count=len(entries))
+    lats = np.fromiter((e[2] for e in entries), dtype=np.float64, count=len(entries))
+    lons = np.fromiter((e[3] for e in entries), dtype=np.float64, count=len(entries))
+    tx, ty = _project(lats, lons, z)
+    # La caja del índice incluye los bordes; cada punto va sólo a la tesela que lo contiene
+    n = 2 ** z
+    inside = (np.minimum(np.floor(tx), n - 1) == x) & (np.minimum(np.floor(ty), n - 1) == y)
+    ids, lats, lons, tx, ty = ids[inside], lats[inside], lons[inside], tx[inside], ty[inside]
+    order = np.argsort(ids, kind="stable")
+    ids, lats, lons, tx, ty = ids[order], lats[order], lons[order], tx[order], ty[order]
+
+    if z > settings.TILE_CLUSTER_MAX_ZOOM:
+        tile["points"] = [[int(i), round(float(a), 6), round(float(o), 6)] for i, a, o in zip(ids, lats, lons)]
+        return tile
+
+    grid = settings.TILE_GRID_SIZE
+    col = np.minimum(((tx - x) * grid).astype(np.int64), grid - 1)
+    row = np.minimum(((ty - y) * grid).astype(np.int64), grid - 1)
+    cells, inverse, counts = np.unique(row * grid + col, return_inverse=True, return_counts=True)
+    lat_sum = np.bincount(inverse, weights=lats, minlength=len(cells))
+    lon_sum = np.bincount(inverse, weights=lons, minlength=len(cells))
+    single = counts[inverse] == 1
+    tile["points"] = [
+        [int(i), round(float(a), 6), round(float(o), 6)]
+        for i, a, o in zip(ids[single], lats[single], lons[single])
+    ]
+    tile["clusters"] = [
+        [round(float(a / c), 6), round(float(o / c), 6), int(c)]
+        for a, o, c in zip(lat_sum, lon_sum, counts)
+        if c > 1
+    ]
+    return tile
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .config import settings
+from .geo import haversine_cross
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Filas calculadas por bloque al construir: acota la memoria temporal a BLOCK x N float64
+BLOCK_ROWS = 512
+MIN_CAPACITY = 64
+# Relecturas del .json cuando su capacidad ya no está en disco
+REFRESH_ATTEMPTS = 3
+
+
+def _slug(city: str) -> str:
+    base = re.sub(r"[^a-z0-9]+", "-", city.lower()).strip("-")[:40] or "city"
+    return f"{base}-{hashlib.blake2b(city.encode(), digest_size=4).hexdigest()}"
+
+
+class CityMatrix:
+    """Matriz de distancias (km, float32) de una ciudad en un fichero mapeado.
+
+    Ficheros en `directory`:
+      <slug>.json             ciudad, tamaño, capacidad y generación
+      <slug>.<cap>.f32        matriz cap x cap; sólo el bloque size x size es válido
+      <slug>.<cap>.coords     (lat, lon) float64 por índice, para las altas incrementales
+      <slug>.<cap>.ids        id del lugar (int64) por índice
+
+    Todos los workers mapean el mismo fichero en sólo lectura, así que el
+    sistema operativo comparte las páginas. El .json se escribe el último y de
+    forma atómica: un lector nunca ve un tamaño con filas sin escribir. Al
+    crecer se conservan los ficheros de la capacidad anterior hasta el
+    siguiente crecimiento, para los lectores que aún no han recargado.
+    """
+
+    def __init__(self, directory: str, city: str):
+        self.directory = directory
+        self.city = city
+        self.slug = _slug(city)
+        self.meta_path = os.path.join(directory, f"{self.slug}.json")
+        self._meta_version: Optional[tuple] = None
+        self._generation: Optional[int] = None
+        self._size = 0
+        self._index: Dict[int, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._thread_lock = threading.Lock()
+
+    def _paths(self, capacity: int):
+        stem = os.path.join(self.directory, f"{self.slug}.{capacity}")
+        return stem + ".f32", stem + ".coords", stem + ".ids"
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta: dict):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path)
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # Sin fcntl (Windows) sólo se serializan los hilos de este proceso
+        with self._thread_lock, open(os.path.join(self.directory, f"{self.slug}.lock"), "w") as lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def refresh(self) -> bool:
+        """Vuelve a mapear si otro proceso cambió el fichero; False si no existe."""
+        for _ in range(REFRESH_ATTEMPTS):
+            try:
+                stat = os.stat(self.meta_path)
+            except FileNotFoundError:
+                return False
+            # El .json se reemplaza con rename, así que el inodo cambia en cada escritura
+            version = (stat.st_ino, stat.st_mtime_ns)
+            if version == self._meta_version:
+                return True
+            meta = self._read_meta()
+            if meta is None:
+                return False
+            try:
+                self._load(meta, version)
+                return True
+            except FileNotFoundError:
+                # Un writer reconstruyó la matriz entre leer el .json y mapearla: se relee
+                continue
+        return False
+
+    def _load(self, meta: dict, version: tuple):
+        capacity, size, generation = meta["capacity"], meta["size"], meta.get("generation", 0)
+        matrix_path, _, ids_path = self._paths(capacity)
+        matrix = np.memmap(matrix_path, dtype=np.float32, mode="r", shape=(capacity, capacity))
+        ids = np.memmap(ids_path, dtype=np.int64, mode="r", shape=(capacity,))
+        # Las altas sólo añaden al final (también al crecer), así que basta leer los ids nuevos
+        start = self._size if generation == self._generation and size >= self._size else 0
+        index = self._index if start else {}
+        index.update((int(p), i) for i, p in enumerate(ids[start:size], start))
+        self._matrix, self._index, self._size = matrix, index, size
+        self._generation, self._meta_version = generation, version
+
+    def __len__(self) -> int:
+        return self._size
+
+    def submatrix(self, place_ids: Sequence[int]) -> Optional[np.ndarray]:
+        """Distancias k x k entre `place_ids`, o None si falta alguno.
+
+        El índice avanzado copia sólo los k x k valores pedidos y toca k filas
+        del mapeo; la matriz completa nunca se carga en memoria.
+        """
+        if not self.refresh():
+            return None
+        try:
+            idx = np.fromiter((self._index[p] for p in place_ids), dtype=np.int64, count=len(place_ids))
+        except KeyError:
+            return None
+        return np.asarray(self._matrix[np.ix_(idx, idx)], dtype=np.float64)
+
+    def build(self, place_ids: Sequence[int], lats: Sequence[float], lons: Sequence[float]):
+        """Construcción completa (offline); sustituye a la matriz anterior."""
+        n = len(place_ids)
+        capacity = max(MIN_CAPACITY, int(n * 1.25))
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        with self._write_lock():
+            old = self._read_meta()
+            paths = self._paths(capacity)
+            # Se escribe aparte y se renombra: truncar un fichero que otros
+            # procesos tienen mapeado les daría SIGBUS.
+            matrix = np.memmap(paths[0] + ".tmp", dtype=np.float32, mode="w+", shape=(capacity, capacity))
+            for start in range(0, n, BLOCK_ROWS):
+                end = min(start + BLOCK_ROWS, n)
+                matrix[start:end, :n] = haversine_cross(lats[start:end], lons[start:end], lats, lons)
+            matrix.flush()
+            coords = np.memmap(paths[1] + ".tmp", dtype=np.float64, mode="w+", shape=(capacity, 2))
+            coords[:n, 0] = lats
+            coords[:n, 1] = lons
+            coords.flush()
+            ids = np.memmap(paths[2] + ".tmp", dtype=np.int64, mode="w+", shape=(capacity,))
+            ids[:n] = place_ids
+            ids.flush()
+            for path in paths:
+                os.replace(path + ".tmp", path)
+            generation = (old or {}).get("generation", 0) + 1
+            self._write_meta({"city": self.city, "size": n, "capacity": capacity, "generation": generation})
+            self._remove_stale({capacity, old["capacity"] if old else capacity})
+
+    def add(self, place_id: int, lat: float, lon: float):
+        """Alta incremental: calcula sólo la fila y la columna del lugar nuevo.
+
+        El índice propio sirve para comprobar duplicados y el .json sólo lleva
+        los contadores, así que un alta no reescribe nada proporcional a N.
+        """
+        with self._write_lock():
+            meta = self._read_meta() or {"city": self.city, "size": 0, "capacity": 0, "generation": 0}
+            if meta["capacity"]:
+                self.refresh()
+            if place_id in self._index:
+                return
+            size, capacity = meta["size"], meta["capacity"]
+            if size == capacity:
+                self._grow(meta, max(MIN_CAPACITY, capacity * 2))
+                capacity = meta["capacity"]
+            matrix_path, coords_path, ids_path = self._paths(capacity)
+            matrix = np.memmap(matrix_path, dtype=np.float32, mode="r+", shape=(capacity, capacity))
+            coords = np.memmap(coords_path, dtype=np.float64, mode="r+", shape=(capacity, 2))
+            ids = np.memmap(ids_path, dtype=np.int64, mode="r+", shape=(capacity,))
+            coords[size] = (lat, lon)
+            row = haversine_cross([lat], [lon], coords[:size + 1, 0], coords[:size + 1, 1])[0]
+            matrix[size, :size + 1] = row
+            matrix[:size + 1, size] = row
+            ids[size] = place_id
+            matrix.flush()
+            coords.flush()
+            ids.flush()
+            meta["size"] = size + 1
+            self._write_meta(meta)
+            self.refresh()
+
+    def _grow(self, meta: dict, capacity: int):
+        size, old_capacity = meta["size"], meta["capacity"]
+        paths = self._paths(capacity)
+        matrix = np.memmap(paths[0], dtype=np.float32, mode="w+", shape=(capacity, capacity))
+        coords = np.memmap(paths[1], dtype=np.float64, mode="w+", shape=(capacity, 2))
+        ids = np.memmap(paths[2], dtype=np.int64, mode="w+", shape=(capacity,))
+        if old_capacity:
+            old_paths = self._paths(old_capacity)
+            old_matrix = np.memmap(old_paths[0], dtype=np.float32, mode="r", shape=(old_capacity, old_capacity))
+            old_coords = np.memmap(old_paths[1], dtype=np.float64, mode="r", shape=(old_capacity, 2))
+            old_ids = np.memmap(old_paths[2], dtype=np.int64, mode="r", shape=(old_capacity,))
+            for start in range(0, size, BLOCK_ROWS):
+                end = min(start + BLOCK_ROWS, size)
+                matrix[start:end, :size] = old_matrix[start:end, :size]
+            coords[:size] = old_coords[:size]
+            ids[:size] = old_ids[:size]
+        matrix.flush()
+        coords.flush()
+        ids.flush()
+        meta["capacity"] = capacity
+        self._write_meta(meta)
+        self._remove_stale({capacity, old_capacity})
+
+    def _remove_stale(self, keep: set):
+        # Se conserva la capacidad anterior para los lectores que leyeron el .json
+        # antes del cambio; las demás ya no las mapea nadie al día.
+        pattern = re.compile(re.escape(self.slug) + r"\.(\d+)\.(f32|coords|ids)$")
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match and int(match.group(1)) not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+class TravelMatrixStore:
+    def __init__(self, directory: str, enabled: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        self._cities: Dict[str, CityMatrix] = {}
+
+    def city(self, city: str) -> CityMatrix:
+        matrix = self._cities.get(city)
+        if matrix is None:
+            matrix = self._cities[city] = CityMatrix(self.directory, city)
+        return matrix
+
+    def distances(self, city: Optional[str], place_ids: Sequence[int]) -> Optional[np.ndarray]:
+        if not self.enabled or not city:
+            return None
+        return self.city(city).submatrix(place_ids)
+
+    def add_place(self, city: str, place_id: int, lat: float, lon: float):
+        if self.enabled:
+            self.city(city).add(place_id, lat, lon)
+
+
+travel_matrices = TravelMatrixStore(settings.TRAVEL_MATRIX_DIR, settings.TRAVEL_MATRIX_ENABLED)
+
+
+def build_all(cities: Optional[List[str]] = None):
+    """Reconstruye las matrices desde la base de datos (lugares activos)."""
+    from sqlalchemy import select
+
+    from . import models
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        if not cities:
+            cities = db.execute(
+                select(models.Place.city).where(models.Place.is_active.is_(True)).distinct()
+            ).scalars().all()
+        for city in cities:
+            rows = db.execute(
+                select(models.Place.id, models.Place.latitude, models.Place.longitude)
+                .where(models.Place.city == city, models.Place.is_active.is_(True))
+                .order_by(models.Place.id)
+            ).all()
+            ids, lats, lons = zip(*rows) if rows else ((), (), ())
+            travel_matrices.city(city).build(ids, lats, lons)
+            print(f"{city}: {len(ids)} lugares")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Construye las matrices de distancias por ciudad")
+    parser.add_argument("cities", nargs="*", help="Ciudades a reconstruir (por defecto, todas)")
+    build_all(parser.parse_args().cities)
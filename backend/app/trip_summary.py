@@ -0,0 +1,231 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .database import dialect_insert
+
+# (viaje, lugar, like actual, like anterior o None si el swipe es nuevo)
+SwipeChange = Tuple[int, int, bool, Optional[bool]]
+
+_GEOMETRY = ("centroid_lat", "centroid_lon", "min_lat", "min_lon", "max_lat", "max_lon")
+
+
+def _geometry(coords: Sequence[Tuple[float, float]]) -> dict:
+    if not coords:
+        return dict.fromkeys(_GEOMETRY)
+    lats = [lat for lat, _ in coords]
+    lons = [lon for _, lon in coords]
+    return {
+        "centroid_lat": sum(lats) / len(lats),
+        "centroid_lon": sum(lons) / len(lons),
+        "min_lat": min(lats),
+        "min_lon": min(lons),
+        "max_lat": max(lats),
+        "max_lon": max(lons),
+    }
+
+
+async def _coords(db: AsyncSession, place_ids: Iterable[int]) -> Dict[int, Tuple[float, float]]:
+    place_ids = list(place_ids)
+    if not place_ids:
+        return {}
+    result = await db.execute(
+        select(models.Place.id, models.Place.latitude, models.Place.longitude).where(models.Place.id.in_(place_ids))
+    )
+    return {place_id: (lat, lon) for place_id, lat, lon in result.all()}
+
+
+async def _build(db: AsyncSession, trip_ids: Sequence[int]) -> List[dict]:
+    """Resumen completo desde swipes y rutas; sólo para filas que aún no existen."""
+    result = await db.execute(
+        select(models.Trip.id, models.Trip.destination_city, models.Trip.destination_country)
+        .where(models.Trip.id.in_(trip_ids))
+    )
+    rows = {
+        trip_id: {"trip_id": trip_id, "city": city, "country": country, "swipe_count": 0, "like_count": 0, "place_likes": {}}
+        for trip_id, city, country in result.all()
+    }
+    if not rows:
+        return []
+
+    result = await db.execute(
+        select(
+            models.Swipe.trip_id,
+            func.count(),
+            func.coalesce(func.sum(case((models.Swipe.liked.is_(True), 1), else_=0)), 0),
+        )
+        .where(models.Swipe.trip_id.in_(rows))
+        .group_by(models.Swipe.trip_id)
+    )
+    for trip_id, swipes, likes in result.all():
+        rows[trip_id].update(swipe_count=swipes, like_count=likes)
+
+    result = await db.execute(
+        select(models.Swipe.trip_id, models.Swipe.place_id, func.count())
+        .where(models.Swipe.trip_id.in_(rows), models.Swipe.liked.is_(True))
+        .group_by(models.Swipe.trip_id, models.Swipe.place_id)
+    )
+    for trip_id, place_id, likes in result.all():
+        rows[trip_id]["place_likes"][str(place_id)] = likes
+
+    coords = await _coords(db, {int(p) for row in rows.values() for p in row["place_likes"]})
+    for row in rows.values():
+        row.update(_geometry([coords[int(p)] for p in row["place_likes"] if int(p) in coords]))
+
+    latest = select(func.max(models.Route.id)).where(models.Route.trip_id.in_(rows)).group_by(models.Route.trip_id)
+    result = await db.execute(
+        select(models.Route.trip_id, models.Route.id, models.Route.total_time, models.Route.total_distance)
+        .where(models.Route.id.in_(latest))
+    )
+    for trip_id, route_id, total_time, total_distance in result.all():
+        rows[trip_id].update(
+            latest_route_id=route_id,
+            latest_route_total_time=total_time,
+            latest_route_total_distance=total_distance,
+        )
+    return list(rows.values())
+
+
+async def _insert_missing(db: AsyncSession, trip_ids: Sequence[int]) -> set:
+    """Crea las filas que faltan (viajes anteriores al resumen); devuelve los viajes insertados.
+
+    Si otra transacción crea la misma fila a la vez, ON CONFLICT espera a que
+    confirme y no inserta: ese viaje se actualiza después por incrementos.
+    """
+    result = await db.execute(
+        select(models.TripSummary.trip_id).where(models.TripSummary.trip_id.in_(trip_ids))
+    )
+    missing = set(trip_ids) - set(result.scalars().all())
+    if not missing:
+        return set()
+    rows = await _build(db, sorted(missing))
+    if not rows:
+        return set()
+    result = await db.execute(
+        dialect_insert(db, models.TripSummary)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[models.TripSummary.trip_id])
+        .returning(models.TripSummary.trip_id)
+    )
+    return set(result.scalars().all())
+
+
+async def _locked(db: AsyncSession, trip_ids: Sequence[int]) -> List[models.TripSummary]:
+    # Orden fijo de bloqueo para que dos lotes con los mismos viajes no se bloqueen mutuamente
+    result = await db.execute(
+        select(models.TripSummary)
+        .where(models.TripSummary.trip_id.in_(trip_ids))
+        .order_by(models.TripSummary.trip_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().all()
+
+
+def create_for_trip(trip: models.Trip) -> models.TripSummary:
+    return models.TripSummary(
+        trip_id=trip.id, city=trip.destination_city, country=trip.destination_country, place_likes={}
+    )
+
+
+async def apply_swipes(db: AsyncSession, changes: Sequence[SwipeChange]):
+    """Aplica un lote de swipes ya escritos al resumen, en la misma transacción."""
+    by_trip: Dict[int, List[SwipeChange]] = defaultdict(list)
+    for change in changes:
+        by_trip[change[0]].append(change)
+    if not by_trip:
+        return
+    # Las filas recién creadas ya incluyen este lote
+    built = await _insert_missing(db, list(by_trip))
+    summaries = await _locked(db, [t for t in by_trip if t not in built])
+
+    updates = []
+    for summary in summaries:
+        place_likes = dict(summary.place_likes or {})
+        before = set(place_likes)
+        for _, place_id, liked, previous in by_trip[summary.trip_id]:
+            if previous is None:
+                summary.swipe_count += 1
+            delta = int(liked) - int(bool(previous))
+            if not delta:
+                continue
+            summary.like_count += delta
+            key = str(place_id)
+            likes = place_likes.get(key, 0) + delta
+            if likes > 0:
+                place_likes[key] = likes
+            else:
+                place_likes.pop(key, None)
+        # Se asigna un dict nuevo: las mutaciones en sitio de una columna JSON no se detectan
+        summary.place_likes = place_likes
+        updates.append((summary, {int(p) for p in set(place_likes) - before}, before - set(place_likes)))
+
+    # Altas: la geometría se amplía; bajas: se recalcula con los lugares que quedan
+    coords = await _coords(db, {p for _, added, _ in updates for p in added})
+    for summary, added, removed in updates:
+        if removed:
+            remaining = await _coords(db, (int(p) for p in summary.place_likes))
+            for name, value in _geometry(list(remaining.values())).items():
+                setattr(summary, name, value)
+        elif added:
+            points = [coords[p] for p in added if p in coords]
+            if not points:
+                continue
+            previous = len(summary.place_likes) - len(points)
+            merged = _geometry(points)
+            if previous and summary.centroid_lat is not None:
+                total = previous + len(points)
+                merged["centroid_lat"] = (summary.centroid_lat * previous + merged["centroid_lat"] * len(points)) / total
+                merged["centroid_lon"] = (summary.centroid_lon * previous + merged["centroid_lon"] * len(points)) / total
+                merged["min_lat"] = min(merged["min_lat"], summary.min_lat)
+                merged["min_lon"] = min(merged["min_lon"], summary.min_lon)
+                merged["max_lat"] = max(merged["max_lat"], summary.max_lat)
+                merged["max_lon"] = max(merged["max_lon"], summary.max_lon)
+            for name, value in merged.items():
+                setattr(summary, name, value)
+
+
+async def apply_route(db: AsyncSession, route: models.Route):
+    """La ruta recién insertada pasa a ser la última del viaje."""
+    if route.trip_id in await _insert_missing(db, [route.trip_id]):
+        return
+    for summary in await _locked(db, [route.trip_id]):
+        summary.latest_route_id = route.id
+        summary.latest_route_total_time = route.total_time
+        summary.latest_route_total_distance = route.total_distance
+
+
+async def get_summary(db: AsyncSession, trip_id: int) -> Optional[models.TripSummary]:
+    summary = await db.get(models.TripSummary, trip_id)
+    if summary is None and await _insert_missing(db, [trip_id]):
+        await db.commit()
+        summary = await db.get(models.TripSummary, trip_id)
+    return summary
+
+
+def summary_out(summary: models.TripSummary) -> schemas.TripSummaryOut:
+    bbox = None
+    if summary.min_lat is not None:
+        bbox = [summary.min_lat, summary.min_lon, summary.max_lat, summary.max_lon]
+    latest_route = None
+    if summary.latest_route_id is not None:
+        latest_route = schemas.TripSummaryRoute(
+            route_id=summary.latest_route_id,
+            total_time=summary.latest_route_total_time,
+            total_distance=summary.latest_route_total_distance,
+        )
+    return schemas.TripSummaryOut(
+        trip_id=summary.trip_id,
+        city=summary.city,
+        country=summary.country,
+        swipe_count=summary.swipe_count,
+        like_count=summary.like_count,
+        liked_place_ids=sorted(int(p) for p in summary.place_likes),
+        centroid_lat=summary.centroid_lat,
+        centroid_lon=summary.centroid_lon,
+        bbox=bbox,
+        latest_route=latest_route,
+    )
@@ -0,0 +1,30 @@
+"""Compara dos resultados de benchmarks.run: python -m benchmarks.compare base.json nuevo.json"""
+import json
+import sys
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def main(argv=None):
+    argv = argv if argv is not None else sys.argv[1:]
+    if len(argv) != 2:
+        sys.exit("uso: python -m benchmarks.compare base.json nuevo.json")
+    with open(argv[0]) as f:
+        base = json.load(f)
+    with open(argv[1]) as f:
+        new = json.load(f)
+
+    print(f"{base['revision']} -> {new['revision']}")
+    for name, after in new["results"].items():
+        before = base["results"].get(name)
+        if before is None:
+            continue
+        cells = []
+        for metric in METRICS:
+            delta = (after[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            cells.append(f"{metric} {before[metric]:.2f} -> {after[metric]:.2f} ({delta:+.1f}%)")
+        print(f"{name:>16}: " + "  ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Siembra portable (SQLite o Postgres) para los benchmarks.
+
+A diferencia de seed_database.py no depende de COPY, así que sirve contra el
+sustituto SQLite; para escala de producción usar seed_database.py.
+"""
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from sqlalchemy import create_engine
+
+from app import models
+from app.database import Base
+from app.geo import geohash_encode
+from app.security import hash_password_sync
+
+CITIES = [
+    ("Paris", "Francia", 48.8566, 2.3522),
+    ("New York", "USA", 40.7128, -74.0060),
+    ("Tokyo", "Japón", 35.6762, 139.6503),
+    ("London", "Reino Unido", 51.5074, -0.1278),
+    ("Roma", "Italia", 41.9028, 12.4964),
+]
+PASSWORD = "password"
+BATCH = 5000
+
+
+@dataclass
+class SeedInfo:
+    emails: List[str] = field(default_factory=list)
+    # (trip_id, user_id, city)
+    trips: List[Tuple[int, int, str]] = field(default_factory=list)
+    places_by_city: Dict[str, List[int]] = field(default_factory=dict)
+
+
+def _insert(conn, table, rows):
+    for i in range(0, len(rows), BATCH):
+        conn.execute(table.insert(), rows[i:i + BATCH])
+
+
+def seed(database_url: str, users: int, places: int, trips: int, swipes_per_trip: int, seed: int = 42) -> SeedInfo:
+    rng = random.Random(seed)
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    info = SeedInfo()
+
+    # Un único hash para todos: el mismo coste de verificación que en producción sin pagar N hashes
+    password_hash = hash_password_sync(PASSWORD)
+    user_rows = [
+        {"id": i, "email": f"user{i}@example.com", "password_hash": password_hash}
+        for i in range(1, users + 1)
+    ]
+    info.emails = [r["email"] for r in user_rows]
+
+    place_rows = []
+    for i in range(1, places + 1):
+        city, country, lat, lon = CITIES[i % len(CITIES)]
+        lat, lon = lat + rng.gauss(0, 0.03), lon + rng.gauss(0, 0.03)
+        place_rows.append({
+            "id": i, "name": f"Lugar {i}", "description": f"Lugar de prueba en {city}",
+            "city": city, "country": country, "latitude": lat, "longitude": lon,
+            "geohash": geohash_encode(lat, lon), "is_active": True,
+        })
+        info.places_by_city.setdefault(city, []).append(i)
+
+    trip_rows, swipe_rows = [], []
+    for t in range(1, trips + 1):
+        user_id = rng.randint(1, users)
+        city, country, _, _ = CITIES[rng.randrange(len(CITIES))]
+        trip_rows.append({"id": t, "user_id": user_id, "destination_city": city, "destination_country": country})
+        info.trips.append((t, user_id, city))
+        candidates = info.places_by_city.get(city, [])
+        for place_id in rng.sample(candidates, min(swipes_per_trip, len(candidates))):
+            swipe_rows.append({
+                "user_id": user_id, "trip_id": t, "place_id": place_id, "liked": rng.random() < 0.4,
+            })
+
+    with engine.begin() as conn:
+        _insert(conn, models.User.__table__, user_rows)
+        _insert(conn, models.Place.__table__, place_rows)
+        _insert(conn, models.Trip.__table__, trip_rows)
+        _insert(conn, models.Swipe.__table__, swipe_rows)
+        if engine.dialect.name == "postgresql":
+            for table in ("users", "places", "trips", "swipes"):
+                conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)"
+                )
+    engine.dispose()
+    return info
@@ -0,0 +1,77 @@
+"""Compara la serialización de listas de lugares: ORM + pydantic + json frente a columnas + orjson.
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --sizes 100 1000 10000 50000 --repeat 20
+
+Mide consulta y serialización juntas (lo que paga una petición sin caché)
+sobre un SQLite temporal, y el tamaño y coste de comprimir el resultado.
+"""
+import argparse
+import gzip
+import json
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.queries import PLACE_OUT_COLUMNS
+from app.responses import brotli, compress, orjson, rows_json
+
+from .seed import seed
+
+
+def pydantic_path(db: Session, limit: int) -> bytes:
+    """El camino anterior: objetos ORM validados fila a fila con PlaceOut."""
+    places = db.execute(select(models.Place).order_by(models.Place.id).limit(limit)).scalars().all()
+    return json.dumps([schemas.PlaceOut.model_validate(p, from_attributes=True).dict() for p in places]).encode()
+
+
+def fast_path(db: Session, limit: int) -> bytes:
+    return rows_json(db.execute(select(*PLACE_OUT_COLUMNS).order_by(models.Place.id).limit(limit)))
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_url = f"sqlite:///{tmpdir}/serialization.db"
+        seed(database_url, users=1, places=max(args.sizes), trips=0, swipes_per_trip=0)
+        engine = create_engine(database_url)
+        print(f"orjson: {'sí' if orjson else 'no'}  brotli: {'sí' if brotli else 'no'}")
+        print(f"{'lugares':>8} {'pydantic ms':>12} {'orjson ms':>10} {'x':>6} {'bytes':>10} {'gzip':>9} {'gzip ms':>8}"
+              + (f" {'br':>9} {'br ms':>6}" if brotli else ""))
+        with Session(engine) as db:
+            for size in args.sizes:
+                # Mismo contenido por los dos caminos
+                assert json.loads(pydantic_path(db, size)) == json.loads(fast_path(db, size))
+                slow = _median_ms(lambda: pydantic_path(db, size), args.repeat)
+                fast = _median_ms(lambda: fast_path(db, size), args.repeat)
+                body = fast_path(db, size)
+                gzipped = compress(body, "gzip")
+                gzip_ms = _median_ms(lambda: compress(body, "gzip"), args.repeat)
+                line = (f"{size:>8} {slow:>12.2f} {fast:>10.2f} {slow / fast:>6.1f} {len(body):>10} "
+                        f"{len(gzipped):>9} {gzip_ms:>8.2f}")
+                if brotli:
+                    br = compress(body, "br")
+                    line += f" {len(br):>9} {_median_ms(lambda: compress(body, 'br'), args.repeat):>6.2f}"
+                print(line)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Esquema original (el que creaba create_all antes de las migraciones)
+
+Las bases existentes ya lo tienen: marcarlas con `alembic stamp 0001` y
+después `alembic upgrade head`. Lo añadido después (geohash, índices de
+likes, routes.day, route_jobs, trip_members) llega en 0001a-0001e.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password_hash", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "trips",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("destination_city", sa.String(), nullable=False),
+        sa.Column("destination_country", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_trips_id", "trips", ["id"])
+    op.create_index("ix_trips_destination_city", "trips", ["destination_city"])
+    op.create_index("ix_trips_destination_country", "trips", ["destination_country"])
+
+    op.create_table(
+        "places",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("city", sa.String(), nullable=False),
+        sa.Column("country", sa.String(), nullable=False),
+        sa.Column("latitude", sa.Float(), nullable=False),
+        sa.Column("longitude", sa.Float(), nullable=False),
+        sa.Column("image_url", sa.Text()),
+        sa.Column("is_active", sa.Boolean()),
+    )
+    op.create_index("ix_places_id", "places", ["id"])
+    op.create_index("ix_places_city", "places", ["city"])
+    op.create_index("ix_places_country", "places", ["country"])
+
+    op.create_table(
+        "categories",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False, unique=True),
+    )
+    op.create_index("ix_categories_id", "categories", ["id"])
+
+    op.create_table(
+        "place_categories",
+        sa.Column("place_id", sa.Integer(), sa.ForeignKey("places.id"), primary_key=True),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categories.id"), primary_key=True),
+        sa.UniqueConstraint("place_id", "category_id", name="uq_place_category"),
+    )
+
+    op.create_table(
+        "swipes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id"), nullable=False),
+        sa.Column("place_id", sa.Integer(), sa.ForeignKey("places.id"), nullable=False),
+        sa.Column("liked", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.UniqueConstraint("user_id", "trip_id", "place_id", name="uq_swipe_user_trip_place"),
+    )
+    op.create_index("ix_swipes_id", "swipes", ["id"])
+    op.create_index("ix_swipes_user_id", "swipes", ["user_id"])
+    op.create_index("ix_swipes_trip_id", "swipes", ["trip_id"])
+    op.create_index("ix_swipes_place_id", "swipes", ["place_id"])
+
+    op.create_table(
+        "trip_places",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id"), nullable=False),
+        sa.Column("place_id", sa.Integer(), sa.ForeignKey("places.id"), nullable=False),
+        sa.Column("added_at", sa.DateTime()),
+        sa.UniqueConstraint("trip_id", "place_id", name="uq_trip_place"),
+    )
+    op.create_index("ix_trip_places_id", "trip_places", ["id"])
+    op.create_index("ix_trip_places_trip_id", "trip_places", ["trip_id"])
+    op.create_index("ix_trip_places_place_id", "trip_places", ["place_id"])
+
+    op.create_table(
+        "routes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id"), nullable=False),
+        sa.Column("total_time", sa.Float()),
+        sa.Column("total_distance", sa.Float()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_routes_id", "routes", ["id"])
+    op.create_index("ix_routes_trip_id", "routes", ["trip_id"])
+
+    op.create_table(
+        "route_points",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("route_id", sa.Integer(), sa.ForeignKey("routes.id"), nullable=False),
+        sa.Column("place_id", sa.Integer(), sa.ForeignKey("places.id"), nullable=False),
+        sa.Column("step_order", sa.Integer(), nullable=False),
+        sa.Column("latitude", sa.Float(), nullable=False),
+        sa.Column("longitude", sa.Float(), nullable=False),
+        sa.Column("estimated_time", sa.Float()),
+    )
+    op.create_index("ix_route_points_id", "route_points", ["id"])
+    op.create_index("ix_route_points_route_id", "route_points", ["route_id"])
+    op.create_index("ix_route_points_place_id", "route_points", ["place_id"])
+
+
+def downgrade():
+    for table in (
+        "route_points",
+        "routes",
+        "trip_places",
+        "swipes",
+        "place_categories",
+        "categories",
+        "places",
+        "trips",
+        "users",
+    ):
+        op.drop_table(table)
@@ -0,0 +1,62 @@
+"""places.geohash con su índice, y backfill de los lugares existentes
+
+Las bases marcadas con la versión anterior de 0001 (que ya lo incluía) se
+saltan lo que ya tienen.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.geo import geohash_encode
+
+revision = "0001a"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 5000
+
+places = sa.table(
+    "places",
+    sa.column("id", sa.Integer),
+    sa.column("latitude", sa.Float),
+    sa.column("longitude", sa.Float),
+    sa.column("geohash", sa.String),
+)
+
+
+def _backfill():
+    # Por lotes de id: cada UPDATE toca pocas filas y no retiene la tabla entera
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(places.c.id, places.c.latitude, places.c.longitude)
+            .where(places.c.geohash.is_(None), places.c.id > last_id)
+            .order_by(places.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            return
+        bind.execute(
+            places.update().where(places.c.id == sa.bindparam("place_id")).values(geohash=sa.bindparam("cell")),
+            [{"place_id": place_id, "cell": geohash_encode(lat, lon)} for place_id, lat, lon in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if "geohash" not in {c["name"] for c in inspector.get_columns("places")}:
+        op.add_column("places", sa.Column("geohash", sa.String(12)))
+    if "ix_places_geohash" not in {i["name"] for i in inspector.get_indexes("places")}:
+        op.create_index("ix_places_geohash", "places", ["geohash"])
+    _backfill()
+
+
+def downgrade():
+    op.drop_index("ix_places_geohash", table_name="places")
+    op.drop_column("places", "geohash")
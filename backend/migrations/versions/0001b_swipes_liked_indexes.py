@@ -0,0 +1,30 @@
+"""Índices (trip_id, liked) y (user_id, liked) de swipes
+
+Revision ID: 0001b
+Revises: 0001a
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001b"
+down_revision = "0001a"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_swipes_trip_liked", ["trip_id", "liked"]),
+    ("ix_swipes_user_liked", ["user_id", "liked"]),
+]
+
+
+def upgrade():
+    existing = {i["name"] for i in sa.inspect(op.get_bind()).get_indexes("swipes")}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, "swipes", columns)
+
+
+def downgrade():
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name="swipes")
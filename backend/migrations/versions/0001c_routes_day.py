@@ -0,0 +1,22 @@
+"""routes.day: día del itinerario (NULL en rutas de un solo día)
+
+Revision ID: 0001c
+Revises: 0001b
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001c"
+down_revision = "0001b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "day" not in {c["name"] for c in sa.inspect(op.get_bind()).get_columns("routes")}:
+        op.add_column("routes", sa.Column("day", sa.Integer()))
+
+
+def downgrade():
+    op.drop_column("routes", "day")
@@ -0,0 +1,40 @@
+"""Cola de generación de rutas (route_jobs)
+
+Revision ID: 0001d
+Revises: 0001c
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001d"
+down_revision = "0001c"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table("route_jobs"):
+        return
+    op.create_table(
+        "route_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("content_hash", sa.String(64), nullable=False),
+        sa.Column("status", sa.String(16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("route_id", sa.Integer(), sa.ForeignKey("routes.id", ondelete="SET NULL")),
+        sa.Column("result", sa.Text()),
+        sa.Column("error", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+        sa.UniqueConstraint("trip_id", "content_hash", name="uq_route_job_trip_hash"),
+    )
+    op.create_index("ix_route_jobs_id", "route_jobs", ["id"])
+    op.create_index("ix_route_jobs_trip_id", "route_jobs", ["trip_id"])
+    op.create_index("ix_route_jobs_status_id", "route_jobs", ["status", "id"])
+
+
+def downgrade():
+    op.drop_table("route_jobs")
@@ -0,0 +1,34 @@
+"""Participantes de viajes (trip_members); el creador de cada viaje existente entra como owner
+
+Revision ID: 0001e
+Revises: 0001d
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001e"
+down_revision = "0001d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("trip_members"):
+        op.create_table(
+            "trip_members",
+            sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("role", sa.String(16), nullable=False),
+            sa.Column("joined_at", sa.DateTime()),
+        )
+        op.create_index("ix_trip_members_user_id", "trip_members", ["user_id"])
+    op.execute(
+        "INSERT INTO trip_members (trip_id, user_id, role, joined_at) "
+        "SELECT t.id, t.user_id, 'owner', t.created_at FROM trips t "
+        "WHERE NOT EXISTS (SELECT 1 FROM trip_members m WHERE m.trip_id = t.id AND m.user_id = t.user_id)"
+    )
+
+
+def downgrade():
+    op.drop_table("trip_members")
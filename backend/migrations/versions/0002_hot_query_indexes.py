@@ -0,0 +1,61 @@
+"""Índices compuestos para las consultas calientes
+
+- swipes(trip_id, liked, place_id): likes de un viaje resueltos sólo con el índice.
+- places(city, is_active, id): mazo por ciudad con keyset por id.
+- lower(places.city): by-city sin distinguir mayúsculas.
+- route_points(route_id, step_order): puntos de una ruta ya ordenados.
+
+Los índices de una sola columna que quedan cubiertos por el prefijo de uno
+compuesto se eliminan. En Postgres se crean con CONCURRENTLY para no bloquear
+escrituras en tablas grandes, así que cada índice va fuera de la transacción.
+
+Revision ID: 0002
+Revises: 0001e
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001e"
+branch_labels = None
+depends_on = None
+
+# (nombre, tabla, columnas) de los nuevos y de los que sustituyen
+NEW_INDEXES = [
+    ("ix_swipes_trip_liked_place", "swipes", ["trip_id", "liked", "place_id"]),
+    ("ix_places_city_active", "places", ["city", "is_active", "id"]),
+    ("ix_places_city_lower", "places", [sa.text("lower(city)")]),
+    ("ix_route_points_route_step", "route_points", ["route_id", "step_order"]),
+]
+REPLACED_INDEXES = [
+    ("ix_swipes_trip_liked", "swipes", ["trip_id", "liked"]),
+    ("ix_swipes_trip_id", "swipes", ["trip_id"]),
+    # user_id ya es prefijo de uq_swipe_user_trip_place y de ix_swipes_user_liked
+    ("ix_swipes_user_id", "swipes", ["user_id"]),
+    ("ix_places_city", "places", ["city"]),
+    ("ix_route_points_route_id", "route_points", ["route_id"]),
+]
+
+
+def _create(indexes):
+    for name, table, columns in indexes:
+        with op.get_context().autocommit_block():
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def _drop(indexes):
+    for name, table, _ in indexes:
+        with op.get_context().autocommit_block():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+
+def upgrade():
+    # Primero los nuevos: las consultas nunca se quedan sin índice
+    _create(NEW_INDEXES)
+    _drop(REPLACED_INDEXES)
+
+
+def downgrade():
+    _create(REPLACED_INDEXES)
+    _drop(NEW_INDEXES)
@@ -0,0 +1,99 @@
+"""Particionado hash de swipes por user_id (opcional, sólo Postgres)
+
+Con `-x swipes_partitions=N` (o SWIPES_HASH_PARTITIONS) la tabla se rehace
+como `PARTITION BY HASH (user_id)` con N particiones y se copian las filas;
+sin él la revisión no hace nada. Para particionar más adelante:
+`alembic downgrade 0002 && alembic -x swipes_partitions=N upgrade head`.
+
+Postgres exige que la clave de partición forme parte de las restricciones
+únicas, así que la PK pasa a ser (id, user_id); la secuencia de id se
+conserva. Las consultas por usuario tocan una sola partición; las de un
+viaje recorren el índice de cada partición.
+
+La copia bloquea swipes mientras dura: lanzarla en una ventana de
+mantenimiento.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.config import settings
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+COLUMNS = "id, user_id, trip_id, place_id, liked, created_at"
+
+
+def _partitions() -> int:
+    value = context.get_x_argument(as_dictionary=True).get("swipes_partitions")
+    return int(value) if value is not None else settings.SWIPES_HASH_PARTITIONS
+
+
+def _is_partitioned() -> bool:
+    return bool(op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'swipes' AND c.relnamespace = to_regnamespace(current_schema())"
+    )).scalar())
+
+
+def _swap(create_statements: list, primary_key: list):
+    """Copia swipes a la tabla nueva, la sustituye y recrea restricciones e índices.
+
+    Los nombres de restricciones e índices son únicos por esquema, así que se
+    crean cuando la tabla vieja ya no existe.
+    """
+    op.execute("LOCK TABLE swipes IN ACCESS EXCLUSIVE MODE")
+    for statement in create_statements:
+        op.execute(statement)
+    op.execute(f"INSERT INTO swipes_new ({COLUMNS}) SELECT {COLUMNS} FROM swipes")
+    op.execute("ALTER SEQUENCE swipes_id_seq OWNED BY NONE")
+    op.drop_table("swipes")
+    op.rename_table("swipes_new", "swipes")
+    op.execute("ALTER SEQUENCE swipes_id_seq OWNED BY swipes.id")
+
+    op.create_primary_key("swipes_pkey", "swipes", primary_key)
+    op.create_foreign_key("swipes_user_id_fkey", "swipes", "users", ["user_id"], ["id"])
+    op.create_foreign_key("swipes_trip_id_fkey", "swipes", "trips", ["trip_id"], ["id"])
+    op.create_foreign_key("swipes_place_id_fkey", "swipes", "places", ["place_id"], ["id"])
+    op.create_unique_constraint("uq_swipe_user_trip_place", "swipes", ["user_id", "trip_id", "place_id"])
+    op.create_index("ix_swipes_id", "swipes", ["id"])
+    op.create_index("ix_swipes_place_id", "swipes", ["place_id"])
+    op.create_index("ix_swipes_trip_liked_place", "swipes", ["trip_id", "liked", "place_id"])
+    op.create_index("ix_swipes_user_liked", "swipes", ["user_id", "liked"])
+
+
+def _table_sql(suffix: str = "") -> str:
+    return (
+        "CREATE TABLE swipes_new ("
+        " id integer NOT NULL DEFAULT nextval('swipes_id_seq'),"
+        " user_id integer NOT NULL,"
+        " trip_id integer NOT NULL,"
+        " place_id integer NOT NULL,"
+        " liked boolean NOT NULL,"
+        " created_at timestamp without time zone"
+        f"){suffix}"
+    )
+
+
+def upgrade():
+    partitions = _partitions()
+    if op.get_bind().dialect.name != "postgresql" or partitions <= 0 or _is_partitioned():
+        return
+    statements = [_table_sql(" PARTITION BY HASH (user_id)")]
+    statements += [
+        f"CREATE TABLE swipes_p{i} PARTITION OF swipes_new FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+        for i in range(partitions)
+    ]
+    _swap(statements, ["id", "user_id"])
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql" or not _is_partitioned():
+        return
+    _swap([_table_sql()], ["id"])
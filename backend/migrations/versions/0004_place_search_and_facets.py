@@ -0,0 +1,50 @@
+"""Búsqueda de texto en lugares y facetas por ciudad precalculadas
+
+- city_category_counts: lugares activos por (ciudad, categoría), rellenada
+  aquí una vez y mantenida después con incrementos desde la API.
+- ix_places_search: GIN sobre el tsvector de nombre y descripción (sólo
+  Postgres; en SQLite la búsqueda usa el índice invertido en memoria).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))"
+
+
+def upgrade():
+    op.create_table(
+        "city_category_counts",
+        sa.Column("city", sa.String(), primary_key=True),
+        sa.Column(
+            "category_id", sa.Integer(), sa.ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("places", sa.Integer(), nullable=False),
+    )
+    op.execute(
+        "INSERT INTO city_category_counts (city, category_id, places) "
+        "SELECT p.city, pc.category_id, count(*) FROM places p "
+        "JOIN place_categories pc ON pc.place_id = p.id "
+        "WHERE p.is_active GROUP BY p.city, pc.category_id"
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(
+                "ix_places_search", "places", [sa.text(SEARCH_VECTOR)],
+                postgresql_using="gin", postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index("ix_places_search", table_name="places", postgresql_concurrently=True)
+    op.drop_table("city_category_counts")
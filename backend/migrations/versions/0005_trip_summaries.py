@@ -0,0 +1,42 @@
+"""Resumen desnormalizado por viaje (trip_summaries)
+
+No se rellena aquí: la fila de un viaje existente se construye la primera vez
+que se lee o se escribe en él, y desde entonces se mantiene por incrementos.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "trip_summaries",
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("city", sa.String(), nullable=False),
+        sa.Column("country", sa.String(), nullable=False),
+        sa.Column("swipe_count", sa.Integer(), nullable=False),
+        sa.Column("like_count", sa.Integer(), nullable=False),
+        sa.Column("place_likes", sa.JSON(), nullable=False),
+        sa.Column("centroid_lat", sa.Float()),
+        sa.Column("centroid_lon", sa.Float()),
+        sa.Column("min_lat", sa.Float()),
+        sa.Column("min_lon", sa.Float()),
+        sa.Column("max_lat", sa.Float()),
+        sa.Column("max_lon", sa.Float()),
+        sa.Column("latest_route_id", sa.Integer(), sa.ForeignKey("routes.id", ondelete="SET NULL")),
+        sa.Column("latest_route_total_time", sa.Float()),
+        sa.Column("latest_route_total_distance", sa.Float()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table("trip_summaries")
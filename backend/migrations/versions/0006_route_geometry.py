@@ -0,0 +1,24 @@
+"""Geometría de las rutas como polyline codificada
+
+Las rutas existentes quedan con NULL y se sirven con sus paradas.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("routes", sa.Column("geometry", sa.Text()))
+
+
+def downgrade():
+    with op.batch_alter_table("routes") as batch:
+        batch.drop_column("geometry")
@@ -0,0 +1,29 @@
+"""trip_summaries.updated_at con valor por defecto en la base
+
+0005 dejó la columna nullable y sin default: sólo la rellenaba el ORM, así
+que una fila escrita por otra vía quedaba con NULL.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(sa.text("UPDATE trip_summaries SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+    with op.batch_alter_table("trip_summaries") as batch:
+        batch.alter_column(
+            "updated_at", existing_type=sa.DateTime(), nullable=False, server_default=sa.func.now()
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("trip_summaries") as batch:
+        batch.alter_column("updated_at", existing_type=sa.DateTime(), nullable=True, server_default=None)
@@ -0,0 +1,24 @@
+"""route_jobs.heartbeat_at: latido del worker que procesa el job
+
+Los jobs en curso al migrar quedan con NULL y se juzgan por started_at.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("route_jobs", sa.Column("heartbeat_at", sa.DateTime()))
+
+
+def downgrade():
+    with op.batch_alter_table("route_jobs") as batch:
+        batch.drop_column("heartbeat_at")
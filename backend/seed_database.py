@@ -1,170 +1,363 @@
-import random
-from datetime import datetime
-from app.database import SessionLocal
+"""Generador de datos sintéticos para Tinvel.
+
+Escala desde un entorno de desarrollo hasta volúmenes de producción:
+
+    python seed_database.py --users 1e6 --places 2e5 --swipes 1e8 --cities 200
+
+Cada tabla se genera por trozos en un pool de procesos y cada trozo entra con
+COPY FROM STDIN por su propia conexión. Todos los ids se asignan aquí, así que
+el resultado es idéntico para la misma semilla y el mismo --chunk-size sin
+importar cuántos workers se usen.
+"""
+import argparse
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import psycopg2
+from alembic import command
+from alembic.config import Config as AlembicConfig
+
 from app import models
+from app.config import settings
+from app.database import Base, engine
+from app.geo import geohash_encode
+from app.search import rebuild_facet_counts
+from app.security import hash_password_sync
+
+KNOWN_CITIES = [
+    ("Paris", "Francia", 48.8566, 2.3522),
+    ("New York", "USA", 40.7128, -74.0060),
+    ("Tokyo", "Japón", 35.6762, 139.6503),
+    ("London", "Reino Unido", 51.5074, -0.1278),
+    ("Roma", "Italia", 41.9028, 12.4964),
+    ("Barcelona", "España", 41.3874, 2.1686),
+    ("Ciudad de México", "México", 19.4326, -99.1332),
+    ("Buenos Aires", "Argentina", -34.6037, -58.3816),
+    ("Berlin", "Alemania", 52.5200, 13.4050),
+    ("Lisboa", "Portugal", 38.7223, -9.1393),
+    ("Kyoto", "Japón", 35.0116, 135.7681),
+    ("Bangkok", "Tailandia", 13.7563, 100.5018),
+    ("Estambul", "Turquía", 41.0082, 28.9784),
+    ("Sydney", "Australia", -33.8688, 151.2093),
+    ("Rio de Janeiro", "Brasil", -22.9068, -43.1729),
+    ("Amsterdam", "Países Bajos", 52.3676, 4.9041),
+]
+CATEGORIES = ["museo", "parque", "monumento", "mirador", "mercado", "templo", "playa", "restaurante"]
+
+CLUSTERS_PER_CITY = 6
+CLUSTER_SPREAD_DEG = 0.03
+PLACE_SPREAD_DEG = 0.006
+BASE_TIME = np.datetime64("2025-01-01T00:00:00")
+SEED_PASSWORD = "password"
+
+# Sal para los hashes deterministas por id
+_SALT_POPULARITY, _SALT_USER_BIAS, _SALT_TRIP_CITY, _SALT_OFFSET, _SALT_STRIDE, _SALT_CATEGORY = range(1, 7)
+
+
+def _count(value: str) -> int:
+    return int(float(value))
+
+
+def _dsn() -> str:
+    return (
+        f"host={settings.DB_HOST} port={settings.DB_PORT} dbname={settings.DB_NAME} "
+        f"user={settings.DB_USER} password={settings.DB_PASSWORD}"
+    )
+
+
+def _uniform(ids: np.ndarray, seed: int, salt: int) -> np.ndarray:
+    """Uniforme [0, 1) determinista por id (splitmix64), sin estado entre trozos."""
+    x = ids.astype(np.uint64) + np.uint64((seed * 0x9E3779B1 + salt * 0x85EBCA77) & 0xFFFFFFFFFFFFFFFF)
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _rng(seed: int, table: int, chunk: int) -> np.random.Generator:
+    return np.random.default_rng(np.random.SeedSequence([seed, table, chunk]))
+
+
+def _csv(*columns) -> io.StringIO:
+    lines = np.asarray(columns[0]).astype(str)
+    for column in columns[1:]:
+        lines = np.char.add(np.char.add(lines, ","), np.asarray(column).astype(str))
+    buf = io.StringIO()
+    buf.write("\n".join(lines.tolist()))
+    buf.write("\n")
+    buf.seek(0)
+    return buf
+
+
+def _timestamps(seconds: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(BASE_TIME + seconds.astype(np.int64).astype("timedelta64[s]"))
+
+
+def _copy(table: str, columns: str, buf: io.StringIO) -> int:
+    conn = psycopg2.connect(_dsn())
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET synchronous_commit = off")
+            cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buf)
+        conn.commit()
+    finally:
+        conn.close()
+    return buf.getvalue().count("\n")
+
+
+@dataclass
+class Plan:
+    seed: int
+    users: int
+    places: int
+    trips: int
+    like_ratio: float
+    city_names: list
+    city_countries: list
+    # place ids de la ciudad c: city_offsets[c] + 1 .. city_offsets[c + 1]
+    city_offsets: np.ndarray
+    city_weights: np.ndarray
+    cluster_lat: np.ndarray
+    cluster_lon: np.ndarray
+    # Mismo hash de SEED_PASSWORD para todos los usuarios; se calcula una vez
+    password_hash: str
+
+    def city_of_place(self, ids: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.city_offsets, ids - 1, side="right") - 1
+
+    def city_sizes(self) -> np.ndarray:
+        return np.diff(self.city_offsets)
+
+    def trip_cities(self, trip_ids: np.ndarray) -> np.ndarray:
+        # Ciudades populares reciben más viajes; sólo ciudades con lugares
+        u = _uniform(trip_ids, self.seed, _SALT_TRIP_CITY)
+        return np.searchsorted(np.cumsum(self.city_weights), u * self.city_weights.sum(), side="right")
+
+
+def build_plan(args) -> Plan:
+    rng = _rng(args.seed, 0, 0)
+    n_cities = max(1, min(args.cities, args.places))
+
+    names, countries, lat, lon = [], [], [], []
+    for i in range(n_cities):
+        if i < len(KNOWN_CITIES):
+            name, country, clat, clon = KNOWN_CITIES[i]
+        else:
+            name, country = f"Ciudad {i + 1}", f"País {i % 40 + 1}"
+            clat, clon = rng.uniform(-45, 60), rng.uniform(-170, 170)
+        names.append(name)
+        countries.append(country)
+        lat.append(clat)
+        lon.append(clon)
+
+    # Tamaños tipo Zipf: pocas ciudades muy grandes y una cola larga
+    weights = 1.0 / np.arange(1, n_cities + 1) ** 0.8
+    sizes = 1 + np.floor(weights / weights.sum() * (args.places - n_cities)).astype(np.int64)
+    sizes[0] += args.places - sizes.sum()
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+    cluster_lat = np.asarray(lat)[:, None] + rng.normal(0, CLUSTER_SPREAD_DEG, (n_cities, CLUSTERS_PER_CITY))
+    cluster_lon = np.asarray(lon)[:, None] + rng.normal(0, CLUSTER_SPREAD_DEG, (n_cities, CLUSTERS_PER_CITY))
+
+    return Plan(
+        seed=args.seed,
+        users=args.users,
+        places=args.places,
+        trips=args.trips,
+        like_ratio=args.like_ratio,
+        city_names=names,
+        city_countries=countries,
+        city_offsets=offsets,
+        city_weights=weights,
+        cluster_lat=cluster_lat,
+        cluster_lon=cluster_lon,
+        password_hash=hash_password_sync(SEED_PASSWORD),
+    )
+
+
+def gen_users(plan: Plan, chunk: int, start: int, end: int) -> int:
+    ids = np.arange(start, end)
+    emails = np.char.add(np.char.add("user", ids.astype(str)), "@example.com")
+    created = _timestamps(_uniform(ids, plan.seed, _SALT_USER_BIAS) * 365 * 86400)
+    return _copy("users", "id,email,password_hash,created_at", _csv(ids, emails, np.full(len(ids), plan.password_hash), created))
+
+
+def gen_places(plan: Plan, chunk: int, start: int, end: int) -> int:
+    rng = _rng(plan.seed, 2, chunk)
+    ids = np.arange(start, end)
+    city = plan.city_of_place(ids)
+    cluster = rng.integers(0, CLUSTERS_PER_CITY, len(ids))
+    lat = plan.cluster_lat[city, cluster] + rng.normal(0, PLACE_SPREAD_DEG, len(ids))
+    lon = plan.cluster_lon[city, cluster] + rng.normal(0, PLACE_SPREAD_DEG, len(ids))
+    geohashes = [geohash_encode(a, b) for a, b in zip(lat.tolist(), lon.tolist())]
+    category = (_uniform(ids, plan.seed, _SALT_CATEGORY) * len(CATEGORIES)).astype(np.int64)
+    names = np.char.add(np.char.add(np.asarray(CATEGORIES)[category], " "), ids.astype(str))
+    return _copy(
+        "places",
+        "id,name,description,city,country,latitude,longitude,geohash,is_active",
+        _csv(
+            ids,
+            names,
+            np.char.add("Lugar sintético en ", np.asarray(plan.city_names)[city]),
+            np.asarray(plan.city_names)[city],
+            np.asarray(plan.city_countries)[city],
+            np.round(lat, 6),
+            np.round(lon, 6),
+            geohashes,
+            np.full(len(ids), "t"),
+        ),
+    )
+
+
+def gen_place_categories(plan: Plan, chunk: int, start: int, end: int) -> int:
+    ids = np.arange(start, end)
+    category = (_uniform(ids, plan.seed, _SALT_CATEGORY) * len(CATEGORIES)).astype(np.int64) + 1
+    return _copy("place_categories", "place_id,category_id", _csv(ids, category))
+
+
+def gen_trips(plan: Plan, chunk: int, start: int, end: int) -> int:
+    ids = np.arange(start, end)
+    users = (ids - 1) % plan.users + 1
+    city = plan.trip_cities(ids)
+    created = _timestamps(_uniform(ids, plan.seed, _SALT_OFFSET) * 365 * 86400)
+    return _copy(
+        "trips",
+        "id,user_id,destination_city,destination_country,created_at",
+        _csv(ids, users, np.asarray(plan.city_names)[city], np.asarray(plan.city_countries)[city], created),
+    )
+
+
+def gen_swipes(plan: Plan, chunk: int, start: int, end: int, counts: np.ndarray, first_ids: np.ndarray) -> int:
+    rng = _rng(plan.seed, 4, chunk)
+    trip_ids = np.arange(start, end)
+    city = plan.trip_cities(trip_ids)
+    size = plan.city_sizes()[city]
+
+    # Lugares distintos por viaje sin muestreo con reemplazo: recorrer la
+    # ciudad desde un desplazamiento con un paso coprimo con su tamaño.
+    offset = (_uniform(trip_ids, plan.seed, _SALT_OFFSET) * size).astype(np.int64)
+    stride = 1 + (_uniform(trip_ids, plan.seed, _SALT_STRIDE) * np.maximum(size - 1, 1)).astype(np.int64)
+    bad = np.gcd(stride, size) != 1
+    while bad.any():
+        stride[bad] = stride[bad] % np.maximum(size[bad] - 1, 1) + 1
+        bad = np.gcd(stride, size) != 1
+
+    total = int(counts.sum())
+    if total == 0:
+        return 0
+    row_trip = np.repeat(np.arange(len(trip_ids)), counts)
+    step = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    place_ids = plan.city_offsets[city[row_trip]] + (offset[row_trip] + step * stride[row_trip]) % size[row_trip] + 1
+    swipe_ids = first_ids[row_trip] + step
+    users = (trip_ids[row_trip] - 1) % plan.users + 1
+
+    popularity = 0.5 + _uniform(place_ids, plan.seed, _SALT_POPULARITY)
+    bias = 0.5 + _uniform(users, plan.seed, _SALT_USER_BIAS)
+    liked = rng.random(total) < np.clip(plan.like_ratio * popularity * bias, 0.0, 1.0)
+    created = _timestamps(_uniform(trip_ids[row_trip], plan.seed, _SALT_OFFSET) * 365 * 86400 + step * 7)
+
+    written = _copy(
+        "swipes",
+        "id,user_id,trip_id,place_id,liked,created_at",
+        _csv(swipe_ids, users, trip_ids[row_trip], place_ids, np.where(liked, "t", "f"), created),
+    )
+    # trip_places reutiliza el id del swipe que lo originó: único y determinista
+    _copy(
+        "trip_places",
+        "id,trip_id,place_id,added_at",
+        _csv(swipe_ids[liked], trip_ids[row_trip][liked], place_ids[liked], created[liked]),
+    )
+    return written
+
+
+def _chunks(first: int, last: int, size: int):
+    for chunk, start in enumerate(range(first, last + 1, size)):
+        yield chunk, start, min(start + size, last + 1)
+
+
+def run_table(pool, label: str, fn, plan: Plan, total: int, chunk_size: int, extra=None) -> int:
+    started = time.perf_counter()
+    futures = []
+    for chunk, start, end in _chunks(1, total, chunk_size):
+        args = (plan, chunk, start, end) + (extra(start, end) if extra else ())
+        futures.append(pool.submit(fn, *args))
+    rows = sum(f.result() for f in futures)
+    elapsed = time.perf_counter() - started
+    print(f"  {label}: {rows} filas en {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} filas/s)")
+    return rows
 
-db = SessionLocal()
 
 def reset_database():
-    # Borra todos los registros sin borrar el schema
-    db.query(models.RoutePoint).delete()
-    db.query(models.Route).delete()
-    db.query(models.TripPlace).delete()
-    db.query(models.Swipe).delete()
-    db.query(models.Trip).delete()
-    db.query(models.PlaceCategory).delete()
-    db.query(models.Category).delete()
-    db.query(models.Place).delete()
-    db.query(models.User).delete()
-    db.commit()
+    command.upgrade(AlembicConfig(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")), "head")
+    tables = ", ".join(t.name for t in Base.metadata.sorted_tables)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
     print("Base limpia y lista para sembrar datos.")
 
 
-def seed_users():
-    users = [
-        models.User(email="moises@test.com", password_hash="hash1"),
-        models.User(email="ana@example.com", password_hash="hash2"),
-        models.User(email="carlos@example.com", password_hash="hash3")
-    ]
-    db.add_all(users)
-    db.commit()
-    for u in users:
-        db.refresh(u)
-    print("Usuarios creados:", [u.id for u in users])
-    return users
-
-
-def seed_places():
-    places = [
-        # Paris
-        models.Place(name="Louvre", description="Museo icónico", city="Paris", country="Francia",
-                     latitude=48.8606, longitude=2.3376),
-        models.Place(name="Torre Eiffel", description="Monumento", city="Paris", country="Francia",
-                     latitude=48.8584, longitude=2.2945),
-        models.Place(name="Arco del Triunfo", description="Monumento histórico", city="Paris", country="Francia",
-                     latitude=48.8738, longitude=2.2950),
-
-        # NYC
-        models.Place(name="Central Park", description="Parque famoso", city="New York", country="USA",
-                     latitude=40.7851, longitude=-73.9683),
-        models.Place(name="Times Square", description="Centro turístico", city="New York", country="USA",
-                     latitude=40.7580, longitude=-73.9855),
-        models.Place(name="Empire State", description="Rascacielos icónico", city="New York", country="USA",
-                     latitude=40.7484, longitude=-73.9857),
-
-        # Tokio
-        models.Place(name="Shibuya Crossing", description="Cruce famoso", city="Tokyo", country="Japón",
-                     latitude=35.6595, longitude=139.7005),
-        models.Place(name="Tokyo Tower", description="Torre icónica", city="Tokyo", country="Japón",
-                     latitude=35.6586, longitude=139.7454),
-        models.Place(name="Senso-ji Temple", description="Templo histórico", city="Tokyo", country="Japón",
-                     latitude=35.7148, longitude=139.7967),
-    ]
-
-    db.add_all(places)
-    db.commit()
-    for p in places:
-        db.refresh(p)
-    print("Lugares creados:", [p.id for p in places])
-    return places
-
-
-def seed_trips(users):
-    cities = [
-        ("Paris", "Francia"),
-        ("New York", "USA"),
-        ("Tokyo", "Japón")
-    ]
-
-    trips = []
-    for u in users:
-        for (city, country) in cities[:2]:  # Cada usuario con 2 ciudades
-            t = models.Trip(user_id=u.id, destination_city=city, destination_country=country)
-            trips.append(t)
-
-    db.add_all(trips)
-    db.commit()
-    for t in trips:
-        db.refresh(t)
-    print("Viajes creados:", [t.id for t in trips])
-    return trips
-
-
-def seed_swipes(trips, places):
-    for trip in trips:
-        for p in random.sample(places, 5):
-            liked = random.choice([True, False])
-            sw = models.Swipe(
-                user_id=trip.user_id,
-                trip_id=trip.id,
-                place_id=p.id,
-                liked=liked
-            )
-            db.add(sw)
-    db.commit()
-    print("Swipes generados para todos los viajes.")
-
-
-def seed_trip_places(trips):
-    for trip in trips:
-        # Simular que solo los likes verdaderos se añaden al viaje final
-        swipes_liked = db.query(models.Swipe).filter_by(trip_id=trip.id, liked=True).all()
-        for s in swipes_liked:
-            tp = models.TripPlace(trip_id=trip.id, place_id=s.place_id)
-            db.add(tp)
-    db.commit()
-    print("Trip Places generados basados en swipes liked.")
-
-
-def seed_routes(trips, places):
-    for trip in trips:
-        liked_places = db.query(models.TripPlace).filter_by(trip_id=trip.id).all()
-        if not liked_places:
-            continue
-
-        route = models.Route(trip_id=trip.id, total_time=random.randint(30, 120))
-        db.add(route)
-        db.commit()
-        db.refresh(route)
-
-        order = 1
-        for tp in liked_places:
-            place = db.query(models.Place).filter_by(id=tp.place_id).first()
-            rp = models.RoutePoint(
-                route_id=route.id,
-                place_id=place.id,
-                step_order=order,
-                latitude=place.latitude,
-                longitude=place.longitude,
-                estimated_time=random.randint(5, 30)
-            )
-            db.add(rp)
-            order += 1
-
-    db.commit()
-    print("Rutas y puntos generados.")
+def sync_sequences():
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if "id" in table.c and table.c.id.autoincrement is not False and table.c.id.primary_key:
+                conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+                )
 
 
-if __name__ == "__main__":
-    print("Reseteando base…")
-    reset_database()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos de Tinvel con COPY en paralelo.")
+    parser.add_argument("--users", type=_count, default=1000)
+    parser.add_argument("--places", type=_count, default=2000)
+    parser.add_argument("--trips", type=_count, default=None, help="por defecto, 2 por usuario")
+    parser.add_argument("--swipes", type=_count, default=50000)
+    parser.add_argument("--cities", type=_count, default=10)
+    parser.add_argument("--like-ratio", type=float, default=0.35)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=_count, default=100000)
+    args = parser.parse_args(argv)
+    if args.trips is None:
+        args.trips = args.users * 2
 
-    print("\nSembrando usuarios…")
-    users = seed_users()
+    plan = build_plan(args)
 
-    print("\nSembrando lugares…")
-    places = seed_places()
+    # Swipes por viaje: reparto uniforme, limitado al tamaño de su ciudad
+    trip_ids = np.arange(1, args.trips + 1)
+    counts = np.full(args.trips, args.swipes // max(args.trips, 1), dtype=np.int64)
+    counts[: args.swipes % max(args.trips, 1)] += 1
+    counts = np.minimum(counts, plan.city_sizes()[plan.trip_cities(trip_ids)])
+    first_ids = np.concatenate(([1], np.cumsum(counts)[:-1] + 1)) if args.trips else counts
 
-    print("\nSembrando viajes…")
-    trips = seed_trips(users)
+    print("Reseteando base…")
+    reset_database()
+    with engine.begin() as conn:
+        conn.execute(models.Category.__table__.insert(), [{"id": i + 1, "name": n} for i, n in enumerate(CATEGORIES)])
 
-    print("\nSembrando swipes…")
-    seed_swipes(trips, places)
+    print(f"Sembrando {len(plan.city_names)} ciudades…")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        run_table(pool, "users", gen_users, plan, args.users, args.chunk_size)
+        run_table(pool, "places", gen_places, plan, args.places, args.chunk_size)
+        run_table(pool, "place_categories", gen_place_categories, plan, args.places, args.chunk_size)
+        run_table(pool, "trips", gen_trips, plan, args.trips, args.chunk_size)
+        # Los trozos de swipes van por viaje para que cada viaje quede en un solo worker
+        trips_per_chunk = max(1, int(args.chunk_size // max(counts.mean(), 1))) if args.trips else 1
+        run_table(
+            pool, "swipes + trip_places", gen_swipes, plan, args.trips, trips_per_chunk,
+            extra=lambda s, e: (counts[s - 1:e - 1], first_ids[s - 1:e - 1]),
+        )
 
-    print("\nGenerando trip_places…")
-    seed_trip_places(trips)
+    sync_sequences()
+    with engine.begin() as conn:
+        rebuild_facet_counts(conn)
+    print("\nSEED COMPLETO ✔")
 
-    print("\nGenerando rutas…")
-    seed_routes(trips, places)
 
-    print("\nSEED COMPLETO ✔")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Entorno de pruebas: SQLite temporal y caché FakeRedis, sin servidores.
+
+Las variables se fijan antes de importar `app`, que lee la configuración al
+importarse.
+"""
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="tinvel-tests-")
+os.environ.setdefault("APP_ENV", "development")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_DIR}/test.db")
+os.environ.setdefault("CACHE_BACKEND", "fakeredis")
+os.environ.setdefault("TRAVEL_MATRIX_DIR", os.path.join(_DB_DIR, "matrices"))
+os.environ.setdefault("SWIPE_WAL_DIR", os.path.join(_DB_DIR, "swipe-wal"))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database
+from app.database import Base
+from app.main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    Base.metadata.create_all(database.engine)
+    yield TestClient(app)
+    Base.metadata.drop_all(database.engine)
+
+
+@pytest.fixture(scope="session")
+def make_place(client):
+    def make_place(name, city, latitude, longitude, description=None, categories=None):
+        response = client.post(
+            "/places/",
+            json={
+                "name": name,
+                "description": description,
+                "city": city,
+                "country": "XX",
+                "latitude": latitude,
+                "longitude": longitude,
+                "categories": categories or [],
+            },
+        )
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return make_place
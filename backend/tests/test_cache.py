@@ -0,0 +1,72 @@
+import asyncio
+
+from app.cache import CatalogCache, FakeRedis, MemoryCache, RedisCache, catalog_cache
+
+
+def test_invalidate_changes_keys():
+    cache = CatalogCache(RedisCache(FakeRedis(), ttl_seconds=60))
+
+    async def scenario():
+        key = await cache.key("places", "list", "Paris")
+        await cache.set(key, b"[]")
+        assert await cache.get(key) == b"[]"
+
+        await cache.invalidate("places")
+        fresh = await cache.key("places", "list", "Paris")
+        assert fresh != key
+        assert await cache.get(fresh) is None
+        # Otros espacios no se ven afectados
+        assert await cache.key("tiles", "1") == "tiles:v0:1"
+
+    asyncio.run(scenario())
+
+
+def test_memory_versions_never_repeat_after_eviction():
+    backend = MemoryCache(max_entries=10, ttl_seconds=60, max_versions=2)
+
+    async def scenario():
+        await backend.bump("a")
+        seen = await backend.version("a")
+        await backend.bump("b")
+        await backend.bump("c")
+        # "a" salió del LRU: su versión no puede volver a una ya usada
+        assert await backend.version("a") >= seen
+        assert await backend.get("version:a") is None
+
+    asyncio.run(scenario())
+
+
+def test_redis_clear_only_touches_prefix():
+    client = FakeRedis()
+    backend = RedisCache(client, ttl_seconds=60)
+
+    async def scenario():
+        await client.set("other:key", b"x")
+        await backend.set("k", b"v")
+        await backend.bump("places")
+        await backend.clear()
+        assert await backend.get("k") is None
+        assert await backend.version("places") == 0
+        assert await client.get("other:key") == b"x"
+
+    asyncio.run(scenario())
+
+
+def test_places_etag_and_304(client, make_place):
+    assert isinstance(catalog_cache.backend, RedisCache)
+    make_place("Louvre", "CacheCity", 48.86, 2.33)
+
+    first = client.get("/places/", params={"city": "CacheCity"})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = client.get("/places/", params={"city": "CacheCity"}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+
+    # Un alta invalida el espacio: el ETag viejo ya no vale
+    make_place("Orsay", "CacheCity", 48.86, 2.32)
+    changed = client.get("/places/", params={"city": "CacheCity"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert {p["name"] for p in changed.json()} == {"Louvre", "Orsay"}
@@ -0,0 +1,24 @@
+import numpy as np
+
+from app.itinerary import _day_minutes, plan_itinerary
+
+
+def test_days_fit_their_budget():
+    rng = np.random.default_rng(0)
+    n = 40
+    latitudes = 48.85 + rng.random(n) * 0.05
+    longitudes = 2.30 + rng.random(n) * 0.05
+    solutions, unscheduled = plan_itinerary(
+        list(range(n)), latitudes, longitudes, days=3, hours_per_day=4, visit_minutes=[20] * n, time_budget_ms=50
+    )
+
+    for solution in solutions:
+        assert sum(solution.leg_minutes) + sum(solution.visit_minutes) <= 4 * 60 + 1e-6
+    planned = [p for s in solutions for p in s.place_ids]
+    assert sorted(planned + unscheduled) == list(range(n))
+
+
+def test_day_minutes_counts_visits_and_legs():
+    minutes = np.array([[0.0, 5.0], [5.0, 0.0]])
+    assert _day_minutes(minutes, np.array([10.0, 20.0]), [0, 1]) == 35.0
+    assert _day_minutes(minutes, np.array([10.0, 20.0]), []) == 0.0
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from app.recommender import Recommender, _build_model
+
+
+def _pairs(index, cooc):
+    """Co-ocurrencias no nulas como {(lugar, lugar): valor}, independiente del índice."""
+    places = {i: p for p, i in index.items()}
+    cooc = cooc.tocoo()
+    return {(places[r], places[c]): v for r, c, v in zip(cooc.row, cooc.col, cooc.data) if v}
+
+
+def _built(likes):
+    recommender = Recommender(training_window=1000, rebuild_seconds=3600, max_cached_trips=10)
+    recommender._index, recommender._trip_likes, recommender._cooc, recommender._features = _build_model(likes, [])
+    recommender._built_at = time.monotonic()
+    return recommender
+
+
+def test_live_updates_match_a_rebuild():
+    # (viaje, usuario, lugar)
+    likes = [(1, 10, 100), (1, 11, 100), (1, 10, 101), (2, 10, 100)]
+    recommender = _built([(t, p) for t, _, p in likes])
+
+    # Otro miembro sigue dando like a 100: la co-ocurrencia con 101 se mantiene
+    recommender.record(1, 11, 100, liked=False, previous=True)
+    likes.remove((1, 11, 100))
+    recommender.record(1, 11, 102, liked=True)
+    likes.append((1, 11, 102))
+    recommender.record(1, 10, 100, liked=False, previous=True)
+    likes.remove((1, 10, 100))
+
+    live = asyncio.run(recommender._current())
+    rebuilt = _built([(t, p) for t, _, p in likes])
+    assert _pairs(live.index, live.cooc) == _pairs(rebuilt._index, rebuilt._cooc)
+    assert _pairs(live.index, live.cooc)[(101, 102)] == 1
+
+
+def test_shared_like_survives_one_unlike():
+    recommender = _built([(1, 100), (1, 100), (1, 101)])
+    recommender.record(1, 11, 100, liked=False, previous=True)
+
+    live = asyncio.run(recommender._current())
+    assert _pairs(live.index, live.cooc)[(100, 101)] == 1
+    assert _pairs(live.index, live.cooc)[(100, 100)] == 1
@@ -0,0 +1,66 @@
+import asyncio
+
+from app.route_engine import solve_route, with_provider_legs
+from app.routing_providers import LegCache, LocalProvider, RoutingProvider
+
+
+def _line_route():
+    # Seis paradas sobre un paralelo, desordenadas: el óptimo es recorrerlas en orden
+    longitudes = [2.30, 2.35, 2.31, 2.34, 2.32, 2.33]
+    return solve_route(list(range(len(longitudes))), [48.85] * len(longitudes), longitudes)
+
+
+def test_solver_finds_straight_path():
+    solution = _line_route()
+    ordered = sorted(solution.longitudes)
+    assert solution.longitudes in (ordered, ordered[::-1])
+    assert solution.leg_km[0] == 0.0
+    assert len(solution.leg_km) == len(solution.place_ids)
+
+
+def test_provider_legs_replace_estimates():
+    solution = _line_route()
+    provider = LocalProvider(speed_kmh=15)
+
+    asyncio.run(with_provider_legs(solution, provider))
+
+    assert provider.calls == len(solution.place_ids) - 1
+    assert len(solution.leg_points) == provider.calls
+    # 15 km/h: cuatro minutos por kilómetro
+    for km, minutes in zip(solution.leg_km[1:], solution.leg_minutes[1:]):
+        assert abs(minutes - km * 4) < 1e-9
+
+
+def test_repeated_legs_hit_the_cache():
+    provider = LocalProvider(cache=LegCache(max_entries=100, precision=4))
+    a, b = (48.85, 2.30), (48.86, 2.31)
+
+    async def scenario():
+        await provider.legs([(a, b), (a, b)])
+        assert provider.calls == 1
+        await provider.legs([(a, b), (b, a)])
+        assert provider.calls == 2
+
+    asyncio.run(scenario())
+
+
+class FailingProvider(RoutingProvider):
+    name = "failing"
+
+    async def _fetch(self, origin, destination):
+        raise RuntimeError("sin red")
+
+
+def test_failed_legs_fall_back_to_local_estimate():
+    cache = LegCache(max_entries=100, precision=4)
+    provider = FailingProvider(cache)
+    a, b = (48.85, 2.30), (48.86, 2.31)
+
+    async def scenario():
+        [leg] = await provider.legs([(a, b)])
+        assert leg.distance_km > 0
+        assert leg.points == [a, b]
+        # La estimación local no se cachea
+        assert await cache.get(cache.key(provider.name, a, b)) is None
+
+    asyncio.run(scenario())
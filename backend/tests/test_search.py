@@ -0,0 +1,56 @@
+import pytest
+
+from app.database import engine
+from app.search import InvertedIndex, rebuild_facet_counts
+
+
+@pytest.fixture(scope="module")
+def city(client, make_place):
+    make_place("Louvre", "SearchCity", 48.861, 2.336, "museo de arte", ["museo"])
+    make_place("Orsay", "SearchCity", 48.860, 2.326, "museo de arte y museo de trenes", ["museo"])
+    make_place("Luxembourg", "SearchCity", 48.846, 2.337, "jardín y parque", ["parque"])
+    make_place("Pompidou", "SearchCity", 48.861, 2.352, "arte moderno", ["museo", "arte"])
+    return "SearchCity"
+
+
+def test_index_matches_all_words_and_scores_occurrences():
+    index = InvertedIndex(refresh_seconds=60, rebuild_seconds=600)
+    index.add(1, "Louvre", "museo de arte")
+    index.add(2, "Orsay", "museo museo")
+    index.add(3, "Luxembourg", "parque")
+
+    assert index.match("museo") == {1: 1, 2: 2}
+    assert index.match("museo arte") == {1: 2}
+    index.remove(2)
+    assert index.match("museo") == {1: 1}
+
+
+def test_search_by_relevance(client, city):
+    page = client.get("/places/search", params={"city": city, "q": "museo"}).json()
+    assert page["total"] == 2
+    # Orsay repite «museo»: va primero
+    assert [p["name"] for p in page["items"]] == ["Orsay", "Louvre"]
+
+
+def test_search_combines_query_and_categories(client, city):
+    page = client.get("/places/search", params={"city": city, "q": "arte", "categories": "arte,parque"}).json()
+    assert [p["name"] for p in page["items"]] == ["Pompidou"]
+
+
+def test_facets_follow_deactivation(client, city):
+    page = client.get("/places/search", params={"city": city}).json()
+    assert page["facets"] == {"museo": 3, "arte": 1, "parque": 1}
+
+    louvre = next(p for p in page["items"] if p["name"] == "Louvre")
+    assert client.delete(f"/places/{louvre['id']}").status_code == 200
+
+    page = client.get("/places/search", params={"city": city, "q": "museo"}).json()
+    assert [p["name"] for p in page["items"]] == ["Orsay"]
+    assert page["facets"] == {"museo": 2, "arte": 1, "parque": 1}
+
+
+def test_rebuilt_facets_match_incremental_counts(client, city):
+    before = client.get("/places/search", params={"city": city}).json()["facets"]
+    with engine.begin() as connection:
+        rebuild_facet_counts(connection)
+    assert client.get("/places/search", params={"city": city}).json()["facets"] == before